@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Offline performance benchmarks for the Children's Story Generator.
+
+Runs StoryGenerator against the deterministic ScriptedChatCompletionClient,
+so no API key or network access is needed. Results are written as JSON and
+can be compared against a stored baseline to catch regressions in CI:
+
+    python benchmarks/bench_story_generator.py --output benchmarks/results.json
+    python benchmarks/bench_story_generator.py --compare benchmarks/baseline.json
+
+A cassette recorded with CASSETTE_MODE=record can be replayed instead of
+the scripted client (use the title and genre of the recorded run):
+
+    python benchmarks/bench_story_generator.py --cassette .cache/cassette.jsonl.gz \
+        --title "The Magic Garden Adventure" --genre Fantasy --modes selector
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "src"))
+
+# Offline runs need neither a real key nor the persistent story cache, checkpoints and library
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ["STORY_CACHE_ENABLED"] = "false"
+os.environ["CHECKPOINTS_ENABLED"] = "false"
+os.environ["STORY_LIBRARY_ENABLED"] = "false"
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.cassettes import Cassette, ReplayingChatCompletionClient
+from components.model_clients import shutdown
+from components.story_analytics import analyze_stories
+from components.story_extraction import Story
+from components.story_generator import StoryGenerator
+from components.story_library import StoryLibrary
+from components.model_contexts import CONTEXT_STRATEGIES
+from components.model_tiers import ModelTiers, get_model_tiers
+from components.rate_limits import RateLimitScheduler
+from components.structured_output import OUTPUT_FORMATS
+from components.template_drafts import TemplateDrafts
+from config import CONTEXT_CONFIG, GENRES, RATE_LIMIT_CONFIG, STORY_CONFIG, TERMINATION_CONFIG
+from tests.scripted_client import ScriptedChatCompletionClient
+
+# Metrics where a larger value is better; every other metric is "lower is better"
+HIGHER_IS_BETTER = ("stories_per_second", "context_tokens_saved", "million_chars_per_second", "serial_target_met",
+                    "best_of_target_met", "template_pass_rate")
+# Counts that depend on timing more than on the code, reported but never compared
+NOT_COMPARED = ("failures", "unscheduled_failures", "throttled_calls", "words_per_draft")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def make_client(args):
+    if args.cassette:
+        return ReplayingChatCompletionClient(args.loaded_cassette, timing=args.replay_timing)
+    return ScriptedChatCompletionClient(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        complete_after=args.rounds
+    )
+
+
+def story_request(args, index):
+    # Replayed runs only match the exact title and genre that were recorded
+    return args.title or f"Benchmark Story {index}", args.genre
+
+
+def bench_end_to_end(args, mode):
+    """Serial runs: end-to-end latency and orchestration overhead per model call"""
+    latencies, overheads, calls = [], [], []
+    for index in range(args.stories):
+        client = make_client(args)
+        generator = StoryGenerator(mode=mode, rounds=args.rounds, model_client=client)
+        started = time.perf_counter()
+        story = generator.generate_story(*story_request(args, index))
+        elapsed = time.perf_counter() - started
+        if story.startswith("Sorry"):
+            raise RuntimeError(story)
+        latencies.append(elapsed)
+        calls.append(client.calls)
+        # Overlapping calls (fan-out) simulate more model time than wall time passes
+        overheads.append(max(0.0, elapsed - client.simulated_seconds) / max(1, client.calls))
+    return {
+        "latency_mean_s": statistics.mean(latencies),
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p95_s": percentile(latencies, 0.95),
+        "model_calls_per_story": statistics.mean(calls),
+        "overhead_per_call_ms": statistics.mean(overheads) * 1000,
+    }
+
+
+def synthetic_result(args):
+    """A 25-message transcript shaped like a long selector run"""
+    client = ScriptedChatCompletionClient(complete_after=args.rounds)
+    writers = (CharacterAgent.NAME, WriterAgent.NAME, ClimaxAgent.NAME)
+    messages = [TextMessage(source="user", content=StoryGenerator(model_client=client)._build_task("Benchmark", "Fantasy"))]
+    for turn in range(24):
+        role = writers[0] if turn == 0 else writers[1 + turn % 2]
+        messages.append(TextMessage(source=role, content=client._generate(role, turn // 2 + 1)))
+    return TaskResult(messages=messages, stop_reason="benchmark")
+
+
+def bench_extraction(args):
+    """Cost of _extract_story_from_result on a long transcript"""
+    generator = StoryGenerator(model_client=make_client(args))
+    result = synthetic_result(args)
+    iterations = args.extract_iterations
+    started = time.perf_counter()
+    for _ in range(iterations):
+        generator._extract_story_from_result(result)
+    elapsed = time.perf_counter() - started
+    return {"extract_us": elapsed / iterations * 1e6, "transcript_messages": len(result.messages)}
+
+
+def _timed_ms(function, runs=20):
+    started = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - started) / runs * 1000
+
+
+def bench_library(args):
+    """Saving stories to the library, and page, search and title lookups once it holds --library-stories"""
+    client = ScriptedChatCompletionClient()
+    chapters = [f"Chapter {number}: Part {number}\n\n" + client._words(f"library:{number}", client.chapter_words)
+                for number in range(1, 6)]
+    genres = ("Fantasy", "Adventure", "Mystery", "Fairy Tale")
+    with tempfile.TemporaryDirectory() as directory:
+        library = StoryLibrary(os.path.join(directory, "library.sqlite3"))
+        started = time.perf_counter()
+        for index in range(args.library_stories):
+            # Rotate the chapters so every story is different and has one rare word
+            text = "\n\n".join(chapters[index % 5:] + chapters[:index % 5]) + f" marker{index}"
+            library.add(Story.from_text(text, f"Library Story {index}", genres[index % 4],
+                                        character_sheet=f"Pip{index % 100} the owl"), {"mode": "pipeline"})
+        add_ms = (time.perf_counter() - started) / args.library_stories * 1000
+        with library._connect() as db:
+            stored_bytes = db.execute("SELECT AVG(LENGTH(story)) FROM stories").fetchone()[0]
+        middle = args.library_stories // 2
+        timings = {
+            "add_ms": add_ms,
+            "first_page_ms": _timed_ms(lambda: library.page(20)),
+            "deep_page_ms": _timed_ms(lambda: library.page(20, cursor=middle)),
+            "genre_page_ms": _timed_ms(lambda: library.page(20, genre="Mystery")),
+            "search_rare_ms": _timed_ms(lambda: library.page(20, query=f"marker{middle}")),
+            "search_common_ms": _timed_ms(lambda: library.page(20, query="fox")),
+            "find_title_ms": _timed_ms(lambda: library.find(f"library story {middle}")),
+            "stored_bytes_per_story": stored_bytes,
+        }
+        library.close()
+        return timings
+
+
+def bench_analytics(args):
+    """Readability scores of --analytics-stories stories in one batch"""
+    client = ScriptedChatCompletionClient()
+    chapters = [f"Chapter {number}: Part {number}\n\n" + client._words(f"analytics:{number}", client.chapter_words)
+                for number in range(1, 6)]
+    stories = [Story.from_text("\n\n".join(chapters[index % 5:] + chapters[:index % 5])
+                               + f' "Goodnight, Pip{index}," said the owl.', f"Story {index}", "Fantasy")
+               for index in range(args.analytics_stories)]
+    characters = sum(len(story.text) for story in stories)
+    started = time.perf_counter()
+    frame = analyze_stories(stories)
+    elapsed = time.perf_counter() - started
+    return {
+        "stories": len(frame),
+        "elapsed_s": elapsed,
+        "stories_per_second": len(frame) / elapsed,
+        "million_chars_per_second": characters / elapsed / 1e6,
+    }
+
+
+def bench_template_drafts(args):
+    """Offline template drafts: time per full draft (text, and split into a Story) and how many pass the checks"""
+    requests = [(f"Template Story {index}", GENRES[index % len(GENRES)], index) for index in range(args.template_drafts)]
+    drafts = TemplateDrafts()
+    started = time.perf_counter()
+    texts = [drafts.draft(*request) for request in requests]
+    draft_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    stories = [drafts.story(*request) for request in requests]
+    story_seconds = time.perf_counter() - started
+    frame = analyze_stories(stories)
+    return {
+        "draft_us": draft_seconds / len(texts) * 1e6,
+        "story_us": story_seconds / len(stories) * 1e6,
+        "words_per_draft": statistics.mean(story.word_count for story in stories),
+        "template_pass_rate": float(frame["passes"].mean()),
+    }
+
+
+def bench_memory(args, mode):
+    """Peak Python heap allocated while one story is generated"""
+    generator = StoryGenerator(mode=mode, rounds=args.rounds, model_client=make_client(args))
+    tracemalloc.start()
+    generator.generate_story(*story_request(args, 0))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_memory_kb": peak / 1024}
+
+
+def bench_throughput(args, mode, concurrency):
+    """Stories per second through generate_many at one concurrency level"""
+    generator = StoryGenerator(mode=mode, rounds=args.rounds, model_client=make_client(args))
+    requests = [story_request(args, index) for index in range(args.batch)]
+
+    async def run():
+        failures = 0
+        async for result in generator.generate_many(requests, max_concurrency=concurrency):
+            failures += not result.ok
+        return failures
+
+    started = time.perf_counter()
+    failures = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    return {"stories_per_second": args.batch / elapsed, "failures": failures}
+
+
+def _run_throttled_batch(args, scheduled):
+    # The simulated API rejects calls beyond --provider-concurrency in flight with a 429
+    client = ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                          complete_after=args.rounds, max_concurrent_calls=args.provider_concurrency,
+                                          retry_after=0.05)
+    enabled = RATE_LIMIT_CONFIG["enabled"]
+    RATE_LIMIT_CONFIG["enabled"] = scheduled
+    try:
+        generator = StoryGenerator(mode="pipeline", rounds=args.rounds, model_client=client,
+                                   rate_limiter=RateLimitScheduler() if scheduled else None)
+    finally:
+        RATE_LIMIT_CONFIG["enabled"] = enabled
+    requests = [(f"Benchmark Story {index}", "Fantasy") for index in range(args.batch)]
+
+    async def run():
+        completed = 0
+        async for result in generator.generate_many(requests, max_concurrency=args.batch):
+            completed += result.ok
+        return completed
+
+    started = time.perf_counter()
+    completed = asyncio.run(run())
+    return completed, time.perf_counter() - started, client.throttled
+
+
+def bench_rate_limits(args):
+    """Completed stories per second when the API throttles, with and without the shared scheduler"""
+    completed, elapsed, throttled = _run_throttled_batch(args, scheduled=True)
+    unscheduled, _, _ = _run_throttled_batch(args, scheduled=False)
+    return {"stories_per_second": completed / elapsed, "failures": args.batch - completed,
+            "unscheduled_failures": args.batch - unscheduled, "throttled_calls": throttled}
+
+
+def bench_tiers(args):
+    """Latency and cost of a selector story with per-role tiers against every role on the large tier"""
+    configured = get_model_tiers()
+    # The large tier follows MODEL_NAME, so price it as --large-model to compare two real models
+    tiers = ModelTiers({**configured.tiers, "large": {**configured.tiers.get("large", {}), "model": args.large_model}},
+                       configured.roles, configured.prices)
+    results = {}
+    for name, role_tiers in (("tiered", tiers), ("single", tiers.single_tier("large"))):
+        latencies, costs = [], []
+        for index in range(args.stories):
+            # The fast tier answers sooner and generates about three times as quickly
+            clients = {
+                "fast": ScriptedChatCompletionClient(latency=args.latency / 2, tokens_per_second=args.tokens_per_second * 3,
+                                                     complete_after=args.rounds),
+                "large": ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                                      complete_after=args.rounds),
+            }
+            generator = StoryGenerator(mode="selector", rounds=args.rounds, model_client=clients, model_tiers=role_tiers)
+            started = time.perf_counter()
+            result = asyncio.run(generator.run_story(f"Benchmark Tiers {index}", "Fantasy"))
+            latencies.append(time.perf_counter() - started)
+            costs.append(result.report.cost)
+        results[f"{name}_latency_s"] = statistics.mean(latencies)
+        results[f"{name}_cost_usd"] = statistics.mean(costs)
+    return results
+
+
+def bench_context(args, strategy):
+    """Input tokens of a full-length selector run (every turn until max_messages) per context strategy"""
+    default = CONTEXT_CONFIG["strategy"]
+    early_stop = TERMINATION_CONFIG["enabled"]
+    CONTEXT_CONFIG["strategy"] = strategy
+    TERMINATION_CONFIG["enabled"] = False
+    try:
+        client = ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                              complete_after=10 ** 6)
+        generator = StoryGenerator(mode="selector", model_client=client)
+        started = time.perf_counter()
+        result = asyncio.run(generator.run_story("Benchmark Context", "Fantasy"))
+        elapsed = time.perf_counter() - started
+    finally:
+        CONTEXT_CONFIG["strategy"] = default
+        TERMINATION_CONFIG["enabled"] = early_stop
+    if not result.ok:
+        raise RuntimeError(result.error)
+    return {
+        "input_tokens_per_story": sum(call.prompt_tokens for call in result.report.calls),
+        "context_tokens_saved": result.stats["context_tokens_saved"],
+        "overhead_per_call_ms": max(0.0, elapsed - client.simulated_seconds) / max(1, client.calls) * 1000,
+    }
+
+
+def bench_early_stop(args):
+    """Agent turns and latency of a selector story the agents never mark complete, with and without early stopping"""
+    default = TERMINATION_CONFIG["enabled"]
+    results = {}
+    try:
+        for name, enabled in (("early_stop", True), ("full", False)):
+            TERMINATION_CONFIG["enabled"] = enabled
+            client = ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                                  complete_after=10 ** 6)
+            generator = StoryGenerator(mode="selector", model_client=client)
+            started = time.perf_counter()
+            result = asyncio.run(generator.run_story("Benchmark Early Stop", "Fantasy"))
+            if not result.ok:
+                raise RuntimeError(result.error)
+            results[f"{name}_latency_s"] = time.perf_counter() - started
+            results[f"{name}_agent_turns"] = result.stats["agent_turns"]
+            results[f"{name}_model_calls"] = client.calls
+    finally:
+        TERMINATION_CONFIG["enabled"] = default
+    return results
+
+
+def bench_best_of(args):
+    """Time to a story that meets the length target: one round of --drafts drafts against serial retries.
+
+    A share (--short-draft-rate) of the scripted drafts come out at half
+    length. Serial retries rerun a single-draft story until one is long
+    enough, up to --drafts attempts, like regenerating by hand.
+    """
+    default = STORY_CONFIG["best_of_drafts"]
+    results = {}
+    try:
+        for name, drafts, attempts in (("serial", 1, args.drafts), ("best_of", args.drafts, 1)):
+            STORY_CONFIG["best_of_drafts"] = drafts
+            client = ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                                  short_draft_rate=args.short_draft_rate)
+            generator = StoryGenerator(mode="best_of", model_client=client)
+            latencies, met = [], 0
+            for index in range(args.best_of_stories):
+                started = time.perf_counter()
+                for _ in range(attempts):
+                    result = asyncio.run(generator.run_story(f"Benchmark Draft {index}", "Fantasy", regenerate=True))
+                    if not result.ok:
+                        raise RuntimeError(result.error)
+                    if result.structured.word_count >= STORY_CONFIG["min_total_words"]:
+                        met += 1
+                        break
+                latencies.append(time.perf_counter() - started)
+            results[f"{name}_latency_s"] = statistics.mean(latencies)
+            results[f"{name}_model_calls"] = client.calls / args.best_of_stories
+            results[f"{name}_target_met"] = met / args.best_of_stories
+    finally:
+        STORY_CONFIG["best_of_drafts"] = default
+    return results
+
+
+def bench_output_format(args, output_format):
+    """Completion tokens of a pipeline story when agents reply in prose or in JSON objects and patches"""
+    client = ScriptedChatCompletionClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                          complete_after=args.rounds)
+    generator = StoryGenerator(mode="pipeline", rounds=args.rounds, model_client=client, output_format=output_format)
+    result = asyncio.run(generator.run_story("Benchmark Output", "Fantasy"))
+    if not result.ok:
+        raise RuntimeError(result.error)
+    return {
+        "completion_tokens_per_story": result.stats["completion_tokens"],
+        "input_tokens_per_story": sum(call.prompt_tokens for call in result.report.calls),
+    }
+
+
+# Each startup measurement runs in a fresh interpreter without an API key
+_IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+_RENDER_SCRIPT = """
+import time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({path!r}).run(timeout=120)
+if app.exception:
+    raise SystemExit(str(app.exception))
+print(time.perf_counter() - started)
+"""
+
+
+def _time_fresh_interpreter(script, runs):
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "src")])
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.join(ROOT, "src"),
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings) * 1000
+
+
+def bench_startup(args):
+    """Cold import of the generator and time until the Streamlit page has rendered once"""
+    return {
+        "import_story_generator_ms": _time_fresh_interpreter(
+            _IMPORT_SCRIPT.format(module="components.story_generator"), args.startup_runs),
+        "first_render_ms": _time_fresh_interpreter(
+            _RENDER_SCRIPT.format(path=os.path.join(ROOT, "src", "app.py")), args.startup_runs),
+    }
+
+
+def run_benchmarks(args):
+    results = {"extraction": bench_extraction(args)}
+    if args.startup_runs:
+        results["startup"] = bench_startup(args)
+    if not args.cassette:
+        for strategy in args.context_strategies:
+            results[f"context.{strategy}"] = bench_context(args, strategy)
+        for output_format in args.output_formats:
+            results[f"output.{output_format}"] = bench_output_format(args, output_format)
+        if args.provider_concurrency:
+            results["rate_limits"] = bench_rate_limits(args)
+        results["tiers"] = bench_tiers(args)
+        results["early_stop"] = bench_early_stop(args)
+        if args.best_of_stories:
+            results["best_of"] = bench_best_of(args)
+    if args.library_stories:
+        results["library"] = bench_library(args)
+    if args.analytics_stories:
+        results["analytics"] = bench_analytics(args)
+    if args.template_drafts:
+        results["template_drafts"] = bench_template_drafts(args)
+    for mode in args.modes:
+        results[f"end_to_end.{mode}"] = bench_end_to_end(args, mode)
+        results[f"memory.{mode}"] = bench_memory(args, mode)
+        for concurrency in args.concurrency:
+            results[f"throughput.{mode}.c{concurrency}"] = bench_throughput(args, mode, concurrency)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that regressed by more than tolerance (a fraction)"""
+    regressions = []
+    for group, metrics in baseline.get("results", {}).items():
+        for name, old in metrics.items():
+            new = results.get(group, {}).get(name)
+            if new is None or not isinstance(old, (int, float)) or old == 0 or name in NOT_COMPARED:
+                continue
+            change = (new - old) / abs(old)
+            worse = change < -tolerance if name in HIGHER_IS_BETTER else change > tolerance
+            if worse:
+                regressions.append(f"{group}.{name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline StoryGenerator benchmarks")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression (fraction)")
+    parser.add_argument("--modes", nargs="+", default=["selector", "pipeline", "fanout"])
+    parser.add_argument("--stories", type=int, default=3, help="Serial stories per mode")
+    parser.add_argument("--batch", type=int, default=8, help="Stories per throughput run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--rounds", type=int, default=2, help="Collaborative rounds per story")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=20000.0, help="Simulated generation speed")
+    parser.add_argument("--extract-iterations", type=int, default=200)
+    parser.add_argument("--context-strategies", nargs="+", default=list(CONTEXT_STRATEGIES))
+    parser.add_argument("--output-formats", nargs="+", default=list(OUTPUT_FORMATS))
+    parser.add_argument("--provider-concurrency", type=int, default=3,
+                        help="Calls the simulated API accepts at once in the rate limit run (0 skips it)")
+    parser.add_argument("--large-model", default="gpt-4o", help="Model priced for the large tier in the tier run")
+    parser.add_argument("--best-of-stories", type=int, default=8,
+                        help="Stories written for the best-of comparison (0 skips it)")
+    parser.add_argument("--drafts", type=int, default=3, help="Drafts per best-of round, and serial attempts")
+    parser.add_argument("--short-draft-rate", type=float, default=0.4,
+                        help="Share of scripted drafts that come out at half length")
+    parser.add_argument("--library-stories", type=int, default=2000,
+                        help="Stories saved before timing library lookups (0 skips them)")
+    parser.add_argument("--analytics-stories", type=int, default=2000,
+                        help="Stories scored by the readability analytics (0 skips them)")
+    parser.add_argument("--template-drafts", type=int, default=2000,
+                        help="Offline template drafts to time (0 skips them)")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Cold starts to time (0 skips them)")
+    parser.add_argument("--cassette", help="Replay this recorded cassette instead of the scripted client")
+    parser.add_argument("--replay-timing", choices=["none", "original"], default="none")
+    parser.add_argument("--title", help="Story title for every run (required to match a cassette)")
+    parser.add_argument("--genre", default="Fantasy")
+    args = parser.parse_args()
+    args.loaded_cassette = Cassette.load(args.cassette) if args.cassette else None
+
+    print("Running offline story generator benchmarks...")
+    results = run_benchmarks(args)
+    shutdown()
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "compare", "loaded_cassette")},
+        "results": results,
+    }
+    print(json.dumps(report["results"], indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📁 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
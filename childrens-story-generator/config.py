@@ -12,9 +12,12 @@ MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "4000"))  # Increased for longer stories
 
-# Validate API key
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
+# Validate API key when the first OpenAI client is created, so importing this
+# module (tooling, offline runs, the scripted client) does not need one
+def require_api_key() -> str:
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
+    return OPENAI_API_KEY
 
 # AutoGen Configuration - Updated for new API
 LLM_CONFIG = {
@@ -24,6 +27,104 @@ LLM_CONFIG = {
     "max_tokens": MAX_TOKENS,
 }
 
+# Per-role model tiers and prices, read from the llm_config blocks of autogen_config.json
+MODEL_TIER_CONFIG = {
+    "enabled": os.getenv("MODEL_TIERS_ENABLED", "true").lower() == "true",
+    "path": os.getenv("AUTOGEN_CONFIG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "autogen_config.json")),
+}
+
+# HTTP connection pool shared by every model client in the process
+CLIENT_POOL_CONFIG = {
+    "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+    "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE", "10")),
+    "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+    "request_timeout": float(os.getenv("HTTP_REQUEST_TIMEOUT", "120")),
+    "base_url": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "warm_up": os.getenv("WARM_UP_CLIENTS", "false").lower() == "true",
+}
+
+# Shared scheduler in front of every model call: provider rate limits, retries and adaptive concurrency
+RATE_LIMIT_CONFIG = {
+    "enabled": os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true",
+    "requests_per_minute": float(os.getenv("RATE_LIMIT_RPM", "0")),  # 0 means no request limit
+    "tokens_per_minute": float(os.getenv("RATE_LIMIT_TPM", "0")),  # Prompt plus max_tokens; 0 means no token limit
+    "max_concurrency": int(os.getenv("MODEL_MAX_CONCURRENCY", "64")),  # Ceiling for in-flight model calls; throttling lowers the live limit
+    "max_retries": int(os.getenv("MODEL_MAX_RETRIES", "5")),
+    "backoff_base": float(os.getenv("RETRY_BACKOFF_BASE", "0.5")),  # Seconds before the first retry (jittered)
+    "backoff_max": float(os.getenv("RETRY_BACKOFF_MAX", "30")),  # Longest single wait, including Retry-After
+}
+
+# Cache of finished stories (in-process LRU in front of a SQLite file)
+STORY_CACHE_CONFIG = {
+    "enabled": os.getenv("STORY_CACHE_ENABLED", "true").lower() == "true",
+    "path": os.getenv("STORY_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "stories.sqlite3")),
+    "max_entries": int(os.getenv("STORY_CACHE_MAX_ENTRIES", "128")),
+    "max_disk_entries": int(os.getenv("STORY_CACHE_MAX_DISK_ENTRIES", "5000")),
+    "ttl_seconds": float(os.getenv("STORY_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+}
+
+# Library of every finished story (SQLite with a full-text index, compressed text)
+STORY_LIBRARY_CONFIG = {
+    "enabled": os.getenv("STORY_LIBRARY_ENABLED", "true").lower() == "true",
+    "path": os.getenv("STORY_LIBRARY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "library.sqlite3")),
+    "compression": os.getenv("STORY_LIBRARY_COMPRESSION", "zstd"),  # "zstd" (falls back to gzip without the zstandard package) or "gzip"
+    "keep_transcripts": os.getenv("STORY_LIBRARY_TRANSCRIPTS", "false").lower() == "true",  # Also store every agent message of the run
+    "page_size": int(os.getenv("STORY_LIBRARY_PAGE_SIZE", "20")),  # Stories per page in the app
+}
+
+# Conversation history sent to each agent (and the LLM selector) on every turn
+CONTEXT_CONFIG = {
+    "strategy": os.getenv("CONTEXT_STRATEGY", "unbounded"),  # "unbounded", "token_limited", "draft" or "summary"
+    # Per-role overrides, e.g. AGENT_CONTEXT_STRATEGIES="Story_Writer=draft,selector=summary"
+    "agent_strategies": dict(item.strip().split("=", 1) for item in os.getenv("AGENT_CONTEXT_STRATEGIES", "").split(",") if "=" in item),
+    "token_limit": int(os.getenv("CONTEXT_TOKEN_LIMIT", "6000")),  # Estimated tokens of history per request
+    "recent_messages": int(os.getenv("CONTEXT_RECENT_MESSAGES", "2")),  # Turns always sent verbatim
+    "summary_words": int(os.getenv("CONTEXT_SUMMARY_WORDS", "40")),  # Words kept per summarised turn
+}
+
+# Team state saved after every agent turn so failed or timed out runs can be resumed
+CHECKPOINT_CONFIG = {
+    "enabled": os.getenv("CHECKPOINTS_ENABLED", "true").lower() == "true",
+    "path": os.getenv("CHECKPOINT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "checkpoints")),
+    "keep_completed": os.getenv("CHECKPOINT_KEEP_COMPLETED", "false").lower() == "true",
+}
+
+# Record-and-replay of model traffic for offline profiling and regression runs
+CASSETTE_CONFIG = {
+    "mode": os.getenv("CASSETTE_MODE", "off"),  # "off", "record" or "replay"
+    "path": os.getenv("CASSETTE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "cassette.jsonl.gz")),
+    "replay_timing": os.getenv("CASSETTE_REPLAY_TIMING", "none"),  # "original" or "none"
+}
+
+# Background story jobs: a fixed pool of generation slots shared by every app session
+JOB_CONFIG = {
+    "workers": int(os.getenv("JOB_WORKERS", "2")),  # Stories generated at the same time
+    "max_queued": int(os.getenv("JOB_MAX_QUEUED", "50")),  # Submissions are refused beyond this queue depth
+    "path": os.getenv("JOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs.sqlite3")),
+    "retention_seconds": float(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600))),  # Finished jobs kept this long
+    "prune_interval_seconds": float(os.getenv("JOB_PRUNE_INTERVAL_SECONDS", "600")),  # How often expired jobs are deleted
+}
+
+# Headless HTTP service (src/server.py) around the job queue, and the app's client for it
+SERVICE_CONFIG = {
+    "url": os.getenv("STORY_SERVICE_URL", "").rstrip("/"),  # The app sends stories to this service; empty runs them in the app's own job queue
+    "host": os.getenv("SERVICE_HOST", "127.0.0.1"),
+    "port": int(os.getenv("SERVICE_PORT", "8000")),
+    "drain_seconds": float(os.getenv("SERVICE_DRAIN_SECONDS", "120")),  # On shutdown, queued and running stories get this long to finish
+    "retry_after": int(os.getenv("SERVICE_RETRY_AFTER", "10")),  # Retry-After seconds sent when the queue is full or the service is draining
+    "event_interval": float(os.getenv("SERVICE_EVENT_INTERVAL", "0.25")),  # Seconds between job checks of an event stream
+    "client_timeout": float(os.getenv("STORY_SERVICE_TIMEOUT", "10")),  # Seconds the app waits for each service request
+}
+
+# Early termination of selector and pipeline runs
+TERMINATION_CONFIG = {
+    "enabled": os.getenv("EARLY_STOP_ENABLED", "true").lower() == "true",
+    "duplicate_similarity": float(os.getenv("DUPLICATE_DRAFT_SIMILARITY", "0.9")),  # Shingle overlap at which a rewritten chapter counts as unchanged
+    "shingle_words": 5,  # Words per shingle when comparing drafts
+    "sketch_size": 128,  # Smallest shingle hashes kept per chapter to estimate overlap
+    "max_turns_per_agent": int(os.getenv("MAX_TURNS_PER_AGENT", "4"))  # Selector stops offering an agent after this many turns; 0 means no cap
+}
+
 # Story Configuration
 GENRES = [
     "Fantasy",
@@ -50,7 +151,10 @@ AGENT_CONFIG = {
 TEAM_CONFIG = {
     "max_messages": 25,  # Increased for longer collaboration
     "allow_repeated_speaker": True,
-    "timeout": 600  # 10 minutes timeout for longer stories
+    "timeout": float(os.getenv("STORY_TIMEOUT", "600")),  # 10 minutes timeout for longer stories
+    "turn_timeout": float(os.getenv("TURN_TIMEOUT", "180")),  # Longest a single agent turn may take
+    "max_concurrent_stories": int(os.getenv("MAX_CONCURRENT_STORIES", "4")),  # Teams run side by side by generate_many
+    "orchestration_mode": os.getenv("ORCHESTRATION_MODE", "selector")  # "selector" (LLM picks speakers), "pipeline" (fixed order), "fanout" (chapters in parallel) or "best_of" (whole drafts in parallel, best kept)
 }
 
 # Story Configuration - Enhanced for 10+ page stories
@@ -59,5 +163,17 @@ STORY_CONFIG = {
     "words_per_page": 150,  # Typical for children's books
     "min_total_words": 1500,  # 10 pages * 150 words
     "chapters": 5,  # Divide story into chapters
-    "collaborative_rounds": 3  # Number of collaboration rounds between agents
+    "collaborative_rounds": 3,  # Number of collaboration rounds between agents
+    "fanout_continuity_pass": os.getenv("FANOUT_CONTINUITY_PASS", "true").lower() == "true",  # Bridge separately written chapters
+    "best_of_drafts": int(os.getenv("BEST_OF_DRAFTS", "3")),  # Story_Writer drafts written side by side in "best_of" mode
+    "best_of_temperatures": [float(value) for value in os.getenv("BEST_OF_TEMPERATURES", "0.6,0.8,1.0").split(",") if value.strip()],  # Cycled over the drafts; empty keeps the Story_Writer tier's temperature
+    "template_fallback": os.getenv("TEMPLATE_FALLBACK", "true").lower() == "true",  # Offline template draft instead of an error when the API stays throttled past every retry
+    "output_format": os.getenv("OUTPUT_FORMAT", "text")  # "json" makes agents reply with structured objects
+}
+
+# Readability and quality checks of the story analytics (Flesch-Kincaid grade is roughly age - 5, so ages 4-10 read at grades -1 to 5)
+ANALYTICS_CONFIG = {
+    "min_grade": float(os.getenv("READABILITY_MIN_GRADE", "-1")),
+    "max_grade": float(os.getenv("READABILITY_MAX_GRADE", "5")),
+    "batch_chars": int(os.getenv("ANALYTICS_BATCH_CHARS", "2000000")),  # Characters tokenized per NumPy batch (about 70 bytes of memory each)
 }
\ No newline at end of file
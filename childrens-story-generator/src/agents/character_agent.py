@@ -1,24 +1,14 @@
 from autogen_agentchat.agents import AssistantAgent
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from config import LLM_CONFIG
+from components.model_clients import get_model_client
+from components.structured_output import CharacterSheet
+from components.template_drafts import TemplateDrafts
 
 class CharacterAgent:
     """Agent responsible for developing characters for children's stories"""
     
-    def __init__(self):
-        # Create model client
-        self.model_client = OpenAIChatCompletionClient(
-            model=LLM_CONFIG["model"],
-            api_key=LLM_CONFIG["api_key"],
-            temperature=LLM_CONFIG["temperature"],
-            max_tokens=LLM_CONFIG["max_tokens"]
-        )
-        
-        self.agent = AssistantAgent(
-            name="Character_Developer",
-            description="Creates detailed, engaging characters for multi-page children's stories with rich backgrounds and development arcs",
-            model_client=self.model_client,
-            system_message="""You are an expert character developer for children's stories. Your role is to create rich, multi-dimensional characters for 10+ page stories.
+    NAME = "Character_Developer"
+    DESCRIPTION = "Creates detailed, engaging characters for multi-page children's stories with rich backgrounds and development arcs"
+    SYSTEM_MESSAGE = """You are an expert character developer for children's stories. Your role is to create rich, multi-dimensional characters for 10+ page stories.
 
 CORE RESPONSIBILITIES:
 1. Create 3-5 main characters with detailed profiles
@@ -54,35 +44,34 @@ GUIDELINES:
 - Clear character development arcs
 - Engaging personalities that drive plot forward
 
-Always provide comprehensive character profiles that will support a full 10+ page story with multiple chapters.""",
+Always provide comprehensive character profiles that will support a full 10+ page story with multiple chapters."""
+    
+    # JSON mode: the reply is a CharacterSheet object instead of prose
+    OUTPUT_TYPE = CharacterSheet
+    STRUCTURED_SYSTEM_MESSAGE = SYSTEM_MESSAGE + """
+
+OUTPUT FORMAT:
+Reply with a JSON object only: a "characters" list (name, age, personality, goal, growth_arc, relationships for each) and short "notes" on the supporting cast. Do not write any part of the story."""
+    
+    def __init__(self, model_client=None, stream: bool = False, model_context=None,
+                 structured: bool = False):
+        # Use the shared, pooled model client unless one is injected
+        self.model_client = model_client or get_model_client()
+        
+        self.agent = AssistantAgent(
+            name=self.NAME,
+            description=self.DESCRIPTION,
+            model_client=self.model_client,
+            model_client_stream=stream,
+            model_context=model_context,
+            system_message=self.STRUCTURED_SYSTEM_MESSAGE if structured else self.SYSTEM_MESSAGE,
+            output_content_type=self.OUTPUT_TYPE if structured else None,
         )
     
     def get_agent(self):
         return self.agent
     
-    def create_characters(self, genre: str):
-        characters = []
-        if genre == "fantasy":
-            characters = [
-                {"name": "Elara", "type": "elf", "trait": "wise"},
-                {"name": "Thorn", "type": "dragon", "trait": "fierce"},
-                {"name": "Bramble", "type": "fairy", "trait": "playful"},
-            ]
-        elif genre == "adventure":
-            characters = [
-                {"name": "Jack", "type": "explorer", "trait": "brave"},
-                {"name": "Luna", "type": "pirate", "trait": "clever"},
-                {"name": "Finn", "type": "treasure hunter", "trait": "determined"},
-            ]
-        elif genre == "mystery":
-            characters = [
-                {"name": "Detective Sam", "type": "detective", "trait": "observant"},
-                {"name": "Maggie", "type": "journalist", "trait": "curious"},
-                {"name": "Mr. Whiskers", "type": "cat", "trait": "sneaky"},
-            ]
-        else:
-            characters = [
-                {"name": "Charlie", "type": "child", "trait": "imaginative"},
-                {"name": "Riley", "type": "dog", "trait": "loyal"},
-            ]
-        return characters
\ No newline at end of file
+    @staticmethod
+    def create_characters(genre: str, seed: int = 0):
+        # Offline cast from the genre's template table (any case), no model call or API key
+        return TemplateDrafts().characters(genre, seed)
\ No newline at end of file
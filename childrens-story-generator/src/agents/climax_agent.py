@@ -1,24 +1,14 @@
 from autogen_agentchat.agents import AssistantAgent
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from config import LLM_CONFIG
+from components.model_clients import get_model_client
+from components.structured_output import ClimaxEdits
+from components.template_drafts import TemplateDrafts
 
 class ClimaxAgent:
     """Agent responsible for creating exciting climaxes for children's stories"""
     
-    def __init__(self):
-        # Create model client
-        self.model_client = OpenAIChatCompletionClient(
-            model=LLM_CONFIG["model"],
-            api_key=LLM_CONFIG["api_key"],
-            temperature=LLM_CONFIG["temperature"],
-            max_tokens=LLM_CONFIG["max_tokens"]
-        )
-        
-        self.agent = AssistantAgent(
-            name="Climax_Creator",
-            description="Designs exciting climaxes and plot enhancements for multi-chapter children's stories with satisfying resolutions",
-            model_client=self.model_client,
-            system_message="""You are a master of creating exciting story climaxes and plot enhancement for children's literature. Your role is to enhance longer, multi-chapter stories.
+    NAME = "Climax_Creator"
+    DESCRIPTION = "Designs exciting climaxes and plot enhancements for multi-chapter children's stories with satisfying resolutions"
+    SYSTEM_MESSAGE = """You are a master of creating exciting story climaxes and plot enhancement for children's literature. Your role is to enhance longer, multi-chapter stories.
 
 CORE RESPONSIBILITIES:
 1. Design thrilling but age-appropriate climactic sequences
@@ -68,26 +58,41 @@ STORY INTEGRATION:
 - Ensure climax serves the overall moral lesson
 - Create memorable moments children will discuss
 
-Always create climactic elements that elevate the entire 10+ page story while ensuring positive outcomes and valuable life lessons.""",
+Always create climactic elements that elevate the entire 10+ page story while ensuring positive outcomes and valuable life lessons."""
+    
+    # JSON mode: the reply is a list of patches against chapter numbers, not a rewrite
+    OUTPUT_TYPE = ClimaxEdits
+    STRUCTURED_SYSTEM_MESSAGE = SYSTEM_MESSAGE + """
+
+OUTPUT FORMAT:
+Reply with a JSON object only: a "patches" list and a "status" string. Each patch has "chapter" (the chapter number), "find" (an exact passage from that chapter, copied word for word) and "replace" (the new passage). Leave "find" empty to add "replace" at the end of the chapter. Keep each patch to the sentences you change; never rewrite a whole chapter. Set "status" to "STORY_COMPLETE" when the story is finished, otherwise leave it empty."""
+    
+    def __init__(self, model_client=None, stream: bool = False, model_context=None,
+                 structured: bool = False):
+        # Use the shared, pooled model client unless one is injected
+        self.model_client = model_client or get_model_client()
+        
+        self.agent = AssistantAgent(
+            name=self.NAME,
+            description=self.DESCRIPTION,
+            model_client=self.model_client,
+            model_client_stream=stream,
+            model_context=model_context,
+            system_message=self.STRUCTURED_SYSTEM_MESSAGE if structured else self.SYSTEM_MESSAGE,
+            output_content_type=self.OUTPUT_TYPE if structured else None,
         )
     
     def get_agent(self):
         return self.agent
     
-    def generate_climax(self, story: str) -> str:
+    @staticmethod
+    def generate_climax(story: str, genre: str = "", seed: int = 0) -> str:
         # This method generates a climax for the given story.
         # For simplicity, we will create a basic climax structure.
-        climax = f"And just when everything seemed lost, {self.create_twist()}."
+        climax = f"And just when everything seemed lost, {ClimaxAgent.create_twist(genre, seed)}."
         return climax
 
-    def create_twist(self) -> str:
-        # This method creates a twist for the climax.
-        twists = [
-            "the hero discovered a hidden power within themselves",
-            "a long-lost friend appeared to help",
-            "the villain revealed their true intentions",
-            "an unexpected ally joined the fight",
-            "the hero realized that love was the greatest strength"
-        ]
-        import random
-        return random.choice(twists)
\ No newline at end of file
+    @staticmethod
+    def create_twist(genre: str = "", seed: int = 0) -> str:
+        # A twist from the genre's template table; without a genre, one of the general twists
+        return TemplateDrafts().twist(genre, seed)
\ No newline at end of file
@@ -1,24 +1,14 @@
 from autogen_agentchat.agents import AssistantAgent
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from config import LLM_CONFIG
+from components.model_clients import get_model_client
+from components.structured_output import StoryDraft
+from components.template_drafts import TemplateDrafts
 
 class WriterAgent:
     """Agent responsible for writing the complete children's story"""
     
-    def __init__(self):
-        # Create model client
-        self.model_client = OpenAIChatCompletionClient(
-            model=LLM_CONFIG["model"],
-            api_key=LLM_CONFIG["api_key"],
-            temperature=LLM_CONFIG["temperature"],
-            max_tokens=LLM_CONFIG["max_tokens"]
-        )
-        
-        self.agent = AssistantAgent(
-            name="Story_Writer",
-            description="Crafts engaging, multi-chapter children's stories of 10+ pages with rich narratives and character development",
-            model_client=self.model_client,
-            system_message="""You are a master children's story writer specializing in longer, engaging narratives. Your role is to create comprehensive 10+ page stories.
+    NAME = "Story_Writer"
+    DESCRIPTION = "Crafts engaging, multi-chapter children's stories of 10+ pages with rich narratives and character development"
+    SYSTEM_MESSAGE = """You are a master children's story writer specializing in longer, engaging narratives. Your role is to create comprehensive 10+ page stories.
 
 CORE RESPONSIBILITIES:
 1. Write complete 10+ page stories (1500+ words total)
@@ -62,13 +52,41 @@ COLLABORATION NOTES:
 - Build on established character relationships
 - Maintain consistency with character traits
 
-Always write complete, chapter-structured stories that will engage young readers for the full 10+ pages while teaching valuable life lessons.""",
+Always write complete, chapter-structured stories that will engage young readers for the full 10+ pages while teaching valuable life lessons."""
+    
+    # JSON mode: the reply is a StoryDraft with one object per chapter
+    OUTPUT_TYPE = StoryDraft
+    STRUCTURED_SYSTEM_MESSAGE = SYSTEM_MESSAGE + """
+
+OUTPUT FORMAT:
+Reply with a JSON object only: a "chapters" list with "number", "title" and "text" for each chapter, and a "status" string. On your first turn write all 5 chapters. On later turns include ONLY the chapters you rewrite; chapters you leave out are kept as they are, so never repeat an unchanged chapter. Leave "status" empty."""
+    
+    def __init__(self, model_client=None, stream: bool = False, model_context=None,
+                 structured: bool = False):
+        # Use the shared, pooled model client unless one is injected
+        self.model_client = model_client or get_model_client()
+        
+        self.agent = AssistantAgent(
+            name=self.NAME,
+            description=self.DESCRIPTION,
+            model_client=self.model_client,
+            model_client_stream=stream,
+            model_context=model_context,
+            system_message=self.STRUCTURED_SYSTEM_MESSAGE if structured else self.SYSTEM_MESSAGE,
+            output_content_type=self.OUTPUT_TYPE if structured else None,
         )
     
     def get_agent(self):
         return self.agent
     
-    def generate_story(self, plot: str) -> str:
+    @staticmethod
+    def generate_story(plot: str) -> str:
         # This method generates a complete children's story based on the provided plot.
         # For simplicity, we'll return a placeholder story.
-        return f"Once upon a time, in a land where {plot}, there lived a brave little hero."
\ No newline at end of file
+        return f"Once upon a time, in a land where {plot}, there lived a brave little hero."
+    
+    @staticmethod
+    def template_draft(title: str, genre: str, seed: int = 0) -> str:
+        # Offline draft of the whole story from the genre's templates, no model call
+        # and no agent (so no API key) needed
+        return TemplateDrafts().draft(title, genre, seed)
\ No newline at end of file
@@ -1,13 +1,371 @@
 import streamlit as st
 import sys
 import os
-import traceback
+import time
 
 # Add the parent directory to the Python path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from components.story_generator import StoryGenerator
-from config import GENRES, DEFAULT_GENRE
+# The generator and model clients load autogen and the OpenAI SDK, so they are
+# imported when first needed and the page renders without waiting for them
+from config import GENRES, DEFAULT_GENRE, CLIENT_POOL_CONFIG, ANALYTICS_CONFIG, STORY_CONFIG, SERVICE_CONFIG
+
+AGENT_STATUS = {
+    "Character_Developer": "👥 Character Developer creating detailed profiles...",
+    "Story_Writer": "✍️ Story Writer crafting multi-chapter narrative...",
+    "Climax_Creator": "🎬 Climax Creator adding exciting enhancements...",
+}
+
+@st.cache_resource(show_spinner=False)
+def warm_up_model_clients():
+    """Open the shared model client connection pool once per server process"""
+    if not CLIENT_POOL_CONFIG["warm_up"]:
+        return False
+    from components.model_clients import warm_up
+    try:
+        return warm_up()
+    except ValueError:
+        # No API key yet; the API Status panel reports it
+        return False
+
+def get_jobs():
+    """The story service at STORY_SERVICE_URL when one is set, otherwise this process's own job queue"""
+    if SERVICE_CONFIG["url"]:
+        from components.service_client import get_service_client
+        return get_service_client()
+    from components.jobs import get_job_queue
+    return get_job_queue()
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id):
+    """Poll a queued or running job; only this part of the page re-renders while it waits"""
+    queue = get_jobs()
+    job = queue.get(job_id)
+    if job is None or not job.active:
+        # Finished: redraw the whole page to show the result
+        st.rerun()
+    
+    if job.status == "queued":
+        st.info(f"⏳ Waiting for a free story slot: {queue.position(job_id)} in line, "
+                f"{queue.workers} stories are written at a time.")
+    else:
+        st.text(f"{AGENT_STATUS.get(job.agent, '🤖 Initializing AI agents for long-form story...')} (turn {job.turn})")
+    st.progress(int(job.progress * 100))
+    if job.live_text:
+        st.markdown(f"**{job.agent.replace('_', ' ')}** is writing...")
+        st.markdown(job.live_text)
+    elif not job.parent_id:
+        # Something to read straight away: an offline draft from the genre's templates
+        from components.template_drafts import template_draft
+        with st.expander("👀 Quick preview while the agents write (a template draft, not your story)", expanded=False):
+            st.markdown(template_draft(job.title, job.genre))
+    
+    if st.button("⏹️ Cancel", key=f"cancel_{job_id}", help="Stop generating this story"):
+        queue.cancel(job_id)
+        st.rerun()
+
+def show_job(job_id):
+    """Progress, result or error of the story job started in this session"""
+    job = get_jobs().get(job_id)
+    if job is None:
+        del st.session_state["job_id"]
+        st.warning("⚠️ That story is no longer available. Please generate it again.")
+    elif job.active:
+        show_job_progress(job_id)
+    elif job.status == "done":
+        structured = job.structured
+        if structured is None:
+            # Jobs read back from the store keep only the text
+            from components.story_extraction import Story
+            structured = Story.from_text(job.story, job.title, job.genre)
+        render_story(job.title, job.story, job.stats, job.report, structured, job_id)
+    elif job.status == "cancelled":
+        st.info("⏹️ Story generation was cancelled.")
+    else:
+        st.error(f"❌ Error generating story: {job.error}")
+        
+        st.info("💡 Troubleshooting tips:")
+        st.markdown("""
+        - Check your internet connection
+        - Verify your OpenAI API key is valid and has credits
+        - Try a simpler title or different genre
+        - Make sure all required packages are installed
+        """)
+    
+    if not job.active and job.status != "done" and job.parent_id:
+        # A failed or cancelled edit leaves the story it started from untouched
+        if st.button("↩️ Back to the story", key=f"back_{job_id}"):
+            st.session_state["job_id"] = job.parent_id
+            st.rerun()
+
+def show_edit_form(structured, job_id):
+    """Queue an incremental edit of a finished story; only the chosen part is rewritten"""
+    with st.expander("✏️ Change part of this story", expanded=False):
+        st.caption("Only the part you pick is rewritten, in one or two model calls; the rest of the story stays as it is.")
+        choice = st.radio("What to change", ["Rewrite a chapter", "Redo the climax", "Swap a character"],
+                          horizontal=True, key=f"edit_kind_{job_id}")
+        chapter, character, replacement = None, "", ""
+        if choice == "Rewrite a chapter":
+            titles = {chapter.number: chapter.title for chapter in structured.chapters}
+            chapter = st.selectbox("Chapter", list(titles), key=f"edit_chapter_{job_id}",
+                                   format_func=lambda number: f"Chapter {number}: {titles[number]}" if titles[number] else f"Chapter {number}")
+        elif choice == "Swap a character":
+            character = st.text_input("Character to replace", key=f"edit_character_{job_id}")
+            replacement = st.text_input("Replace them with", placeholder="e.g. Pip, a shy young hedgehog",
+                                        key=f"edit_replacement_{job_id}")
+        instructions = st.text_input("Anything in particular? (optional)", key=f"edit_instructions_{job_id}")
+        
+        if st.button("✏️ Apply change", key=f"edit_submit_{job_id}"):
+            from components.jobs import QueueFullError
+            from components.story_edits import StoryEdit
+            kind = {"Rewrite a chapter": "chapter", "Redo the climax": "climax", "Swap a character": "character"}[choice]
+            try:
+                edit = StoryEdit(kind, chapter=chapter, character=character, replacement=replacement,
+                                 instructions=instructions.strip())
+                st.session_state["job_id"] = get_jobs().submit_edit(structured, edit, parent_id=job_id)
+            except ValueError as e:
+                st.warning(f"⚠️ {e}")
+            except QueueFullError as e:
+                st.warning(f"⏳ {e}")
+            else:
+                st.rerun()
+
+def render_story(title, story, run_stats, run_report, structured=None, job_id=None):
+    """Show a finished story with its statistics, download buttons and edit options"""
+    if story and len(story.strip()) > 800:  # Increased threshold for longer stories
+        st.success("🎉 Your 10+ page story is ready!")
+        
+        # Story display with better formatting
+        st.markdown("### 📖 Your Magical Story")
+        
+        # Create tabs for different views
+        tab1, tab2 = st.tabs(["📚 Read Story", "📊 Story Stats"])
+        
+        with tab1:
+            # Display story in a nice text area
+            st.text_area(
+                "Your Complete Story:",
+                value=story,
+                height=600,  # Increased height for longer stories
+                help="Your multi-chapter story appears here",
+                label_visibility="collapsed"
+            )
+        
+        with tab2:
+            # Story statistics
+            word_count = len(story.split())
+            char_count = len(story)
+            estimated_pages = max(10, word_count // 150)  # 150 words per page average
+            reading_time = max(5, word_count // 200)  # Average reading speed for children
+            
+            col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
+            with col_stats1:
+                st.metric("📝 Word Count", f"{word_count:,}")
+            with col_stats2:
+                st.metric("📄 Estimated Pages", estimated_pages)
+            with col_stats3:
+                st.metric("⏱️ Reading Time", f"{reading_time} min")
+            with col_stats4:
+                st.metric("🔤 Characters", f"{char_count:,}")
+            
+            from components.story_analytics import analyze_stories
+            scores = analyze_stories([structured if structured is not None else story]).iloc[0]
+            col_read1, col_read2, col_read3, col_read4 = st.columns(4)
+            with col_read1:
+                st.metric("🎓 Reading Grade", f"{scores['fk_grade']:.1f}",
+                          help="Flesch-Kincaid grade level, roughly the reader's age minus 5")
+            with col_read2:
+                st.metric("📑 Words per Chapter", f"{scores['words_per_chapter']:,.0f}" if scores["chapters"] else "-")
+            with col_read3:
+                st.metric("💬 Dialogue", f"{scores['dialogue_ratio']:.0%}")
+            with col_read4:
+                st.metric("🔡 Vocabulary", f"{scores['vocabulary_diversity']:.0%}", help="Distinct words as a share of all words")
+            if not scores["readable"]:
+                st.caption(f"📏 The reading grade is outside the {ANALYTICS_CONFIG['min_grade']:g} to "
+                           f"{ANALYTICS_CONFIG['max_grade']:g} range set for ages 4-10.")
+            
+            if run_stats.get("cache") in ("memory", "disk"):
+                st.caption("⚡ Served from the story cache. Tick 'Regenerate' for a fresh story.")
+            elif run_stats:
+                st.caption(
+                    f"🤖 {run_stats['agent_turns']} agent turns, {run_stats['model_calls']} model calls, "
+                    f"{run_stats['prompt_tokens'] + run_stats['completion_tokens']:,} tokens ({run_stats['mode']} mode)"
+                )
+                if run_stats.get("early_stop"):
+                    st.caption(f"✋ Stopped early: {run_stats['stop_reason']}")
+                if run_stats.get("winning_draft"):
+                    scores = ", ".join("-" if score is None else f"{score:.2f}" for score in run_stats["draft_scores"])
+                    st.caption(f"🎲 Kept draft {run_stats['winning_draft']} of {run_stats['drafts']} (scores {scores})")
+            if run_stats.get("fallback") == "template":
+                st.warning("🚦 The story service was too busy, so this is a quick draft from story templates. "
+                           "Generate it again in a few minutes for a story written by the agents.")
+            if run_stats.get("partial"):
+                st.warning(f"⏱️ Generation hit its time limit after {run_stats['elapsed_seconds']:.1f} seconds, so this story is partial.")
+                if run_stats.get("resumable") and job_id is not None and structured is not None:
+                    if st.button("▶️ Resume from the last finished turn", key=f"resume_{job_id}",
+                                 help="The agents pick up where they stopped, without paying again for the turns already written"):
+                        from components.jobs import QueueFullError
+                        try:
+                            st.session_state["job_id"] = get_jobs().submit_resume(run_stats["run_id"], title, structured.genre,
+                                                                                   parent_id=job_id)
+                        except (ValueError, QueueFullError) as e:
+                            st.warning(f"⏳ {e}")
+                        else:
+                            st.rerun()
+            
+            if run_report is not None and run_report.calls:
+                with st.expander("⏱️ Tokens, latency and cost per agent and model tier", expanded=False):
+                    st.table([
+                        {
+                            "Agent": role.replace("_", " "),
+                            "Calls": values["calls"],
+                            "Prompt tokens": values["prompt_tokens"],
+                            "Completion tokens": values["completion_tokens"],
+                            "Latency (s)": round(values["latency"], 1),
+                            "Retries": values["retries"],
+                        }
+                        for role, values in run_report.by_role().items()
+                    ])
+                    st.table([
+                        {
+                            "Tier": tier,
+                            "Model": values["model"],
+                            "Calls": values["calls"],
+                            "Tokens": values["prompt_tokens"] + values["completion_tokens"],
+                            "Latency (s)": round(values["latency"], 1),
+                            "Cost ($)": round(values["cost"], 4),
+                        }
+                        for tier, values in run_report.by_tier().items()
+                    ])
+                    st.download_button(
+                        label="📊 Download run report (JSON)",
+                        data=run_report.to_json(),
+                        file_name=f"{title.replace(' ', '_')}_run_report.json",
+                        mime="application/json"
+                    )
+            
+            # Reading level indicator
+            if word_count >= 1500:
+                st.success("✅ Meets 10+ page target!")
+            else:
+                st.warning(f"📏 Story is {word_count} words. Consider regenerating for fuller content.")
+                if job_id is not None and structured is not None:
+                    drafts = STORY_CONFIG["best_of_drafts"]
+                    if st.button(f"🎲 Write {drafts} drafts at once and keep the best", key=f"best_of_{job_id}",
+                                 help="The Story Writer drafts the whole story several times side by side from one set of characters, and the draft closest to the length, chapter and reading level targets is kept"):
+                        from components.jobs import QueueFullError
+                        try:
+                            st.session_state["job_id"] = get_jobs().submit(title, structured.genre, regenerate=True,
+                                                                                mode="best_of")
+                        except QueueFullError as e:
+                            st.warning(f"⏳ {e}")
+                        else:
+                            st.rerun()
+        
+        # Download options
+        col_dl1, col_dl2 = st.columns(2)
+        with col_dl1:
+            st.download_button(
+                label="📥 Download as Text",
+                data=story,
+                file_name=f"{title.replace(' ', '_')}_story.txt",
+                mime="text/plain"
+            )
+        with col_dl2:
+            # Format story for better reading
+            formatted_story = f"# {title}\n\n{story}"
+            st.download_button(
+                label="📄 Download as Markdown",
+                data=formatted_story,
+                file_name=f"{title.replace(' ', '_')}_story.md",
+                mime="text/markdown"
+            )
+    
+    else:
+        st.error("❌ Failed to generate a complete 10+ page story. Please try again.")
+        if story:
+            st.text_area("Partial output received:", value=story, height=300)
+    
+    if structured is not None and structured.chapters and job_id:
+        show_edit_form(structured, job_id)
+
+
+def show_library():
+    """Browse stored stories a page at a time; a story's text is only read when it is opened"""
+    st.markdown("---")
+    if not st.toggle("📚 Browse the story library", key="library_open"):
+        return
+    from components.story_library import get_story_library
+    library = get_story_library()
+    if library is None:
+        st.info("The story library is turned off (STORY_LIBRARY_ENABLED=false).")
+        return
+    
+    col_search, col_genre = st.columns([2, 1])
+    with col_search:
+        query = st.text_input("🔎 Search titles, characters and text", key="library_query")
+    with col_genre:
+        genre = st.selectbox("🎭 Genre", ["All genres"] + GENRES, key="library_genre")
+    genre = None if genre == "All genres" else genre
+    
+    # Cursors of the pages before this one; changing the filters starts again at the first page
+    filters = (query.strip(), genre)
+    if st.session_state.get("library_filters") != filters:
+        st.session_state["library_filters"] = filters
+        st.session_state["library_cursors"] = [None]
+    cursors = st.session_state["library_cursors"]
+    entries, next_cursor = library.page(cursor=cursors[-1], genre=genre, query=query)
+    
+    if not entries:
+        st.info("No stories found." if query.strip() else "Finished stories will appear here.")
+        return
+    if not query.strip():
+        st.caption(f"{library.count(genre):,} stories · page {len(cursors)}")
+    else:
+        st.caption(f"Page {len(cursors)} of the matches")
+    for entry in entries:
+        col_title, col_meta, col_open = st.columns([3, 3, 1])
+        col_title.markdown(f"**{entry.title}**  \n{entry.genre}")
+        col_meta.caption(
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry.created_at))} · {entry.word_count:,} words · "
+            f"{entry.chapter_count} chapters · {entry.mode or 'unknown'} mode"
+        )
+        if col_open.button("Open", key=f"library_open_{entry.id}"):
+            st.session_state["library_story"] = entry.id
+    
+    col_prev, col_next = st.columns(2)
+    if len(cursors) > 1 and col_prev.button("⬅️ Newer", key="library_newer"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor is not None and col_next.button("Older ➡️", key="library_older"):
+        cursors.append(next_cursor)
+        st.rerun()
+    
+    if st.session_state.get("library_story"):
+        show_library_story(library, st.session_state["library_story"])
+
+def show_library_story(library, entry_id):
+    """Show one stored story with the metadata of the run that wrote it"""
+    entry = library.get(entry_id)
+    story = library.load_story(entry_id) if entry is not None else None
+    if story is None:
+        st.warning("⚠️ This story is no longer in the library.")
+        return
+    st.markdown(f"### 📖 {entry.title}")
+    st.caption(
+        f"{entry.genre} · {entry.word_count:,} words · {entry.chapter_count} chapters · "
+        f"{entry.prompt_tokens + entry.completion_tokens:,} tokens · {entry.elapsed_seconds:.1f} s · "
+        f"${entry.cost_usd:.4f}" + (f" · {entry.models}" if entry.models else "")
+    )
+    st.text_area("Stored story:", value=story.text, height=500, key=f"library_text_{entry_id}",
+                 label_visibility="collapsed")
+    st.download_button(
+        label="📥 Download as Text",
+        data=story.text,
+        file_name=f"{entry.title.replace(' ', '_')}_story.txt",
+        mime="text/plain",
+        key=f"library_download_{entry_id}"
+    )
 
 def main():
     st.set_page_config(
@@ -41,6 +399,12 @@ def main():
             help="Choose the genre that best fits your story idea"
         )
         
+        regenerate = st.checkbox(
+            "🔄 Regenerate",
+            value=False,
+            help="Write a fresh story even if this title and genre were generated before"
+        )
+        
         # Generate button
         generate_clicked = st.button(
             "✨ Generate 10+ Page Story",
@@ -78,127 +442,27 @@ def main():
     with col2:
         st.markdown("#### Generated Story")
         
-        # Story output area
+        # Stories are generated by the background job queue, so reruns and
+        # refreshes do not interrupt them and every session shares its slots
         if generate_clicked:
             if title.strip():
-                # Show progress
-                progress_text = st.empty()
-                progress_bar = st.progress(0)
-                
+                from components.jobs import QueueFullError
+                from components.story_library import get_story_library
                 try:
-                    progress_text.text("🤖 Initializing AI agents for long-form story...")
-                    progress_bar.progress(10)
-                    
-                    # Initialize the story generator
-                    story_gen = StoryGenerator()
-                    
-                    progress_text.text("👥 Character Developer creating detailed profiles...")
-                    progress_bar.progress(25)
-                    
-                    progress_text.text("✍️ Story Writer crafting multi-chapter narrative...")
-                    progress_bar.progress(50)
-                    
-                    progress_text.text("🎬 Climax Creator adding exciting enhancements...")
-                    progress_bar.progress(75)
-                    
-                    # Generate the story
-                    story = story_gen.generate_story(title.strip(), genre)
-                    
-                    progress_text.text("� Finalizing your 10+ page story...")
-                    progress_bar.progress(100)
-                    
-                    # Clear progress indicators
-                    progress_text.empty()
-                    progress_bar.empty()
-                    
-                    # Display the story
-                    if story and len(story.strip()) > 800:  # Increased threshold for longer stories
-                        st.success("🎉 Your 10+ page story is ready!")
-                        
-                        # Story display with better formatting
-                        st.markdown("### 📖 Your Magical Story")
-                        
-                        # Create tabs for different views
-                        tab1, tab2 = st.tabs(["📚 Read Story", "📊 Story Stats"])
-                        
-                        with tab1:
-                            # Display story in a nice text area
-                            st.text_area(
-                                "Your Complete Story:",
-                                value=story,
-                                height=600,  # Increased height for longer stories
-                                help="Your multi-chapter story appears here",
-                                label_visibility="collapsed"
-                            )
-                        
-                        with tab2:
-                            # Story statistics
-                            word_count = len(story.split())
-                            char_count = len(story)
-                            estimated_pages = max(10, word_count // 150)  # 150 words per page average
-                            reading_time = max(5, word_count // 200)  # Average reading speed for children
-                            
-                            col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
-                            with col_stats1:
-                                st.metric("📝 Word Count", f"{word_count:,}")
-                            with col_stats2:
-                                st.metric("📄 Estimated Pages", estimated_pages)
-                            with col_stats3:
-                                st.metric("⏱️ Reading Time", f"{reading_time} min")
-                            with col_stats4:
-                                st.metric("🔤 Characters", f"{char_count:,}")
-                            
-                            # Reading level indicator
-                            if word_count >= 1500:
-                                st.success("✅ Meets 10+ page target!")
-                            else:
-                                st.warning(f"📏 Story is {word_count} words. Consider regenerating for fuller content.")
-                        
-                        # Download options
-                        col_dl1, col_dl2 = st.columns(2)
-                        with col_dl1:
-                            st.download_button(
-                                label="📥 Download as Text",
-                                data=story,
-                                file_name=f"{title.replace(' ', '_')}_story.txt",
-                                mime="text/plain"
-                            )
-                        with col_dl2:
-                            # Format story for better reading
-                            formatted_story = f"# {title}\n\n{story}"
-                            st.download_button(
-                                label="📄 Download as Markdown",
-                                data=formatted_story,
-                                file_name=f"{title.replace(' ', '_')}_story.md",
-                                mime="text/markdown"
-                            )
-                            
-                    else:
-                        st.error("❌ Failed to generate a complete 10+ page story. Please try again.")
-                        if story:
-                            st.text_area("Partial output received:", value=story, height=300)
-                        
-                except Exception as e:
-                    # Clear progress indicators
-                    progress_text.empty()
-                    progress_bar.empty()
-                    
-                    st.error(f"❌ Error generating story: {str(e)}")
-                    
-                    # Show detailed error in expander for debugging
-                    with st.expander("🔍 Detailed Error Information", expanded=False):
-                        st.text(traceback.format_exc())
-                    
-                    st.info("💡 Troubleshooting tips:")
-                    st.markdown("""
-                    - Check your internet connection
-                    - Verify your OpenAI API key is valid and has credits
-                    - Try a simpler title or different genre
-                    - Make sure all required packages are installed
-                    """)
+                    st.session_state["job_id"] = get_jobs().submit(title.strip(), genre, regenerate=regenerate)
+                except QueueFullError as e:
+                    st.warning(f"⏳ {e}")
+                library = get_story_library()
+                earlier = library.find(title, genre) if library is not None else []
+                if earlier:
+                    st.caption(f"📚 {len(earlier)} earlier {'story' if len(earlier) == 1 else 'stories'} with this "
+                               f"title {'is' if len(earlier) == 1 else 'are'} in the story library below.")
             else:
                 st.warning("⚠️ Please enter a title for your 10+ page story.")
-        else:
+        
+        if st.session_state.get("job_id"):
+            show_job(st.session_state["job_id"])
+        elif not generate_clicked:
             st.info("👆 Enter a title and click 'Generate 10+ Page Story' to create your magical tale!")
             
             # Show example story structure
@@ -224,6 +488,9 @@ def main():
                 - Positive life lessons woven naturally into the story
                 """)
     
+    # Past stories, read from the library only when the view is opened
+    show_library()
+    
     # Add sidebar with information
     with st.sidebar:
         st.markdown("### 🤖 About the AI Agents")
@@ -274,6 +541,9 @@ def main():
         - **Generation Time**: 2-5 minutes for full stories
         - **Termination**: Auto-stop when story is complete
         """)
+    
+    # Runs after the page is drawn so opening the connection pool never delays it
+    warm_up_model_clients()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
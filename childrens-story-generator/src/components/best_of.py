@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from autogen_core.models import ChatCompletionClient, CreateResult, SystemMessage, UserMessage
+from agents.character_agent import CharacterAgent
+from agents.writer_agent import WriterAgent
+from components.story_events import AgentStarted, MessageComplete, StoryEvent, UsageUpdate
+from components.rate_limits import is_model_error
+from components.story_extraction import Story
+from config import STORY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class BestOfDrafts:
+    """Write several complete drafts of a story at once and keep the best one.
+
+    Phases: character profiles, then ``drafts`` Story_Writer requests for the
+    whole story, all in flight at once with the same profiles, each at the
+    next temperature of ``temperatures``. The finished drafts are scored
+    locally (``quality`` from ``story_analytics``: length, chapter count and
+    readability, ties going to more dialogue), so picking the winner costs
+    no model call. Wall time is that of the slowest draft, where retrying a
+    short story by hand costs a full run per attempt. A draft whose model
+    request fails (an API error, not a bug) is left out of the pick, its
+    error logged and kept in ``draft_errors``; the round only fails when no
+    draft finished.
+    """
+
+    def __init__(self, client_for: Callable[[str], ChatCompletionClient], drafts: Optional[int] = None,
+                 temperatures: Optional[Sequence[float]] = None, chapters: Optional[int] = None,
+                 words_per_chapter: Optional[int] = None):
+        self.client_for = client_for
+        self.drafts = max(1, drafts or STORY_CONFIG["best_of_drafts"])
+        self.temperatures = list(STORY_CONFIG["best_of_temperatures"] if temperatures is None else temperatures)
+        self.chapters = chapters or STORY_CONFIG["chapters"]
+        self.words_per_chapter = words_per_chapter or STORY_CONFIG["min_total_words"] // self.chapters
+        self.characters = ""
+        self.draft_texts: List[str] = []
+        self.draft_errors: Dict[int, str] = {}
+        self.scores: Dict[int, Optional[float]] = {}
+        self.winner: Optional[int] = None
+        self.story = ""
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.draft_seconds: List[float] = []
+        self.draft_phase_seconds = 0.0
+
+    def temperature(self, index: int) -> Optional[float]:
+        """Temperature of draft ``index``; None keeps the Story_Writer tier's own"""
+        return self.temperatures[index % len(self.temperatures)] if self.temperatures else None
+
+    async def _ask(self, role: str, system_message: str, prompt: str,
+                   temperature: Optional[float] = None) -> CreateResult:
+        result = await self.client_for(role).create([
+            SystemMessage(content=system_message),
+            UserMessage(content=prompt, source="user")
+        ], extra_create_args={"temperature": temperature} if temperature is not None else {})
+        self.calls += 1
+        self.prompt_tokens += result.usage.prompt_tokens
+        self.completion_tokens += result.usage.completion_tokens
+        return result
+
+    def _usage(self, role: str) -> UsageUpdate:
+        return UsageUpdate(agent=role, prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+
+    async def run(self, title: str, genre: str) -> str:
+        """Run every phase without reporting progress and return the winning draft"""
+        async for _ in self.events(title, genre):
+            pass
+        return self.story
+
+    async def events(self, title: str, genre: str) -> AsyncIterator[StoryEvent]:
+        """Run every phase, yielding progress events; the winning draft is left in self.story"""
+        turn = 1
+        yield AgentStarted(agent=CharacterAgent.NAME, turn=turn)
+        result = await self._ask(CharacterAgent.NAME, CharacterAgent.SYSTEM_MESSAGE, (
+            f'Create the main characters for a {genre} children\'s story titled "{title}" '
+            f"with {self.chapters} chapters for ages 4-10. Give each character a short profile."
+        ))
+        self.characters = result.content
+        yield MessageComplete(agent=CharacterAgent.NAME, content=self.characters, turn=turn)
+        yield self._usage(CharacterAgent.NAME)
+
+        prompt = (
+            f'Write the complete {genre} children\'s story "{title}" for ages 4-10 using these characters:\n\n'
+            f"{self.characters}\n\n"
+            f"Write {self.chapters} chapters of about {self.words_per_chapter} words each, at least "
+            f"{STORY_CONFIG['min_total_words']} words in total, each starting with the heading "
+            f"'Chapter N: <chapter title>'. Use rich dialogue and vivid descriptions, build to an exciting but "
+            f"safe climax in Chapter {max(1, self.chapters - 1)} and end with a satisfying conclusion and a gentle "
+            f"life lesson."
+        )
+        draft_phase_started = time.perf_counter()
+        self.draft_seconds = [0.0] * self.drafts
+        self.draft_texts = [""] * self.drafts
+        self.draft_errors = {}
+
+        async def write_draft(index: int):
+            started = time.perf_counter()
+            try:
+                result = await self._ask(WriterAgent.NAME, WriterAgent.SYSTEM_MESSAGE, prompt,
+                                         self.temperature(index))
+            except Exception as e:
+                if not is_model_error(e):
+                    raise
+                # e.g. a content filter refusal; the other drafts still compete
+                logger.warning("Best-of draft %d of %d failed: %s", index + 1, self.drafts, e)
+                self.draft_errors[index] = str(e) or type(e).__name__
+                return index, None, e
+            finally:
+                self.draft_seconds[index] = time.perf_counter() - started
+            return index, result.content.strip(), None
+
+        # Every draft is in flight at once; they complete (and are reported) in any order
+        tasks = [asyncio.ensure_future(write_draft(index)) for index in range(self.drafts)]
+        first_error = None
+        yield AgentStarted(agent=WriterAgent.NAME, turn=turn + 1)
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, text, error = await finished
+                if error is not None:
+                    first_error = first_error or error
+                    continue
+                self.draft_texts[index] = text
+                turn += 1
+                yield MessageComplete(agent=WriterAgent.NAME, content=text, turn=turn)
+                yield self._usage(WriterAgent.NAME)
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.draft_phase_seconds = time.perf_counter() - draft_phase_started
+        if not self.pick(title, genre) and first_error is not None:
+            raise first_error
+
+    def pick(self, title: str = "", genre: str = "") -> str:
+        """Score the finished drafts and keep the best in self.story (empty when none finished)"""
+        finished = [index for index, text in enumerate(self.draft_texts) if text]
+        self.scores = {index: None for index in range(len(self.draft_texts)) if index not in finished}
+        if not finished:
+            return ""
+        # pandas is loaded on first use, so importing the generator stays cheap
+        from components.story_analytics import analyze_stories
+        frame = analyze_stories([Story.from_text(self.draft_texts[index], title, genre) for index in finished])
+        frame.index = finished
+        self.scores.update({index: round(float(quality), 3) for index, quality in frame["quality"].items()})
+        self.winner = int(frame.sort_values(["quality", "dialogue_ratio"], ascending=False, kind="stable").index[0])
+        self.story = self.draft_texts[self.winner]
+        return self.story
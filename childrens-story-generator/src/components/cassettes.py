@@ -0,0 +1,257 @@
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from autogen_core.models import CreateResult, RequestUsage
+from components.model_clients import DelegatingChatCompletionClient
+
+REPLAY_TIMINGS = ("original", "none")
+# Interactions compressed together as one gzip member
+_FLUSH_EVERY = 32
+
+
+class CassetteMiss(KeyError):
+    """A replayed request has no recorded response"""
+
+
+def request_fingerprint(messages, json_output=None, extra_create_args=None) -> str:
+    """Stable hash of a model request: message types, sources and contents"""
+    payload = [
+        [type(message).__name__, getattr(message, "source", None), _jsonable(getattr(message, "content", None))]
+        for message in messages
+    ]
+    if isinstance(json_output, type):
+        json_output = json_output.__name__
+    body = json.dumps([payload, json_output, extra_create_args or {}], sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+class Cassette:
+    """Recorded model interactions, stored as gzip-compressed JSON lines.
+
+    Each line holds one request fingerprint with its final CreateResult, the
+    call latency and, for streamed calls, every chunk with its offset from the
+    start of the call. Recording buffers interactions and appends them as one
+    gzip member every ``_FLUSH_EVERY`` interactions and on ``flush()`` (called
+    at exit), so they compress against each other and a crashed run still
+    leaves a readable cassette, short of its last few interactions.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.interactions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.model_info: Optional[Dict[str, Any]] = None
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    cassette.interactions[interaction["key"]].append(interaction)
+                    cassette.model_info = cassette.model_info or interaction.get("model_info")
+        return cassette
+
+    def __len__(self) -> int:
+        return sum(len(recorded) for recorded in self.interactions.values())
+
+    def append(self, interaction: Dict[str, Any]):
+        with self._lock:
+            self.interactions[interaction["key"]].append(interaction)
+            self._pending.append(json.dumps(interaction, separators=(",", ":")))
+            if len(self._pending) >= _FLUSH_EVERY:
+                self._write_pending()
+
+    def flush(self):
+        """Write the buffered interactions to the cassette file"""
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write("\n".join(self._pending) + "\n")
+        self._pending = []
+
+
+class RecordingChatCompletionClient(DelegatingChatCompletionClient):
+    """Forwards calls to the real client and writes every request/response to a cassette"""
+
+    def __init__(self, inner, cassette: Cassette):
+        super().__init__(inner)
+        self.cassette = cassette
+
+    async def create(self, messages, **kwargs):
+        started = time.perf_counter()
+        result = await self.inner.create(messages, **kwargs)
+        self.cassette.append({
+            "key": request_fingerprint(messages, kwargs.get("json_output"), kwargs.get("extra_create_args")),
+            "stream": False,
+            "latency": time.perf_counter() - started,
+            "chunks": [],
+            "result": result.model_dump(mode="json"),
+            "model_info": dict(self.inner.model_info),
+        })
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        started = time.perf_counter()
+        chunks = []
+        result = None
+        async for chunk in self.inner.create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult):
+                result = chunk
+            else:
+                chunks.append([time.perf_counter() - started, chunk])
+            yield chunk
+        if result is not None:
+            self.cassette.append({
+                "key": request_fingerprint(messages, kwargs.get("json_output"), kwargs.get("extra_create_args")),
+                "stream": True,
+                "latency": time.perf_counter() - started,
+                "chunks": chunks,
+                "result": result.model_dump(mode="json"),
+                "model_info": dict(self.inner.model_info),
+            })
+
+
+class ReplayingChatCompletionClient(DelegatingChatCompletionClient):
+    """Serves recorded responses for matching requests, without any network access.
+
+    Identical requests are answered in recorded order and start over once
+    exhausted, so the same cassette can drive many runs. With timing
+    "original" the recorded latency and chunk offsets are reproduced;
+    with "none" responses are returned immediately.
+    """
+
+    def __init__(self, cassette: Cassette, timing: str = "none", inner=None):
+        super().__init__(inner)
+        if timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unknown replay timing '{timing}', expected one of {REPLAY_TIMINGS}")
+        self.cassette = cassette
+        self.timing = timing
+        self.calls = 0
+        self.simulated_seconds = 0.0
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _next(self, messages, kwargs) -> Dict[str, Any]:
+        key = request_fingerprint(messages, kwargs.get("json_output"), kwargs.get("extra_create_args"))
+        recorded = self.cassette.interactions.get(key)
+        if not recorded:
+            raise CassetteMiss(f"No recorded response for request {key[:12]} in {self.cassette.path}")
+        interaction = recorded[self._cursors[key] % len(recorded)]
+        self._cursors[key] += 1
+        return interaction
+
+    def _result(self, interaction: Dict[str, Any]) -> CreateResult:
+        result = CreateResult.model_validate(interaction["result"])
+        self.calls += 1
+        self._usage = RequestUsage(
+            prompt_tokens=self._usage.prompt_tokens + result.usage.prompt_tokens,
+            completion_tokens=self._usage.completion_tokens + result.usage.completion_tokens
+        )
+        return result
+
+    async def _sleep(self, seconds: float):
+        if self.timing == "original" and seconds > 0:
+            self.simulated_seconds += seconds
+            await asyncio.sleep(seconds)
+
+    async def create(self, messages, **kwargs):
+        interaction = self._next(messages, kwargs)
+        await self._sleep(interaction["latency"])
+        return self._result(interaction)
+
+    async def create_stream(self, messages, **kwargs):
+        interaction = self._next(messages, kwargs)
+        elapsed = 0.0
+        for offset, text in interaction["chunks"]:
+            await self._sleep(offset - elapsed)
+            elapsed = offset
+            yield text
+        await self._sleep(interaction["latency"] - elapsed)
+        yield self._result(interaction)
+
+    def actual_usage(self) -> RequestUsage:
+        return self._usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._usage
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        if self.inner is not None:
+            return self.inner.count_tokens(messages, **kwargs)
+        return sum(len(str(getattr(message, "content", ""))) // 4 for message in messages)
+
+    def remaining_tokens(self, messages, **kwargs) -> int:
+        if self.inner is not None:
+            return self.inner.remaining_tokens(messages, **kwargs)
+        return max(0, 128000 - self.count_tokens(messages))
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self):
+        # Group chats format prompts by model family, so replay must report the recorded one
+        if self.inner is not None:
+            return self.inner.model_info
+        return self.cassette.model_info or {"vision": False, "function_calling": False, "json_output": False,
+                "family": "unknown", "structured_output": False}
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str, mode: str) -> Cassette:
+    """Process-wide cassette per path: loaded for replay, appended to when recording"""
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            if mode == "replay":
+                cassette = Cassette.load(path)
+            else:
+                cassette = Cassette(path)
+                atexit.register(cassette.flush)
+            _cassettes[path] = cassette
+        return cassette
+
+
+def wrap_for_cassette(client, mode: str, path: str, timing: str = "none"):
+    """Wrap a model client for recording or replay according to the cassette mode.
+
+    In replay mode ``client`` may be None; recorded responses are then served
+    without any real client behind them.
+    """
+    if mode == "record":
+        return RecordingChatCompletionClient(client, get_cassette(path, mode))
+    if mode == "replay":
+        return ReplayingChatCompletionClient(get_cassette(path, mode), timing=timing, inner=client)
+    return client
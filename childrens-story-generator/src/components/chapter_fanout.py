@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import re
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from autogen_core.models import ChatCompletionClient, CreateResult, SystemMessage, UserMessage
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.rate_limits import is_model_error
+from components.story_events import AgentStarted, MessageComplete, StoryEvent, UsageUpdate
+from config import STORY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_OUTLINE_LINE = re.compile(r"^\s*\**\s*chapter\s+(\d+)\s*[:.\-–]\s*(.+)$", re.IGNORECASE)
+_BRIDGE_LINE = re.compile(r"^\s*bridge\s+(\d+)\s*:\s*(.+)$", re.IGNORECASE)
+
+
+class ChapterFanout:
+    """Write a story as an outline followed by concurrently written chapters.
+
+    Phases: character profiles, then a chapter-by-chapter outline, then one
+    request per chapter (all in flight at once, sharing the profiles and
+    outline as context), then a short continuity pass that only returns
+    bridging sentences between chapters. Wall time is dominated by the
+    slowest chapter rather than the length of the whole story. A chapter
+    whose model request fails is logged, kept in ``chapter_errors`` and
+    left out of the story; the fan-out only fails when no chapter was
+    written.
+    """
+
+    def __init__(self, client_for: Callable[[str], ChatCompletionClient], chapters: Optional[int] = None,
+                 words_per_chapter: Optional[int] = None, continuity_pass: Optional[bool] = None):
+        self.client_for = client_for
+        self.chapters = chapters or STORY_CONFIG["chapters"]
+        self.words_per_chapter = words_per_chapter or STORY_CONFIG["min_total_words"] // self.chapters
+        self.continuity_pass = (STORY_CONFIG["fanout_continuity_pass"]
+                                if continuity_pass is None else continuity_pass)
+        self.characters = ""
+        self.outline = ""
+        self.chapter_texts: List[str] = []
+        self.bridges: Dict[int, str] = {}
+        self.chapter_errors: Dict[int, str] = {}
+        self.story = ""
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chapter_seconds: List[float] = []
+        self.chapter_phase_seconds = 0.0
+
+    async def _ask(self, role: str, system_message: str, prompt: str) -> CreateResult:
+        result = await self.client_for(role).create([
+            SystemMessage(content=system_message),
+            UserMessage(content=prompt, source="user")
+        ])
+        self.calls += 1
+        self.prompt_tokens += result.usage.prompt_tokens
+        self.completion_tokens += result.usage.completion_tokens
+        return result
+
+    def _usage(self, role: str) -> UsageUpdate:
+        return UsageUpdate(agent=role, prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+
+    def parse_outline(self, outline: str) -> Dict[int, str]:
+        """Map chapter number to its outline line, for 'Chapter k: ...' formatted outlines"""
+        entries = {}
+        for line in outline.splitlines():
+            match = _OUTLINE_LINE.match(line)
+            if match and 1 <= int(match.group(1)) <= self.chapters:
+                entries.setdefault(int(match.group(1)), match.group(2).strip(" *"))
+        return entries
+
+    async def run(self, title: str, genre: str) -> str:
+        """Run every phase without reporting progress and return the stitched story"""
+        async for _ in self.events(title, genre):
+            pass
+        return self.story
+
+    async def events(self, title: str, genre: str) -> AsyncIterator[StoryEvent]:
+        """Run every phase, yielding progress events; the story is left in self.story"""
+        turn = 1
+        yield AgentStarted(agent=CharacterAgent.NAME, turn=turn)
+        result = await self._ask(CharacterAgent.NAME, CharacterAgent.SYSTEM_MESSAGE, (
+            f'Create the main characters for a {genre} children\'s story titled "{title}" '
+            f"with {self.chapters} chapters for ages 4-10. Give each character a short profile."
+        ))
+        self.characters = result.content
+        yield MessageComplete(agent=CharacterAgent.NAME, content=self.characters, turn=turn)
+        yield self._usage(CharacterAgent.NAME)
+
+        turn += 1
+        yield AgentStarted(agent=WriterAgent.NAME, turn=turn)
+        result = await self._ask(WriterAgent.NAME, WriterAgent.SYSTEM_MESSAGE, (
+            f'Plan the {genre} story "{title}" using these characters:\n\n{self.characters}\n\n'
+            f"Write a chapter-by-chapter outline with exactly {self.chapters} lines, one per chapter, "
+            f"each formatted as 'Chapter N: <chapter title> - <two sentence summary>'. Do not write the story yet."
+        ))
+        self.outline = result.content
+        yield MessageComplete(agent=WriterAgent.NAME, content=self.outline, turn=turn)
+        yield self._usage(WriterAgent.NAME)
+
+        outline_entries = self.parse_outline(self.outline)
+        chapter_phase_started = time.perf_counter()
+        self.chapter_seconds = [0.0] * self.chapters
+        self.chapter_errors = {}
+
+        async def write_chapter(number: int):
+            started = time.perf_counter()
+            focus = outline_entries.get(number, f"chapter {number} of the outline")
+            try:
+                result = await self._ask(WriterAgent.NAME, WriterAgent.SYSTEM_MESSAGE, (
+                    f'You are writing the {genre} story "{title}".\n\nCHARACTERS:\n{self.characters}\n\n'
+                    f"OUTLINE:\n{self.outline}\n\n"
+                    f"Write ONLY Chapter {number} of {self.chapters} ({focus}), about {self.words_per_chapter} "
+                    f"words. Start with the heading 'Chapter {number}: <chapter title>'. Stay consistent with the "
+                    f"outline and do not write any other chapter."
+                ))
+            except Exception as e:
+                if not is_model_error(e):
+                    raise
+                # e.g. a content filter refusal; the other chapters still make a story
+                logger.warning("Fan-out chapter %d of %d failed: %s", number, self.chapters, e)
+                self.chapter_errors[number] = str(e) or type(e).__name__
+                return number, None, e
+            finally:
+                self.chapter_seconds[number - 1] = time.perf_counter() - started
+            return number, result.content.strip(), None
+
+        # Every chapter is in flight at once; they complete (and are reported) in any order
+        tasks = [asyncio.ensure_future(write_chapter(number)) for number in range(1, self.chapters + 1)]
+        self.chapter_texts = [""] * self.chapters
+        first_error = None
+        yield AgentStarted(agent=WriterAgent.NAME, turn=turn + 1)
+        try:
+            for finished in asyncio.as_completed(tasks):
+                number, text, error = await finished
+                if error is not None:
+                    first_error = first_error or error
+                    continue
+                self.chapter_texts[number - 1] = text
+                turn += 1
+                yield MessageComplete(agent=WriterAgent.NAME, content=text, turn=turn)
+                yield self._usage(WriterAgent.NAME)
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.chapter_phase_seconds = time.perf_counter() - chapter_phase_started
+        if first_error is not None and not any(self.chapter_texts):
+            raise first_error
+
+        # Only chapters that were both written are bridged
+        pairs = [number for number in range(1, self.chapters)
+                 if self.chapter_texts[number - 1] and self.chapter_texts[number]]
+        if self.continuity_pass and pairs:
+            turn += 1
+            yield AgentStarted(agent=ClimaxAgent.NAME, turn=turn)
+            boundaries = "\n\n".join(
+                f"END OF CHAPTER {number}: {self._last_paragraph(self.chapter_texts[number - 1])}\n"
+                f"START OF CHAPTER {number + 1}: {self._first_paragraph(self.chapter_texts[number])}"
+                for number in pairs
+            )
+            result = await self._ask(ClimaxAgent.NAME, ClimaxAgent.SYSTEM_MESSAGE, (
+                f'The chapters of "{title}" were written separately from this outline:\n\n{self.outline}\n\n'
+                f"Here is how each chapter ends and the next begins:\n\n{boundaries}\n\n"
+                f"For each chapter from 2 to {self.chapters}, write one or two sentences that smoothly connect it "
+                f"to the previous chapter and build excitement. Reply only with lines formatted as "
+                f"'BRIDGE N: <sentences>'."
+            ))
+            self.bridges = {number: bridge for number, bridge in self.parse_bridges(result.content).items()
+                            if number - 1 in pairs}
+            yield MessageComplete(agent=ClimaxAgent.NAME, content=result.content, turn=turn)
+            yield self._usage(ClimaxAgent.NAME)
+
+        self.story = self.stitch()
+
+    def parse_bridges(self, content: str) -> Dict[int, str]:
+        bridges = {}
+        for line in content.splitlines():
+            match = _BRIDGE_LINE.match(line)
+            if match and 2 <= int(match.group(1)) <= self.chapters:
+                bridges[int(match.group(1))] = match.group(2).strip()
+        return bridges
+
+    @staticmethod
+    def _first_paragraph(text: str) -> str:
+        paragraphs = [p for p in text.split("\n\n") if p.strip() and not p.lower().startswith("chapter")]
+        return paragraphs[0].strip() if paragraphs else text[:400]
+
+    @staticmethod
+    def _last_paragraph(text: str) -> str:
+        paragraphs = [p for p in text.split("\n\n") if p.strip()]
+        return paragraphs[-1].strip() if paragraphs else text[-400:]
+
+    def stitch(self) -> str:
+        """Join the finished chapters in order, opening each with its continuity bridge"""
+        parts = []
+        for number, text in enumerate(self.chapter_texts, 1):
+            if not text:
+                continue
+            bridge = self.bridges.get(number)
+            if bridge:
+                heading, _, body = text.partition("\n")
+                text = f"{heading}\n\n{bridge}\n\n{body.lstrip()}" if heading.lower().startswith("chapter") \
+                    else f"{bridge}\n\n{text}"
+            parts.append(text)
+        return "\n\n".join(parts)
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import CHECKPOINT_CONFIG
+
+
+class CheckpointStore:
+    """Saved team state for in-progress story runs, one JSON file per run id.
+
+    A checkpoint holds the request (title, genre, mode, rounds), the output
+    of ``team.save_state()`` and the messages produced so far. Files are
+    replaced atomically, so a crash mid-write leaves the previous turn intact.
+    ``save()`` writes the file and blocks, so callers on an event loop run
+    it in a thread.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or CHECKPOINT_CONFIG["path"]
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, run_id: str) -> str:
+        if not run_id or not run_id.isalnum():
+            raise ValueError(f"Invalid run id '{run_id}'")
+        return os.path.join(self.directory, f"{run_id}.json")
+
+    def save(self, run_id: str, checkpoint: Dict[str, Any]):
+        path = self._path(run_id)
+        temp_path = f"{path}.tmp"
+        with self._lock:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                # Anything that is not plain JSON fails here rather than being saved as a
+                # string that load_state() cannot restore
+                json.dump({**checkpoint, "run_id": run_id, "updated_at": time.time()}, f)
+            os.replace(temp_path, path)
+
+    def __contains__(self, run_id: str) -> bool:
+        try:
+            return os.path.exists(self._path(run_id))
+        except ValueError:
+            return False
+
+    def load(self, run_id: str) -> Dict[str, Any]:
+        """Return the checkpoint for a run; raises KeyError when there is none"""
+        try:
+            with open(self._path(run_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"No checkpoint for run '{run_id}'") from None
+
+    def delete(self, run_id: str):
+        try:
+            os.remove(self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of the saved runs, most recently updated first"""
+        runs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                checkpoint = self.load(name[:-len(".json")])
+            except (KeyError, ValueError):
+                continue
+            runs.append({key: checkpoint.get(key) for key in
+                         ("run_id", "title", "genre", "mode", "agent_turns", "updated_at")})
+        return sorted(runs, key=lambda run: run["updated_at"] or 0, reverse=True)
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Return the process-wide checkpoint store, or None when checkpoints are disabled"""
+    global _store
+    if not CHECKPOINT_CONFIG["enabled"]:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
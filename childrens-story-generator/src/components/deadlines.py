@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Optional
+
+from autogen_core import CancellationToken
+from components.model_clients import DelegatingChatCompletionClient
+from config import TEAM_CONFIG
+
+
+class RunDeadline:
+    """Deadline for a whole story run and for each turn within it.
+
+    Used as ``async with deadline:`` around the run. A watchdog task cancels
+    ``token`` as soon as either limit passes; call ``next_turn()`` whenever
+    an agent finishes a turn to restart the per-turn clock. After expiry,
+    ``reason`` says which limit was hit.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, turn_timeout: Optional[float] = None):
+        self.timeout = timeout or TEAM_CONFIG["timeout"]
+        self.turn_timeout = turn_timeout or TEAM_CONFIG["turn_timeout"]
+        self.token = CancellationToken()
+        self.started = time.monotonic()
+        self.turn_started = self.started
+        self.reason: Optional[str] = None
+        self._watchdog: Optional[asyncio.Task] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self) -> bool:
+        return self.reason is not None
+
+    def next_turn(self):
+        self.turn_started = time.monotonic()
+
+    async def _watch(self):
+        while True:
+            run_left = self.started + self.timeout - time.monotonic()
+            turn_left = self.turn_started + self.turn_timeout - time.monotonic()
+            if run_left <= 0:
+                self.reason = f"run deadline of {self.timeout:g}s reached"
+            elif turn_left <= 0:
+                self.reason = f"turn deadline of {self.turn_timeout:g}s reached"
+            if self.reason:
+                self.token.cancel()
+                return
+            await asyncio.sleep(min(run_left, turn_left))
+
+    async def __aenter__(self) -> "RunDeadline":
+        self.started = time.monotonic()
+        self.turn_started = self.started
+        self._watchdog = asyncio.ensure_future(self._watch())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._watchdog.cancel()
+        return False
+
+
+class CancellableChatCompletionClient(DelegatingChatCompletionClient):
+    """Ties every model call to a cancellation token so a deadline stops in-flight requests.
+
+    Agents inside a team receive their own cancellation tokens from the
+    runtime, so without this a cancelled run would still wait for the
+    current model call to finish.
+    """
+
+    def __init__(self, inner, token: CancellationToken):
+        super().__init__(inner)
+        self.token = token
+
+    async def create(self, messages, **kwargs):
+        future = asyncio.ensure_future(self.inner.create(messages, **kwargs))
+        self.token.link_future(future)
+        return await future
+
+    async def create_stream(self, messages, **kwargs):
+        stream = self.inner.create_stream(messages, **kwargs)
+        try:
+            while True:
+                future = asyncio.ensure_future(stream.__anext__())
+                self.token.link_future(future)
+                try:
+                    yield await future
+                except StopAsyncIteration:
+                    return
+        finally:
+            await stream.aclose()
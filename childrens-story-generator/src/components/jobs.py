@@ -0,0 +1,434 @@
+import asyncio
+import atexit
+import concurrent.futures
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, List, Optional
+
+from components.metrics import RunReport, get_metrics
+from components.model_clients import get_registry
+from components.story_events import AgentStarted, MessageComplete, Terminated, TokenChunk
+from config import JOB_CONFIG, STORY_CONFIG
+from utils.helpers import sqlite_transaction
+
+if TYPE_CHECKING:
+    from components.story_edits import StoryEdit
+    from components.story_extraction import Story
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when ``max_queued`` jobs are already waiting"""
+
+
+@dataclass
+class Job:
+    """One story request and everything known about it so far.
+
+    ``agent``, ``turn``, ``progress`` and ``live_text`` follow the run while
+    it is generating; ``story``, ``structured``, ``stats`` and ``report`` are
+    filled in when it finishes. ``mode`` overrides the generator's
+    orchestration mode for this story. Edit jobs carry the ``edit``, the
+    ``source`` story it applies to and the ``parent_id`` of the job that
+    wrote it. Resume jobs carry the ``resume_id`` of the checkpointed run
+    they continue. Only the request, status, timestamps and outcome are
+    persisted, so jobs loaded from the store have no live fields, mode,
+    structured story or report.
+    """
+    job_id: str
+    title: str
+    genre: str
+    regenerate: bool = False
+    mode: Optional[str] = None
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    agent: Optional[str] = None
+    turn: int = 0
+    progress: float = 0.0
+    story: str = ""
+    stats: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    report: Optional[RunReport] = None
+    structured: Optional["Story"] = None
+    edit: Optional["StoryEdit"] = None
+    source: Optional["Story"] = field(default=None, repr=False)
+    parent_id: Optional[str] = None
+    resume_id: Optional[str] = None
+    chunks: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def live_text(self) -> str:
+        """What the current agent has written so far this turn"""
+        return "".join(self.chunks)
+
+    @property
+    def wait_seconds(self) -> float:
+        return (self.started_at or self.finished_at or time.time()) - self.submitted_at
+
+
+class JobStore:
+    """SQLite record of submitted jobs and their outcomes.
+
+    Lets finished stories outlive Streamlit sessions and server restarts.
+    Jobs that were still queued or running when the previous process exited
+    are marked failed on start-up.
+    """
+
+    _COLUMNS = ("job_id", "title", "genre", "regenerate", "status", "submitted_at", "started_at",
+                "finished_at", "story", "stats", "error")
+
+    def __init__(self, path: Optional[str] = None, retention_seconds: Optional[float] = None):
+        self.path = path if path is not None else JOB_CONFIG["path"]
+        self.retention_seconds = JOB_CONFIG["retention_seconds"] if retention_seconds is None else retention_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                genre TEXT NOT NULL,
+                regenerate INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                story TEXT NOT NULL DEFAULT '',
+                stats TEXT NOT NULL DEFAULT '{}',
+                error TEXT
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_submitted_at ON jobs (submitted_at)")
+            db.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? "
+                       "WHERE status IN ('queued', 'running')",
+                       (time.time(), "Interrupted by a server restart"))
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        return sqlite_transaction(self.path)
+
+    def save(self, job: Job):
+        """Insert or update the job's row; a finished job's row is never changed again.
+
+        Saves happen outside the queue's lock, so a late save of a queued or
+        running snapshot must not overwrite the outcome saved before it.
+        """
+        row = (job.job_id, job.title, job.genre, int(job.regenerate), job.status, job.submitted_at,
+               job.started_at, job.finished_at, job.story, json.dumps(job.stats, default=str), job.error)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self._COLUMNS[1:])
+        with self._lock, self._connect() as db:
+            db.execute(f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) "
+                       f"VALUES ({', '.join('?' * len(self._COLUMNS))}) "
+                       f"ON CONFLICT (job_id) DO UPDATE SET {updates} "
+                       f"WHERE jobs.status IN ('queued', 'running')", row)
+
+    def _job(self, row) -> Job:
+        values = dict(zip(self._COLUMNS, row))
+        values["regenerate"] = bool(values["regenerate"])
+        values["stats"] = json.loads(values["stats"])
+        return Job(**values)
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with self._connect() as db:
+            row = db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs ORDER BY submitted_at DESC LIMIT ?",
+                              (limit,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def prune(self) -> int:
+        """Delete finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock, self._connect() as db:
+            return db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                              (cutoff,)).rowcount
+
+
+class JobQueue:
+    """Runs story jobs on a fixed pool of workers, independent of any UI session.
+
+    ``submit()`` returns a job id straight away; ``workers`` coroutines on the
+    shared model client loop take queued jobs in order, so however many
+    sessions submit, at most ``workers`` stories are generated at once.
+    Poll ``get()`` for status, progress and the result, and ``cancel()`` to
+    drop a queued job or stop a running one.
+
+    The store is written outside ``_lock`` and, on the loop, in a thread, so
+    a slow database never holds up the model streams sharing that loop.
+    Expired jobs are pruned when the workers start and every
+    ``prune_interval`` seconds after that.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queued: Optional[int] = None,
+                 store: Optional[JobStore] = None,
+                 generator_factory: Optional[Callable[[], Any]] = None,
+                 prune_interval: Optional[float] = None):
+        self.workers = max(1, workers or JOB_CONFIG["workers"])
+        self.max_queued = max_queued or JOB_CONFIG["max_queued"]
+        self.store = store if store is not None else JobStore()
+        self.generator_factory = generator_factory or _default_generator
+        self.prune_interval = prune_interval or JOB_CONFIG["prune_interval_seconds"]
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[concurrent.futures.Future] = []
+
+    def _ensure_workers(self) -> asyncio.AbstractEventLoop:
+        # (Re)start the workers when the shared loop is new, e.g. after registry.shutdown()
+        loop = get_registry().loop
+        finished = []
+        with self._lock:
+            if self._loop is not loop:
+                self._loop = loop
+                self._queue = asyncio.Queue()
+                for job in sorted(self._jobs.values(), key=lambda job: job.submitted_at):
+                    if job.status == "running":
+                        # Its loop is gone, so it can never finish
+                        finished.append(self._finish(job, "failed",
+                                                     error="Interrupted when the model client loop was shut down"))
+                    elif job.status == "queued":
+                        self._queue.put_nowait(job.job_id)
+                self._tasks.clear()
+                self._workers = [asyncio.run_coroutine_threadsafe(self._worker(self._queue), loop)
+                                 for _ in range(self.workers)]
+                self._workers.append(asyncio.run_coroutine_threadsafe(self._pruner(), loop))
+        self._save(finished)
+        return loop
+
+    def submit(self, title: str, genre: str, regenerate: bool = False, mode: Optional[str] = None) -> str:
+        """Queue a story and return its job id; raises QueueFullError when the queue is full"""
+        return self._enqueue(Job(job_id=uuid.uuid4().hex, title=title, genre=genre, regenerate=regenerate,
+                                 mode=mode))
+
+    def submit_edit(self, story: "Story", edit: "StoryEdit", parent_id: Optional[str] = None) -> str:
+        """Queue an incremental edit of a finished story; it waits for a slot like any story"""
+        return self._enqueue(Job(job_id=uuid.uuid4().hex, title=story.title, genre=story.genre,
+                                 edit=edit, source=story, parent_id=parent_id))
+
+    def submit_resume(self, run_id: str, title: str, genre: str, parent_id: Optional[str] = None) -> str:
+        """Queue the continuation of a partial run from its last checkpointed turn"""
+        return self._enqueue(Job(job_id=uuid.uuid4().hex, title=title, genre=genre, resume_id=run_id,
+                                 parent_id=parent_id))
+
+    def _enqueue(self, job: Job) -> str:
+        loop = self._ensure_workers()
+        with self._lock:
+            if self.queued >= self.max_queued:
+                get_metrics().observe_job("rejected")
+                raise QueueFullError(f"{self.queued} stories are already waiting; please try again shortly")
+            self._jobs[job.job_id] = job
+            queue = self._queue
+            self._update_depth()
+            snapshot = copy.copy(job)
+        get_metrics().observe_job("submitted")
+        self.store.save(snapshot)
+        loop.call_soon_threadsafe(queue.put_nowait, job.job_id)
+        return job.job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The live job, or its stored record when this process did not run it"""
+        job = self._jobs.get(job_id)
+        return job if job is not None else self.store.load(job_id)
+
+    def position(self, job_id: str) -> int:
+        """1-based place of a queued job in line, 0 once it is no longer queued"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return 0
+            return 1 + sum(1 for other in self._jobs.values()
+                           if other.status == "queued" and other.submitted_at < job.submitted_at)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False when it had already finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            if job.status == "queued":
+                snapshot = self._finish(job, "cancelled", error="Cancelled before it started")
+            else:
+                snapshot, task = None, self._tasks.get(job_id)
+        if snapshot is not None:
+            self.store.save(snapshot)
+            return True
+        if task is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == "queued")
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == "running")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and slot usage for this process"""
+        with self._lock:
+            waits = [job.wait_seconds for job in self._jobs.values() if job.status == "queued"]
+            return {"workers": self.workers, "queued": self.queued, "running": self.running,
+                    "max_queued": self.max_queued, "oldest_wait_seconds": round(max(waits, default=0.0), 1)}
+
+    async def _pruner(self):
+        while True:
+            # Finished jobs stay readable from the store after they leave memory
+            cutoff = time.time() - self.store.retention_seconds
+            with self._lock:
+                for job_id in [job_id for job_id, job in self._jobs.items()
+                               if job.finished_at is not None and job.finished_at < cutoff]:
+                    del self._jobs[job_id]
+            try:
+                await asyncio.to_thread(self.store.prune)
+            except sqlite3.Error:
+                # Busy or locked; the next round deletes them
+                pass
+            await asyncio.sleep(self.prune_interval)
+
+    def _save(self, snapshots: List[Optional[Job]]):
+        for snapshot in snapshots:
+            if snapshot is not None:
+                self.store.save(snapshot)
+
+    def _update_depth(self):
+        get_metrics().set_job_depth(self.queued, self.running)
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop the workers and cancel every unfinished job, e.g. when the server exits"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            workers, self._workers = self._workers, []
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            finished = [self._finish(job, "cancelled", error="The server stopped before the story was finished")
+                        for job in self._jobs.values()]
+        self._save(finished)
+        if loop is None or loop.is_closed():
+            return
+        for worker in workers:
+            worker.cancel()
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(tasks, timeout), loop).result(timeout + 1)
+        except Exception:
+            pass
+
+    @staticmethod
+    async def _cancel_tasks(tasks: List[asyncio.Task], timeout: float):
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> Optional[Job]:
+        # Called with self._lock held; a job finishes once, whoever gets there first.
+        # Returns a snapshot for the caller to save once the lock is released
+        if not job.active:
+            return None
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.chunks = []
+        self._update_depth()
+        get_metrics().observe_job(status)
+        return copy.copy(job)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job_id = await queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                task = asyncio.ensure_future(self._run(job))
+                self._tasks[job_id] = task
+                self._update_depth()
+                snapshot = copy.copy(job)
+            get_metrics().observe_job("started", job.wait_seconds)
+            await asyncio.to_thread(self.store.save, snapshot)
+            await asyncio.wait([task])
+            with self._lock:
+                self._tasks.pop(job_id, None)
+                if task.cancelled():
+                    snapshot = self._finish(job, "cancelled", error="Cancelled while generating")
+                elif task.exception() is not None:
+                    snapshot = self._finish(job, "failed", error=str(task.exception()))
+                else:
+                    snapshot = self._finish(job, "done")
+            if snapshot is not None:
+                await asyncio.to_thread(self.store.save, snapshot)
+
+    async def _run(self, job: Job):
+        generator = self.generator_factory()
+        if job.mode is not None and job.mode != generator.mode:
+            # Same settings, another orchestration (e.g. best-of drafts for a story that came out short)
+            generator = copy.copy(generator)
+            generator.mode = job.mode
+        if job.edit is not None:
+            events = generator.stream_edit(job.source, job.edit)
+            expected_turns = job.edit.model_calls
+        elif job.resume_id is not None:
+            events = generator.stream_resume(job.resume_id)
+            expected_turns = max(1, generator.expected_turns())
+        else:
+            events = generator.stream_story(job.title, job.genre, regenerate=job.regenerate)
+            expected_turns = max(1, generator.expected_turns())
+        longest_draft = 0
+        async for event in events:
+            if isinstance(event, AgentStarted):
+                job.agent, job.turn, job.chunks = event.agent, event.turn, []
+            elif isinstance(event, TokenChunk):
+                job.chunks.append(event.text)
+            elif isinstance(event, MessageComplete):
+                job.chunks = [event.content]
+                longest_draft = max(longest_draft, event.word_count)
+                # Progress follows real turns and words written, half each
+                turn_progress = min(1.0, event.turn / expected_turns)
+                # An edit writes one chapter or rewrites the story, so only its turns count
+                word_progress = (turn_progress if job.edit is not None
+                                 else min(1.0, longest_draft / STORY_CONFIG["min_total_words"]))
+                job.progress = min(0.95, 0.5 * turn_progress + 0.5 * word_progress)
+            elif isinstance(event, Terminated):
+                job.story, job.stats, job.report = event.story, event.stats, event.report
+                job.structured = event.structured
+        job.progress = 1.0
+
+
+def _default_generator():
+    # Imported on first use so the app can import this module cheaply
+    from components.story_generator import StoryGenerator
+    return StoryGenerator()
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue shared by every app session"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+            # Registered after the model client registry, so it runs before the loop closes
+            atexit.register(_queue.shutdown)
+        return _queue
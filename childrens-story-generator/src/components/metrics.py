@@ -0,0 +1,328 @@
+import json
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+from autogen_core.models import CreateResult
+from components.model_clients import DelegatingChatCompletionClient
+
+SELECTOR_ROLE = "selector"
+
+
+@dataclass
+class CallRecord:
+    """One model call made during a story run"""
+    role: str
+    model: str
+    started_at: float
+    tier: str = ""
+    latency: float = 0.0
+    time_to_first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    # Seconds spent waiting for the rate limiter and retry backoff
+    queue_wait: float = 0.0
+    # USD, from the tier's model prices
+    cost: float = 0.0
+    speaker: Optional[str] = None
+    error: Optional[str] = None
+    # Failed with a 429 after the rate limiter ran out of retries
+    throttled: bool = False
+
+
+@dataclass
+class RunReport:
+    """Per-story record of every model call, with per-role summaries"""
+    title: str = ""
+    genre: str = ""
+    mode: str = ""
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    wall_time: float = 0.0
+    calls: List[CallRecord] = field(default_factory=list)
+    # Estimated input tokens that bounded model contexts kept out of requests
+    context_tokens_saved: int = 0
+    stop_reason: str = ""
+    # "complete", "duplicate" or "revision_cap" when the run was ended early
+    early_stop: Optional[str] = None
+
+    def add(self, record: CallRecord):
+        self.calls.append(record)
+
+    def finish(self):
+        """Stamp the wall time and fold the run into the process-wide counters"""
+        self.wall_time = time.time() - self.started_at
+        get_metrics().observe_run(self)
+
+    def by_role(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, tokens, latency, retries, queue waits and cost summed per agent (and the selector)"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            role = summary.setdefault(call.role, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "latency": 0.0, "retries": 0, "queue_wait": 0.0, "cost": 0.0, "errors": 0
+            })
+            role["calls"] += 1
+            role["prompt_tokens"] += call.prompt_tokens
+            role["completion_tokens"] += call.completion_tokens
+            role["latency"] += call.latency
+            role["retries"] += call.retries
+            role["queue_wait"] += call.queue_wait
+            role["cost"] += call.cost
+            role["errors"] += call.error is not None
+        return summary
+
+    def by_tier(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, tokens, latency and cost summed per model tier"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            tier = summary.setdefault(call.tier or call.model, {
+                "model": call.model, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "latency": 0.0, "cost": 0.0
+            })
+            tier["calls"] += 1
+            tier["prompt_tokens"] += call.prompt_tokens
+            tier["completion_tokens"] += call.completion_tokens
+            tier["latency"] += call.latency
+            tier["cost"] += call.cost
+        return summary
+
+    @property
+    def cost(self) -> float:
+        return sum(call.cost for call in self.calls)
+
+    @property
+    def speakers(self) -> List[str]:
+        """Speakers chosen by the LLM selector, in order"""
+        return [call.speaker for call in self.calls if call.speaker]
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = asdict(self)
+        report["by_role"] = self.by_role()
+        report["by_tier"] = self.by_tier()
+        report["cost_usd"] = self.cost
+        report["prompt_tokens"] = sum(call.prompt_tokens for call in self.calls)
+        report["completion_tokens"] = sum(call.completion_tokens for call in self.calls)
+        return report
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunReport":
+        """A report from ``to_dict()`` output; the summaries are recomputed from the calls"""
+        names = {item.name for item in fields(cls)}
+        report = cls(**{key: value for key, value in data.items() if key in names and key != "calls"})
+        report.calls = [CallRecord(**call) for call in data.get("calls", [])]
+        return report
+
+
+class MetricsRegistry:
+    """Process-wide counters aggregated over every instrumented call and run"""
+
+    _CALL_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "retries", "errors",
+                      "latency_seconds", "time_to_first_token_seconds", "streamed_calls", "queue_wait_seconds", "cost_usd")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._roles: Dict[str, Dict[str, float]] = {}
+            self._runs = {"runs": 0, "run_seconds": 0.0, "context_tokens_saved": 0}
+            self._jobs = {"submitted": 0, "rejected": 0, "started": 0, "done": 0, "failed": 0, "cancelled": 0,
+                          "wait_seconds": 0.0, "queued": 0, "running": 0}
+            self._scheduler = {"throttled": 0, "concurrency_limit": 0, "in_flight": 0, "waiting": 0}
+            self._early_stops: Dict[str, int] = {}
+
+    def observe_call(self, record: CallRecord):
+        with self._lock:
+            role = self._roles.setdefault(record.role, dict.fromkeys(self._CALL_COUNTERS, 0))
+            role["calls"] += 1
+            role["prompt_tokens"] += record.prompt_tokens
+            role["completion_tokens"] += record.completion_tokens
+            role["retries"] += record.retries
+            role["errors"] += record.error is not None
+            role["latency_seconds"] += record.latency
+            role["queue_wait_seconds"] += record.queue_wait
+            role["cost_usd"] += record.cost
+            if record.time_to_first_token is not None:
+                role["time_to_first_token_seconds"] += record.time_to_first_token
+                role["streamed_calls"] += 1
+
+    def observe_run(self, report: RunReport):
+        with self._lock:
+            self._runs["runs"] += 1
+            self._runs["run_seconds"] += report.wall_time
+            self._runs["context_tokens_saved"] += report.context_tokens_saved
+            if report.early_stop:
+                self._early_stops[report.early_stop] = self._early_stops.get(report.early_stop, 0) + 1
+
+    def observe_job(self, event: str, wait_seconds: float = 0.0):
+        """Count a job event; "started" also adds the time the job spent queued"""
+        with self._lock:
+            self._jobs[event] += 1
+            self._jobs["wait_seconds"] += wait_seconds
+
+    def set_job_depth(self, queued: int, running: int):
+        with self._lock:
+            self._jobs["queued"] = queued
+            self._jobs["running"] = running
+
+    def observe_throttle(self):
+        with self._lock:
+            self._scheduler["throttled"] += 1
+
+    def set_scheduler_state(self, concurrency_limit: int, in_flight: int, waiting: int):
+        with self._lock:
+            self._scheduler.update(concurrency_limit=concurrency_limit, in_flight=in_flight, waiting=waiting)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"roles": {role: dict(values) for role, values in self._roles.items()},
+                    **self._runs, "jobs": dict(self._jobs), "scheduler": dict(self._scheduler),
+                    "early_stops": dict(self._early_stops)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render the counters in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        metrics = [
+            ("story_model_calls_total", "counter", "Model calls by role", "calls"),
+            ("story_model_prompt_tokens_total", "counter", "Prompt tokens by role", "prompt_tokens"),
+            ("story_model_completion_tokens_total", "counter", "Completion tokens by role", "completion_tokens"),
+            ("story_model_retries_total", "counter", "Retried model calls by role", "retries"),
+            ("story_model_errors_total", "counter", "Failed model calls by role", "errors"),
+            ("story_model_latency_seconds_sum", "counter", "Total model call latency by role", "latency_seconds"),
+            ("story_model_time_to_first_token_seconds_sum", "counter",
+             "Total time to first streamed token by role", "time_to_first_token_seconds"),
+            ("story_model_streamed_calls_total", "counter", "Streamed model calls by role", "streamed_calls"),
+            ("story_model_queue_wait_seconds_sum", "counter",
+             "Total time calls waited for the rate limiter and retry backoff by role", "queue_wait_seconds"),
+            ("story_model_cost_usd_total", "counter", "Estimated model cost in USD by role", "cost_usd"),
+        ]
+        lines = []
+        for name, kind, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for role, values in sorted(snapshot["roles"].items()):
+                lines.append(f'{name}{{role="{role}"}} {values[key]}')
+        lines.append("# HELP story_runs_total Completed story runs")
+        lines.append("# TYPE story_runs_total counter")
+        lines.append(f"story_runs_total {snapshot['runs']}")
+        lines.append("# HELP story_run_seconds_sum Total story run wall time")
+        lines.append("# TYPE story_run_seconds_sum counter")
+        lines.append(f"story_run_seconds_sum {snapshot['run_seconds']}")
+        lines.append("# HELP story_context_tokens_saved_total Estimated input tokens kept out of requests by bounded contexts")
+        lines.append("# TYPE story_context_tokens_saved_total counter")
+        lines.append(f"story_context_tokens_saved_total {snapshot['context_tokens_saved']}")
+        lines.append("# HELP story_early_stops_total Team runs ended before their turn limit, by reason")
+        lines.append("# TYPE story_early_stops_total counter")
+        for reason, count in sorted(snapshot["early_stops"].items()):
+            lines.append(f'story_early_stops_total{{reason="{reason}"}} {count}')
+        jobs = snapshot["jobs"]
+        lines.append("# HELP story_jobs_total Background story job events")
+        lines.append("# TYPE story_jobs_total counter")
+        for event in ("submitted", "rejected", "started", "done", "failed", "cancelled"):
+            lines.append(f'story_jobs_total{{event="{event}"}} {jobs[event]}')
+        lines.append("# HELP story_job_wait_seconds_sum Total time jobs spent queued before a worker took them")
+        lines.append("# TYPE story_job_wait_seconds_sum counter")
+        lines.append(f"story_job_wait_seconds_sum {jobs['wait_seconds']}")
+        lines.append("# HELP story_jobs_queued Jobs waiting for a worker")
+        lines.append("# TYPE story_jobs_queued gauge")
+        lines.append(f"story_jobs_queued {jobs['queued']}")
+        lines.append("# HELP story_jobs_running Jobs being generated")
+        lines.append("# TYPE story_jobs_running gauge")
+        lines.append(f"story_jobs_running {jobs['running']}")
+        scheduler = snapshot["scheduler"]
+        lines.append("# HELP story_model_throttled_total Model calls the provider rejected with a 429")
+        lines.append("# TYPE story_model_throttled_total counter")
+        lines.append(f"story_model_throttled_total {scheduler['throttled']}")
+        lines.append("# HELP story_model_concurrency_limit Adaptive limit on in-flight model calls")
+        lines.append("# TYPE story_model_concurrency_limit gauge")
+        lines.append(f"story_model_concurrency_limit {scheduler['concurrency_limit']}")
+        lines.append("# HELP story_model_calls_in_flight Model calls holding a scheduler slot")
+        lines.append("# TYPE story_model_calls_in_flight gauge")
+        lines.append(f"story_model_calls_in_flight {scheduler['in_flight']}")
+        lines.append("# HELP story_model_calls_waiting Model calls waiting for a scheduler slot")
+        lines.append("# TYPE story_model_calls_waiting gauge")
+        lines.append(f"story_model_calls_waiting {scheduler['waiting']}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    return _metrics
+
+
+class InstrumentedChatCompletionClient(DelegatingChatCompletionClient):
+    """Records tokens, latency, time to first token and cost of every call into a RunReport"""
+
+    def __init__(self, inner, role: str, report: RunReport, model: str = "", settings=None):
+        super().__init__(inner)
+        self.role = role
+        self.report = report
+        # The role's ModelSettings, when known, give the tier and prices
+        self.settings = settings
+        self.model = settings.model if settings is not None else model
+
+    def _start(self) -> CallRecord:
+        tier = self.settings.tier if self.settings is not None else ""
+        return CallRecord(role=self.role, model=self.model, started_at=time.time(), tier=tier)
+
+    def _finish(self, record: CallRecord, started: float, result: Optional[CreateResult] = None,
+                error: Optional[BaseException] = None):
+        record.latency = time.perf_counter() - started
+        if result is not None:
+            record.prompt_tokens = result.usage.prompt_tokens
+            record.completion_tokens = result.usage.completion_tokens
+            if self.settings is not None:
+                record.cost = self.settings.cost(record.prompt_tokens, record.completion_tokens)
+            if self.role == SELECTOR_ROLE and isinstance(result.content, str):
+                record.speaker = result.content.strip()
+        if error is not None:
+            record.error = f"{type(error).__name__}: {error}"
+        self.report.add(record)
+        get_metrics().observe_call(record)
+
+    def _kwargs(self, record: CallRecord, kwargs):
+        # The rate limiter fills in retries and queue wait on the record
+        if getattr(self.inner, "accepts_call_record", False):
+            return {**kwargs, "call_record": record}
+        return kwargs
+
+    async def create(self, messages, **kwargs):
+        record = self._start()
+        started = time.perf_counter()
+        try:
+            result = await self.inner.create(messages, **self._kwargs(record, kwargs))
+        except BaseException as e:
+            self._finish(record, started, error=e)
+            raise
+        self._finish(record, started, result=result)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        record = self._start()
+        started = time.perf_counter()
+        result = None
+        try:
+            async for chunk in self.inner.create_stream(messages, **self._kwargs(record, kwargs)):
+                if isinstance(chunk, CreateResult):
+                    result = chunk
+                elif record.time_to_first_token is None:
+                    record.time_to_first_token = time.perf_counter() - started
+                yield chunk
+        except BaseException as e:
+            self._finish(record, started, error=e)
+            raise
+        self._finish(record, started, result=result)
@@ -0,0 +1,275 @@
+import asyncio
+import atexit
+import queue
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from autogen_core.models import ChatCompletionClient, ModelInfo
+from config import LLM_CONFIG, CLIENT_POOL_CONFIG, CASSETTE_CONFIG, RATE_LIMIT_CONFIG, require_api_key
+
+
+# Marks the end of a stream forwarded from the shared loop
+_END = object()
+
+
+class ModelClientRegistry:
+    """Process-wide registry of model clients sharing one pooled HTTP connection pool.
+
+    Clients are keyed by model and sampling settings, so every agent and every
+    StoryGenerator asking for the same settings gets the same client. All
+    clients share a single keep-alive connection pool that lives on a
+    dedicated background event loop, which is why team runs are executed on
+    that loop as well (connections cannot be reused across event loops).
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[Any, ...], ChatCompletionClient] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Background event loop that owns the pooled connections"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="model-client-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_client is None or self._http_client.is_closed:
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=CLIENT_POOL_CONFIG["max_connections"],
+                        max_keepalive_connections=CLIENT_POOL_CONFIG["max_keepalive_connections"],
+                        keepalive_expiry=CLIENT_POOL_CONFIG["keepalive_expiry"]
+                    ),
+                    timeout=CLIENT_POOL_CONFIG["request_timeout"]
+                )
+            return self._http_client
+
+    def get_client(self, model: Optional[str] = None, temperature: Optional[float] = None,
+                   max_tokens: Optional[int] = None) -> ChatCompletionClient:
+        """Return the shared client for these settings, creating it on first use"""
+        model = model or LLM_CONFIG["model"]
+        temperature = LLM_CONFIG["temperature"] if temperature is None else temperature
+        max_tokens = max_tokens or LLM_CONFIG["max_tokens"]
+        key = (model, temperature, max_tokens)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                mode = CASSETTE_CONFIG["mode"]
+                # Replay serves recorded responses, so it needs neither the API key nor the SDK
+                if mode != "replay":
+                    # The OpenAI SDK is most of this package's import time, so it is
+                    # loaded with the first real client rather than on import
+                    from autogen_ext.models.openai import OpenAIChatCompletionClient
+                    client = OpenAIChatCompletionClient(
+                        model=model,
+                        api_key=require_api_key(),
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        # The rate limiter retries with backoff shared across calls, so the
+                        # SDK's own per-call retries are turned off under it
+                        max_retries=0 if RATE_LIMIT_CONFIG["enabled"] else 2,
+                        http_client=self._get_http_client()
+                    )
+                if mode != "off":
+                    # Imported here because cassettes builds on this module
+                    from components.cassettes import wrap_for_cassette
+                    client = wrap_for_cassette(client, mode, CASSETTE_CONFIG["path"],
+                                               CASSETTE_CONFIG["replay_timing"])
+                self._clients[key] = client
+            return client
+
+    def run_sync(self, coro):
+        """Run a coroutine on the shared loop and block until it finishes"""
+        loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("run_sync() cannot be called from the model client loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def run_async(self, coro):
+        """Await a coroutine on the shared loop from any event loop"""
+        loop = self.loop
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    @staticmethod
+    async def _pump(agen: AsyncIterator, put: Callable[[Tuple[Any, Any]], None]):
+        # Forward (item, None) for every item, then (_END, error or None)
+        try:
+            async for item in agen:
+                put((item, None))
+        except BaseException as e:
+            put((_END, e))
+            raise
+        else:
+            put((_END, None))
+
+    async def stream_async(self, agen: AsyncIterator) -> AsyncIterator:
+        """Iterate an async generator that runs on the shared loop from any event loop"""
+        loop = self.loop
+        caller = asyncio.get_running_loop()
+        if caller is loop:
+            async for item in agen:
+                yield item
+            return
+
+        items: asyncio.Queue = asyncio.Queue()
+
+        def put(entry):
+            try:
+                caller.call_soon_threadsafe(items.put_nowait, entry)
+            except RuntimeError:
+                pass  # Caller loop already closed
+
+        future = asyncio.run_coroutine_threadsafe(self._pump(agen, put), loop)
+        try:
+            while True:
+                item, error = await items.get()
+                if item is _END:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def iterate_sync(self, agen: AsyncIterator) -> Iterator:
+        """Iterate an async generator that runs on the shared loop from synchronous code"""
+        items: queue.Queue = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._pump(agen, items.put), self.loop)
+        try:
+            while True:
+                item, error = items.get()
+                if item is _END:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    async def _warm_up(self) -> bool:
+        # Listing models is free and opens (and keeps alive) the TLS connection
+        try:
+            response = await self._get_http_client().get(
+                f"{CLIENT_POOL_CONFIG['base_url']}/models",
+                headers={"Authorization": f"Bearer {LLM_CONFIG['api_key']}"}
+            )
+            return response.status_code < 500
+        except httpx.HTTPError:
+            return False
+
+    def warm_up(self) -> bool:
+        """Create the default client and pre-open a pooled connection to the API"""
+        self.get_client()
+        return self.run_sync(self._warm_up())
+
+    async def _close(self):
+        # The OpenAI clients close the http client they were given, so the
+        # shared pool is closed once here instead of once per client
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+
+    def shutdown(self):
+        """Close the connection pool and stop the background loop"""
+        with self._lock:
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=10)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            if self._loop_thread is not None:
+                self._loop_thread.join(timeout=10)
+            loop.close()
+            self._clients.clear()
+            self._http_client = None
+            self._loop = None
+            self._loop_thread = None
+
+
+class DelegatingChatCompletionClient(ChatCompletionClient):
+    """Base for clients that wrap another model client and forward every call to it.
+
+    Subclasses override create()/create_stream() to add behaviour around the
+    call; everything else (usage, token counting, model info) passes through.
+    """
+
+    def __init__(self, inner: ChatCompletionClient):
+        self.inner = inner
+
+    async def create(self, messages, **kwargs):
+        return await self.inner.create(messages, **kwargs)
+
+    def create_stream(self, messages, **kwargs):
+        return self.inner.create_stream(messages, **kwargs)
+
+    async def close(self):
+        # Wrapped clients are usually shared registry clients owned by the
+        # registry, so closing a wrapper leaves them open
+        pass
+
+    def actual_usage(self):
+        return self.inner.actual_usage()
+
+    def total_usage(self):
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        return self.inner.count_tokens(messages, **kwargs)
+
+    def remaining_tokens(self, messages, **kwargs) -> int:
+        return self.inner.remaining_tokens(messages, **kwargs)
+
+    @property
+    def capabilities(self):
+        return self.inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.inner.model_info
+
+
+_registry = ModelClientRegistry()
+atexit.register(_registry.shutdown)
+
+
+def get_registry() -> ModelClientRegistry:
+    """Return the process-wide client registry"""
+    return _registry
+
+
+def get_model_client(model: Optional[str] = None, temperature: Optional[float] = None,
+                     max_tokens: Optional[int] = None) -> ChatCompletionClient:
+    """Return the shared, pooled model client for the given settings"""
+    return _registry.get_client(model, temperature, max_tokens)
+
+
+def warm_up() -> bool:
+    """Pre-open the shared connection pool, returning True when the API answered"""
+    return _registry.warm_up()
+
+
+def shutdown():
+    """Close every shared client and the connection pool"""
+    _registry.shutdown()
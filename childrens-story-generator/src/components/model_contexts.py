@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Type
+
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import LLMMessage, UserMessage
+from pydantic import BaseModel, ValidationError
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.metrics import RunReport
+from components.story_extraction import Chapter, apply_patches
+from components.structured_output import ChapterDraft, ClimaxEdits, StoryDraft
+from utils.helpers import estimate_tokens
+from config import CONTEXT_CONFIG
+
+CONTEXT_STRATEGIES = ("unbounded", "token_limited", "draft", "summary")
+
+
+def _text(message: LLMMessage) -> str:
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+def _tokens(messages: List[LLMMessage]) -> int:
+    return sum(estimate_tokens(_text(message)) for message in messages)
+
+
+class BoundedChatCompletionContext(ChatCompletionContext, ABC):
+    """Keeps the full history but sends the model a reduced view of it.
+
+    The first message (the task) is always sent. Subclasses choose the rest
+    in ``_select``; the difference in estimated tokens between the full
+    history and the view is added to the run report on every request.
+    """
+
+    def __init__(self, report: Optional[RunReport] = None):
+        super().__init__()
+        self.report = report
+
+    @abstractmethod
+    def _select(self, messages: List[LLMMessage]) -> List[LLMMessage]:
+        """The messages after the task to send, in order"""
+
+    async def get_messages(self) -> List[LLMMessage]:
+        if len(self._messages) <= 1:
+            return list(self._messages)
+        view = [self._messages[0]] + self._select(self._messages[1:])
+        if self.report is not None:
+            self.report.context_tokens_saved += _tokens(self._messages) - _tokens(view)
+        return view
+
+
+class TokenLimitedContext(BoundedChatCompletionContext):
+    """The task plus as many of the newest messages as fit in ``token_limit`` tokens"""
+
+    def __init__(self, token_limit: Optional[int] = None, report: Optional[RunReport] = None):
+        super().__init__(report)
+        self.token_limit = token_limit or CONTEXT_CONFIG["token_limit"]
+
+    def _select(self, messages: List[LLMMessage]) -> List[LLMMessage]:
+        budget = self.token_limit - _tokens(self._messages[:1])
+        kept = []
+        for message in reversed(messages):
+            budget -= estimate_tokens(_text(message))
+            # The newest message is always sent, even when it alone is over budget
+            if budget < 0 and kept:
+                break
+            kept.append(message)
+        return kept[::-1]
+
+
+def _parse(model: Type[BaseModel], message: LLMMessage) -> Optional[BaseModel]:
+    try:
+        return model.model_validate_json(_text(message))
+    except ValidationError:
+        return None
+
+
+class LatestDraftContext(BoundedChatCompletionContext):
+    """The task, the character sheet, the latest story draft and the most recent messages.
+
+    In JSON mode each Story_Writer reply holds only the chapters it changed,
+    so the latest one is sent with every chapter written so far merged in,
+    and with the Climax_Creator patches made before it applied.
+    """
+
+    def __init__(self, recent_messages: Optional[int] = None, report: Optional[RunReport] = None):
+        super().__init__(report)
+        self.recent_messages = recent_messages or CONTEXT_CONFIG["recent_messages"]
+
+    def _select(self, messages: List[LLMMessage]) -> List[LLMMessage]:
+        sources = [getattr(message, "source", None) for message in messages]
+        keep = set(range(max(0, len(messages) - self.recent_messages), len(messages)))
+        if CharacterAgent.NAME in sources:
+            keep.add(sources.index(CharacterAgent.NAME))
+        draft = None
+        if WriterAgent.NAME in sources:
+            draft = len(sources) - 1 - sources[::-1].index(WriterAgent.NAME)
+            keep.add(draft)
+        return [self._merged_draft(messages, index) if index == draft else messages[index]
+                for index in sorted(keep)]
+
+    @staticmethod
+    def _merged_draft(messages: List[LLMMessage], latest: int) -> LLMMessage:
+        """The Story_Writer message at ``latest``, carrying the whole JSON draft up to that turn"""
+        last = _parse(StoryDraft, messages[latest])
+        if last is None:
+            return messages[latest]
+        chapters: Dict[int, Chapter] = {}
+        for message in messages[:latest + 1]:
+            source = getattr(message, "source", None)
+            if source == WriterAgent.NAME:
+                draft = _parse(StoryDraft, message)
+                for chapter in draft.chapters if draft is not None else ():
+                    chapters[chapter.number] = Chapter(number=chapter.number, title=chapter.title, text=chapter.text)
+            elif source == ClimaxAgent.NAME:
+                edits = _parse(ClimaxEdits, message)
+                apply_patches(chapters, edits.patches if edits is not None else ())
+        merged = StoryDraft(chapters=[ChapterDraft(number=number, title=chapters[number].title,
+                                                   text=chapters[number].text) for number in sorted(chapters)],
+                            status=last.status)
+        return messages[latest].model_copy(update={"content": merged.model_dump_json()})
+
+
+class RollingSummaryContext(BoundedChatCompletionContext):
+    """The task, a short extractive summary of older turns and the most recent messages.
+
+    Summaries are built locally from the opening words of each older turn,
+    so they cost no extra model calls.
+    """
+
+    def __init__(self, recent_messages: Optional[int] = None, summary_words: Optional[int] = None,
+                 report: Optional[RunReport] = None):
+        super().__init__(report)
+        self.recent_messages = recent_messages or CONTEXT_CONFIG["recent_messages"]
+        self.summary_words = summary_words or CONTEXT_CONFIG["summary_words"]
+
+    def _select(self, messages: List[LLMMessage]) -> List[LLMMessage]:
+        older, recent = messages[:-self.recent_messages], messages[-self.recent_messages:]
+        if not older:
+            return recent
+        lines = []
+        for message in older:
+            words = _text(message).split()
+            excerpt = " ".join(words[:self.summary_words]) + (" ..." if len(words) > self.summary_words else "")
+            lines.append(f"- {getattr(message, 'source', 'user')}: {excerpt}")
+        summary = UserMessage(content="Summary of earlier turns:\n" + "\n".join(lines), source="summary")
+        return [summary] + recent
+
+
+def context_strategy(role: str) -> str:
+    """Configured strategy for an agent name or the selector"""
+    return CONTEXT_CONFIG["agent_strategies"].get(role, CONTEXT_CONFIG["strategy"])
+
+
+def build_model_context(role: str, report: Optional[RunReport] = None) -> Optional[ChatCompletionContext]:
+    """Model context for one role, or None to keep autogen's unbounded default"""
+    strategy = context_strategy(role)
+    if strategy not in CONTEXT_STRATEGIES:
+        raise ValueError(f"Unknown context strategy '{strategy}' for {role}, expected one of {CONTEXT_STRATEGIES}")
+    if strategy == "token_limited":
+        return TokenLimitedContext(report=report)
+    if strategy == "draft":
+        return LatestDraftContext(report=report)
+    if strategy == "summary":
+        return RollingSummaryContext(report=report)
+    return None
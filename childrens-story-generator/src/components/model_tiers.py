@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from components.metrics import SELECTOR_ROLE
+from config import LLM_CONFIG, MODEL_TIER_CONFIG
+
+DEFAULT_TIER = "default"
+
+
+@dataclass(frozen=True)
+class ModelSettings:
+    """Model, sampling settings and prices one role is served with"""
+    tier: str
+    model: str
+    temperature: float
+    max_tokens: int
+    # USD per million tokens; zero when the model has no listed price
+    prompt_price: float = 0.0
+    completion_price: float = 0.0
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1_000_000
+
+
+class ModelTiers:
+    """Model settings per role, from the ``llm_config`` blocks of autogen_config.json.
+
+    Each agent's ``llm_config`` (and ``group_chat_config.selector_llm_config``
+    for the LLM selector) names a tier from ``model_tiers`` and may override
+    its fields. Anything left unset falls back to MODEL_NAME, TEMPERATURE
+    and MAX_TOKENS, and roles without a tier use those as the "default"
+    tier. Prices come from ``model_prices``, keyed by model.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, Dict[str, Any]]] = None,
+                 roles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.tiers = tiers or {}
+        self.roles = roles or {}
+        self.prices = prices or {}
+        for role, llm_config in self.roles.items():
+            tier = llm_config.get("tier", DEFAULT_TIER)
+            if tier != DEFAULT_TIER and tier not in self.tiers:
+                raise ValueError(f"{role} uses unknown model tier '{tier}', expected one of {sorted(self.tiers)}")
+
+    @classmethod
+    def from_file(cls, path: str, tiered: bool = True) -> "ModelTiers":
+        """Load tiers and prices; with ``tiered`` off every role uses the default tier"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        roles = {}
+        if tiered:
+            roles = {agent["name"]: agent["llm_config"] for agent in config.get("agents", [])
+                     if "tier" in agent.get("llm_config", {})}
+            selector = config.get("group_chat_config", {}).get("selector_llm_config")
+            if selector:
+                roles[SELECTOR_ROLE] = selector
+        return cls(config.get("model_tiers", {}), roles, config.get("model_prices", {}))
+
+    def for_role(self, role: str) -> ModelSettings:
+        llm_config = self.roles.get(role, {})
+        tier = llm_config.get("tier", DEFAULT_TIER)
+        fields = {**self.tiers.get(tier, {}), **llm_config}
+        model = fields.get("model") or LLM_CONFIG["model"]
+        price = self.prices.get(model, {})
+        return ModelSettings(
+            tier=tier,
+            model=model,
+            temperature=float(fields.get("temperature", LLM_CONFIG["temperature"])),
+            max_tokens=int(fields.get("max_tokens") or LLM_CONFIG["max_tokens"]),
+            prompt_price=float(price.get("prompt", 0.0)),
+            completion_price=float(price.get("completion", 0.0))
+        )
+
+    def single_tier(self, tier: str) -> "ModelTiers":
+        """The same tiers and prices with every configured role moved onto ``tier``"""
+        return ModelTiers(self.tiers, {role: {"tier": tier} for role in self.roles}, self.prices)
+
+
+_tiers: Optional[ModelTiers] = None
+_tiers_lock = threading.Lock()
+
+
+def get_model_tiers() -> ModelTiers:
+    """Return the tiers from autogen_config.json, loaded once per process"""
+    global _tiers
+    with _tiers_lock:
+        if _tiers is None:
+            path = MODEL_TIER_CONFIG["path"]
+            _tiers = ModelTiers.from_file(path, MODEL_TIER_CONFIG["enabled"]) if os.path.exists(path) else ModelTiers()
+        return _tiers
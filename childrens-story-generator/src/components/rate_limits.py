@@ -0,0 +1,342 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+import httpx
+from autogen_core.models import CreateResult, RequestUsage
+from components.metrics import get_metrics
+from components.model_clients import DelegatingChatCompletionClient
+from utils.helpers import estimate_tokens
+from config import LLM_CONFIG, RATE_LIMIT_CONFIG
+
+# Statuses worth another attempt: throttling, timeouts, conflicts and server errors
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+# OpenAI SDK errors without a status code, matched by name so the SDK is not imported here
+_RETRY_ERROR_NAMES = ("APIConnectionError", "APITimeoutError")
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_throttled(error: BaseException) -> bool:
+    # An exhausted quota is also a 429, but waiting does not help
+    return _status_of(error) == 429 and getattr(error, "code", None) != "insufficient_quota"
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.TransportError) or type(error).__name__ in _RETRY_ERROR_NAMES:
+        return True
+    status = _status_of(error)
+    return status in RETRY_STATUSES and (status != 429 or is_throttled(error))
+
+
+def is_model_error(error: BaseException) -> bool:
+    """A failed model request (an API error, HTTP status or transport failure) rather than a bug of ours"""
+    if isinstance(error, httpx.HTTPError) or _status_of(error) is not None:
+        return True
+    return any(cls.__name__ in ("APIError", "OpenAIError") for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait (Retry-After or retry-after-ms), if it said"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP-date form
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills at ``per_minute`` up to one minute's worth.
+
+    ``reserve()`` takes its amount straight away, running the bucket into
+    debt if it has to, and returns how long the caller must wait for the
+    debt to be repaid; later callers queue behind that debt, so waiters are
+    served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.per_minute, self.available + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A request bigger than the whole bucket would otherwise never fit
+        self.available -= min(amount, self.per_minute)
+        return max(0.0, -self.available * 60 / self.per_minute)
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.available = min(self.per_minute, self.available + amount)
+
+
+class RateLimitScheduler:
+    """Process-wide gate in front of every model call.
+
+    A call first waits for a concurrency slot, then for the request and
+    token buckets (and any Retry-After pause the provider asked for), and
+    reports how long that took. The concurrency limit adapts to throttling:
+    it halves when a call is throttled (once per burst of 429s) and grows
+    back by about one slot per ``limit`` successful calls, up to
+    ``max_concurrency``. Slots are handed to waiters in arrival order and
+    waiters may sit on any event loop.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None):
+        requests_per_minute = RATE_LIMIT_CONFIG["requests_per_minute"] if requests_per_minute is None else requests_per_minute
+        tokens_per_minute = RATE_LIMIT_CONFIG["tokens_per_minute"] if tokens_per_minute is None else tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency or RATE_LIMIT_CONFIG["max_concurrency"])
+        self.max_retries = RATE_LIMIT_CONFIG["max_retries"] if max_retries is None else max_retries
+        self.backoff_base = backoff_base or RATE_LIMIT_CONFIG["backoff_base"]
+        self.backoff_max = backoff_max or RATE_LIMIT_CONFIG["backoff_max"]
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _publish(self):
+        get_metrics().set_scheduler_state(int(self.limit), self.in_flight, len(self._waiters))
+
+    def _hand_off(self):
+        # Called with the lock held: give freed slots to the oldest waiters
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            try:
+                waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+            except RuntimeError:
+                self.in_flight -= 1  # The waiter's loop is closed
+
+    def _wake(self, waiter: asyncio.Future):
+        if waiter.done():
+            # Cancelled after the slot was handed over
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    async def _enter(self):
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                self._publish()
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._publish()
+        try:
+            await waiter
+        except BaseException:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            # A cancelled waiter that was handed a slot gives it back in _wake
+            if handed_over and not waiter.cancelled():
+                self.release()
+            raise
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait for a slot and for the rate limits; returns the seconds spent waiting"""
+        started = time.monotonic()
+        await self._enter()
+        try:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if self.requests is not None:
+                    delay = max(delay, self.requests.reserve(1, now))
+                if self.tokens is not None and tokens:
+                    delay = max(delay, self.tokens.reserve(tokens, now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.release()
+            raise
+        return time.monotonic() - started
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._hand_off()
+            self._publish()
+
+    def succeeded(self, reserved_tokens: int = 0, usage: Optional[RequestUsage] = None):
+        """Release the slot, return unused reserved tokens and grow the limit a little"""
+        with self._lock:
+            if self.tokens is not None and usage is not None:
+                used = usage.prompt_tokens + usage.completion_tokens
+                self.tokens.refund(max(0, reserved_tokens - used), time.monotonic())
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.in_flight -= 1
+            self._hand_off()
+            self._publish()
+
+    def failed(self, error: BaseException, started: float, unused_tokens: int = 0):
+        """Release the slot and refund ``unused_tokens``; a throttled call halves the limit and honours Retry-After"""
+        with self._lock:
+            if self.tokens is not None and unused_tokens:
+                self.tokens.refund(unused_tokens, time.monotonic())
+            if is_throttled(error):
+                self.throttled += 1
+                get_metrics().observe_throttle()
+                now = time.monotonic()
+                wait = retry_after(error)
+                if wait:
+                    self._paused_until = max(self._paused_until, now + min(wait, self.backoff_max))
+                # Calls already in flight when the limit last dropped were sent under the old
+                # limit, so their 429s do not lower it again
+                if started >= self._last_decrease:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+            self.in_flight -= 1
+            self._hand_off()
+            self._publish()
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after ``attempt`` failures, or None to give up"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        wait = retry_after(error)
+        if wait is not None:
+            # A little jitter so callers told the same Retry-After do not all return at once
+            return min(wait, self.backoff_max) + random.uniform(0, self.backoff_base)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def stats(self):
+        with self._lock:
+            return {"concurrency_limit": int(self.limit), "in_flight": self.in_flight,
+                    "waiting": len(self._waiters), "throttled": self.throttled}
+
+
+class RateLimitedChatCompletionClient(DelegatingChatCompletionClient):
+    """Sends every call through a RateLimitScheduler and retries transient failures.
+
+    Each attempt holds a scheduler slot only while it is in flight; between
+    attempts the call sleeps for the scheduler's backoff. A failed attempt
+    gives back the tokens it reserved, all of them when the API refused
+    the request and the completion budget otherwise. Streams are only
+    retried if they fail before their first chunk. When the caller passes a
+    ``call_record`` (the instrumented client does), its ``retries`` and
+    ``queue_wait`` are filled in, and ``throttled`` is set when it gives up
+    on a 429.
+    """
+
+    # Tells the instrumented client it may pass its CallRecord through
+    accepts_call_record = True
+
+    def __init__(self, inner, scheduler: Optional[RateLimitScheduler] = None, max_tokens: Optional[int] = None):
+        super().__init__(inner)
+        self.scheduler = scheduler or get_rate_limiter()
+        self.max_tokens = max_tokens or LLM_CONFIG["max_tokens"]
+
+    def _reserved_tokens(self, messages) -> int:
+        # Providers count max_tokens against the token limit until the call finishes
+        prompt = sum(estimate_tokens(str(getattr(message, "content", ""))) for message in messages)
+        return prompt + self.max_tokens
+
+    def _unused_tokens(self, error: BaseException, reserved: int) -> int:
+        # A request the API answered with an error status was not run; otherwise the prompt may have been counted
+        return reserved if _status_of(error) is not None else min(reserved, self.max_tokens)
+
+    async def _acquire(self, tokens: int, call_record) -> float:
+        waited = await self.scheduler.acquire(tokens)
+        if call_record is not None:
+            call_record.queue_wait += waited
+        return time.monotonic()
+
+    async def _backoff(self, error: BaseException, attempt: int, call_record):
+        delay = self.scheduler.retry_delay(error, attempt)
+        if delay is None:
+            if call_record is not None:
+                call_record.throttled = is_throttled(error)
+            raise error
+        if call_record is not None:
+            call_record.retries += 1
+            call_record.queue_wait += delay
+        await asyncio.sleep(delay)
+
+    async def create(self, messages, call_record=None, **kwargs):
+        tokens = self._reserved_tokens(messages)
+        attempt = 0
+        while True:
+            started = await self._acquire(tokens, call_record)
+            try:
+                result = await self.inner.create(messages, **kwargs)
+            except BaseException as e:
+                self.scheduler.failed(e, started, self._unused_tokens(e, tokens))
+                await self._backoff(e, attempt, call_record)
+                attempt += 1
+                continue
+            self.scheduler.succeeded(tokens, result.usage)
+            return result
+
+    async def create_stream(self, messages, call_record=None, **kwargs):
+        tokens = self._reserved_tokens(messages)
+        attempt = 0
+        while True:
+            started = await self._acquire(tokens, call_record)
+            usage = None
+            streamed = False
+            try:
+                async for chunk in self.inner.create_stream(messages, **kwargs):
+                    if isinstance(chunk, CreateResult):
+                        usage = chunk.usage
+                    streamed = True
+                    yield chunk
+            except BaseException as e:
+                # Tokens already streamed were generated, so only an unstarted stream gives its reservation back
+                self.scheduler.failed(e, started, 0 if streamed else self._unused_tokens(e, tokens))
+                if streamed:
+                    raise
+                await self._backoff(e, attempt, call_record)
+                attempt += 1
+                continue
+            self.scheduler.succeeded(tokens, usage)
+            return
+
+
+_limiter: Optional[RateLimitScheduler] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimitScheduler:
+    """Return the process-wide scheduler shared by every story and agent"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimitScheduler()
+        return _limiter
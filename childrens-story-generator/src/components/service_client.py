@@ -0,0 +1,133 @@
+import json
+import threading
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from components.jobs import Job, QueueFullError
+from components.metrics import RunReport
+from components.story_extraction import Story
+from config import SERVICE_CONFIG
+
+if TYPE_CHECKING:
+    from components.story_edits import StoryEdit
+
+
+class StoryServiceClient:
+    """Client of the HTTP story service with the JobQueue methods the app uses.
+
+    ``submit()``, ``submit_edit()``, ``submit_resume()``, ``get()``, ``position()``, ``cancel()``
+    and ``workers`` behave like the local queue's, so the app can hand its
+    stories to a separate, separately scaled service. A full queue (429) or
+    a draining server (503) raises ``QueueFullError``, as the local queue
+    does when it is full.
+    """
+
+    def __init__(self, url: Optional[str] = None, timeout: Optional[float] = None,
+                 transport: Optional[httpx.BaseTransport] = None):
+        self.url = (url or SERVICE_CONFIG["url"]).rstrip("/")
+        self._http = httpx.Client(base_url=self.url, timeout=timeout or SERVICE_CONFIG["client_timeout"],
+                                  transport=transport)
+
+    @staticmethod
+    def _error(response: httpx.Response) -> str:
+        try:
+            return response.json().get("error") or response.text
+        except ValueError:
+            return response.text
+
+    def _accepted(self, response: httpx.Response) -> str:
+        if response.status_code in (429, 503):
+            raise QueueFullError(self._error(response))
+        if response.status_code in (400, 409):
+            raise ValueError(self._error(response))
+        response.raise_for_status()
+        return response.json()["job_id"]
+
+    def submit(self, title: str, genre: str, regenerate: bool = False, mode: Optional[str] = None) -> str:
+        """Queue a story on the service and return its job id"""
+        return self._accepted(self._http.post("/stories", json={"title": title, "genre": genre,
+                                                                 "regenerate": regenerate, "mode": mode}))
+
+    def submit_edit(self, story: Story, edit: "StoryEdit", parent_id: Optional[str] = None) -> str:
+        """Queue an edit of the story the service wrote as job ``parent_id``"""
+        if parent_id is None:
+            raise ValueError("The story service edits stories by the job id that wrote them")
+        return self._accepted(self._http.post(f"/stories/{parent_id}/edits", json=asdict(edit)))
+
+    def submit_resume(self, run_id: str, title: str, genre: str, parent_id: Optional[str] = None) -> str:
+        """Queue the continuation of the partial story the service wrote as job ``parent_id``"""
+        if parent_id is None:
+            raise ValueError("The story service resumes stories by the job id that wrote them")
+        # The service looks the run id up from the job itself
+        return self._accepted(self._http.post(f"/stories/{parent_id}/resume"))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job as the service last saw it, with the story once it is done"""
+        response = self._http.get(f"/stories/{job_id}/result")
+        if response.status_code == 404:
+            return None
+        if response.status_code not in (200, 202, 409):
+            response.raise_for_status()
+        return _job(response.json())
+
+    def position(self, job_id: str) -> int:
+        response = self._http.get(f"/stories/{job_id}")
+        return response.json()["position"] if response.status_code == 200 else 0
+
+    def cancel(self, job_id: str) -> bool:
+        return self._http.delete(f"/stories/{job_id}").status_code == 202
+
+    def health(self) -> Dict[str, Any]:
+        """The service's status and queue stats, whether or not it is ready"""
+        return self._http.get("/readyz").json()
+
+    @property
+    def workers(self) -> int:
+        return self.health()["queue"]["workers"]
+
+    def events(self, job_id: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(event, data) pairs from the job's event stream until its ``result``"""
+        with self._http.stream("GET", f"/stories/{job_id}/events", timeout=None) as response:
+            response.raise_for_status()
+            event, data = None, []
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    data.append(line[6:])
+                elif not line and event is not None:
+                    yield event, json.loads("\n".join(data))
+                    event, data = None, []
+
+    def close(self):
+        self._http.close()
+
+
+def _job(data: Dict[str, Any]) -> Job:
+    live_text = data.get("live_text")
+    return Job(
+        job_id=data["job_id"], title=data["title"], genre=data["genre"], regenerate=data["regenerate"],
+        mode=data["mode"], status=data["status"], submitted_at=data["submitted_at"],
+        started_at=data["started_at"], finished_at=data["finished_at"], agent=data["agent"],
+        turn=data["turn"], progress=data["progress"], error=data["error"], parent_id=data["parent_id"],
+        resume_id=data.get("resume_id"),
+        story=data.get("story", ""), stats=data.get("stats") or {},
+        report=RunReport.from_dict(data["report"]) if data.get("report") else None,
+        structured=Story.from_dict(data["structured"]) if data.get("structured") else None,
+        chunks=[live_text] if live_text else [],
+    )
+
+
+_client: Optional[StoryServiceClient] = None
+_client_lock = threading.Lock()
+
+
+def get_service_client() -> StoryServiceClient:
+    """Return the process-wide client of the service at STORY_SERVICE_URL"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = StoryServiceClient()
+        return _client
@@ -0,0 +1,213 @@
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from components.story_extraction import Story
+from components.story_library import StoryLibrary, get_story_library
+from config import ANALYTICS_CONFIG, STORY_CONFIG
+
+# Odd multiplier of the word hashes (the FNV-1 64-bit prime) and its inverse modulo 2**64
+_HASH_BASE = np.uint64(0x100000001B3)
+_HASH_BASE_INVERSE = np.uint64(pow(0x100000001B3, -1, 1 << 64))
+
+# Lookup tables over ASCII; other code points are clipped to 127 (DEL), which is in neither
+_VOWEL = np.zeros(128, dtype=bool)
+_VOWEL[list(b"aeiouy")] = True
+_SENTENCE_END = np.zeros(128, dtype=bool)
+_SENTENCE_END[list(b".!?\n")] = True
+_ELLIPSIS = 0x2026
+# Mixed into the word hashes so equal words in different stories count apart
+_STORY_SALT = np.uint64(0x9E3779B97F4A7C15)
+
+COUNT_COLUMNS = ("words", "sentences", "syllables", "unique_words", "dialogue_words")
+
+
+def _shifted(mask: np.ndarray, by: int) -> np.ndarray:
+    """``mask`` moved ``by`` places right (left when negative), padded with False"""
+    result = np.zeros_like(mask)
+    if by > 0:
+        result[by:] = mask[:-by]
+    else:
+        result[:by] = mask[-by:]
+    return result
+
+
+def _count_batch(texts: List[str]) -> Dict[str, np.ndarray]:
+    """Token counts of each text, from one pass of array operations over all of them.
+
+    The texts are joined (a NUL between them so no word or quotation runs
+    across two stories) and decoded to one array of code points. Words are
+    runs of letters and digits, with apostrophes between letters kept. A
+    sentence ends at ``.``, ``!``, ``?``, an ellipsis or a line break right
+    after a word (so chapter headings count as sentences of their own), or
+    at the end of the text. Syllables are vowel groups, less a silent final
+    "e" or "ed", and at least one a word. A word is dialogue when an odd
+    number of straight double quotes, or more opening than closing curly
+    ones, come before it in its story. Unique words are counted by a 64-bit
+    polynomial hash of each word.
+    """
+    count = len(texts)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=count)
+    offsets = np.zeros(count, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths + 1)[:-1]
+    # The trailing NUL keeps every offset, even an empty last story's, inside the array
+    codes = np.frombuffer(("\0".join(texts) + "\0").encode("utf-32-le"), dtype=np.uint32)
+    upper = (codes >= 65) & (codes <= 90)
+    codes = codes + (upper.astype(np.uint32) << 5)
+    codes[codes == 0x2019] = ord("'")
+
+    # Latin-1 and the extended Latin, Greek and Cyrillic blocks, without the quotes, dashes and emoji above them
+    letter = ((codes >= 97) & (codes <= 122)) | ((codes >= 0xC0) & (codes < 0x2000) & (codes != 0xD7) & (codes != 0xF7))
+    alphanumeric = letter | ((codes >= 48) & (codes <= 57))
+    word = alphanumeric | ((codes == ord("'")) & _shifted(alphanumeric, 1) & _shifted(alphanumeric, -1))
+    starts = np.flatnonzero(word & ~_shifted(word, 1))
+    ends = np.flatnonzero(word & ~_shifted(word, -1))
+
+    def story_of(positions: np.ndarray) -> np.ndarray:
+        return np.searchsorted(offsets, positions, side="right") - 1
+
+    story_of_word = story_of(starts)
+
+    # Syllables: vowel groups in each word, from a running count of group starts
+    ascii_codes = np.minimum(codes, 127)
+    vowel = _VOWEL[ascii_codes]
+    groups = np.concatenate(([0], np.cumsum(vowel & ~_shifted(vowel, 1), dtype=np.int32)))
+    syllables = groups[ends + 1] - groups[starts]
+    last, before, third = codes[ends], codes[ends - 1], codes[np.maximum(ends - 2, 0)]
+    consonant_before = ~vowel[ends - 1]
+    consonant_third = ~vowel[np.maximum(ends - 2, 0)]
+    silent_e = (last == ord("e")) & consonant_before & ~((before == ord("l")) & consonant_third)
+    silent_ed = (last == ord("d")) & (before == ord("e")) & consonant_third & (third != ord("t")) & (third != ord("d"))
+    silent = (ends - starts >= 2) & (syllables > 1) & (silent_e | silent_ed)
+    syllables = np.maximum(syllables - silent, 1)
+
+    terminator = _SENTENCE_END[ascii_codes] | (codes == _ELLIPSIS)
+    sentence_ends = np.flatnonzero(terminator & _shifted(alphanumeric, 1))
+    open_ended = (lengths > 0) & alphanumeric[np.maximum(offsets + lengths - 1, 0)]
+
+    # Quotes before each word start, less those before its story
+    straight_quote = codes == ord('"')
+    straight = np.cumsum(straight_quote, dtype=np.int32) - straight_quote
+    depth_change = (codes == 0x201C).astype(np.int32) - (codes == 0x201D)
+    depth = np.cumsum(depth_change, dtype=np.int32) - depth_change
+    quotes = straight[starts] - straight[offsets][story_of_word]
+    nesting = depth[starts] - depth[offsets][story_of_word]
+    dialogue = (quotes % 2 == 1) | (nesting > 0)
+
+    # Word hashes: the sum of code * base**position over each word, shifted back to its first letter.
+    # uint64 arithmetic wraps, which is the modulo 2**64 the inverse base is taken for.
+    powers = np.cumprod(np.full(len(codes), _HASH_BASE, dtype=np.uint64))
+    sums = np.concatenate((np.zeros(1, dtype=np.uint64), np.cumsum(codes.astype(np.uint64) * powers)))
+    del powers
+    inverse_powers = np.cumprod(np.full(len(codes), _HASH_BASE_INVERSE, dtype=np.uint64))
+    hashes = (sums[ends + 1] - sums[starts]) * inverse_powers[starts] + story_of_word.astype(np.uint64) * _STORY_SALT
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+
+    return {
+        "words": np.bincount(story_of_word, minlength=count),
+        "sentences": np.bincount(story_of(sentence_ends), minlength=count) + open_ended,
+        "syllables": np.bincount(story_of_word, weights=syllables, minlength=count).astype(np.int64),
+        "unique_words": np.bincount(story_of_word[order], weights=first, minlength=count).astype(np.int64),
+        "dialogue_words": np.bincount(story_of_word, weights=dialogue, minlength=count).astype(np.int64),
+    }
+
+
+def _counts(texts: List[str]) -> Dict[str, np.ndarray]:
+    """``_count_batch`` over batches of about ``batch_chars`` characters, so memory stays bounded"""
+    batches, batch, size = [], [], 0
+    for text in texts:
+        if batch and size + len(text) > ANALYTICS_CONFIG["batch_chars"]:
+            batches.append(_count_batch(batch))
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + 1
+    if batch or not batches:
+        batches.append(_count_batch(batch))
+    return {column: np.concatenate([counts[column] for counts in batches]) for column in COUNT_COLUMNS}
+
+
+def score(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add the readability, length and style scores to a frame of counts, in place.
+
+    The Flesch-Kincaid grade is 0.39 words per sentence + 11.8 syllables per
+    word - 15.59. ``readable`` checks it against ``READABILITY_MIN_GRADE``
+    and ``READABILITY_MAX_GRADE``; ``long_enough`` and ``complete`` check the
+    length and chapter count against ``STORY_CONFIG``, and ``passes`` is all
+    three. ``chapter_length`` is the words per chapter over the target
+    (``min_total_words`` spread over ``chapters``). ``quality`` averages how
+    close a story comes to each check, from 0 to 1 for one that passes:
+    its share of the target length and of the chapters, and a readability
+    that drops by 0.2 per grade outside the range.
+    """
+    words = frame["words"].where(frame["words"] > 0)
+    words_per_page = STORY_CONFIG["words_per_page"]
+    frame["words_per_sentence"] = words / frame["sentences"].clip(lower=1)
+    frame["syllables_per_word"] = frame["syllables"] / words
+    frame["fk_grade"] = 0.39 * frame["words_per_sentence"] + 11.8 * frame["syllables_per_word"] - 15.59
+    frame["pages"] = frame["words"] / words_per_page
+    frame["words_per_chapter"] = frame["words"] / frame["chapters"].where(frame["chapters"] > 0)
+    frame["pages_per_chapter"] = frame["words_per_chapter"] / words_per_page
+    frame["chapter_length"] = frame["words_per_chapter"] / (STORY_CONFIG["min_total_words"] / STORY_CONFIG["chapters"])
+    frame["dialogue_ratio"] = frame["dialogue_words"] / words
+    # Unique words over words: compare it between stories of similar length, as it falls as stories grow
+    frame["vocabulary_diversity"] = frame["unique_words"] / words
+    frame["readable"] = frame["fk_grade"].between(ANALYTICS_CONFIG["min_grade"], ANALYTICS_CONFIG["max_grade"])
+    frame["long_enough"] = frame["words"] >= STORY_CONFIG["min_total_words"]
+    frame["complete"] = frame["chapters"] >= STORY_CONFIG["chapters"]
+    frame["passes"] = frame["readable"] & frame["long_enough"] & frame["complete"]
+    grade = frame["fk_grade"]
+    outside = (ANALYTICS_CONFIG["min_grade"] - grade).clip(lower=0) + (grade - ANALYTICS_CONFIG["max_grade"]).clip(lower=0)
+    frame["quality"] = ((frame["words"] / STORY_CONFIG["min_total_words"]).clip(upper=1)
+                        + (frame["chapters"] / STORY_CONFIG["chapters"]).clip(upper=1)
+                        + (1 - outside / 5).clip(lower=0).fillna(0)) / 3
+    return frame
+
+
+def analyze_stories(stories: Iterable[Union[Story, str]]) -> pd.DataFrame:
+    """Score a batch of stories, one row each, in the order given.
+
+    Stories may be ``Story`` objects or plain text (split into chapters on
+    its headings). Every count comes from array operations over all the
+    texts at once rather than a loop per story; see ``score()`` for the
+    derived columns.
+    """
+    stories = [story if isinstance(story, Story) else Story.from_text(story) for story in stories]
+    frame = pd.DataFrame({
+        "title": [story.title for story in stories],
+        "genre": [story.genre for story in stories],
+        "chapters": np.fromiter((len(story.chapters) for story in stories), dtype=np.int64, count=len(stories)),
+        **_counts([story.text for story in stories]),
+    })
+    return score(frame)
+
+
+def analyze_library(library: Optional[StoryLibrary] = None, genre: Optional[str] = None,
+                    query: Optional[str] = None) -> pd.DataFrame:
+    """Score every story in the library (or those matching ``genre`` and ``query``), indexed by library id"""
+    library = library if library is not None else get_story_library()
+    if library is None:
+        raise ValueError("The story library is disabled (STORY_LIBRARY_ENABLED=false)")
+    entries, stories = [], []
+    for entry, story in library.stories(genre=genre, query=query):
+        entries.append(entry)
+        stories.append(story)
+    frame = analyze_stories(stories)
+    frame.index = pd.Index([entry.id for entry in entries], name="id")
+    frame["created_at"] = pd.to_datetime([entry.created_at for entry in entries], unit="s")
+    frame["mode"] = [entry.mode for entry in entries]
+    frame["cost_usd"] = [entry.cost_usd for entry in entries]
+    return frame
+
+
+def summarize(frame: pd.DataFrame, by: str = "genre") -> pd.DataFrame:
+    """Story count, mean scores and pass rate per ``by`` group, with an "All" row"""
+    columns = ["words", "fk_grade", "words_per_chapter", "dialogue_ratio", "vocabulary_diversity", "quality", "passes"]
+    overall = frame[columns].mean().to_frame("All").T
+    overall.insert(0, "stories", len(frame))
+    grouped = frame.groupby(by)[columns].mean()
+    grouped.insert(0, "stories", frame.groupby(by).size())
+    return pd.concat([grouped, overall]).rename(columns={"passes": "pass_rate"})
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, ContextManager, Dict, Optional, Tuple
+
+from config import STORY_CACHE_CONFIG
+from utils.helpers import sqlite_transaction
+
+
+def make_cache_key(**fields: Any) -> str:
+    """Content-address a story request: sha256 over the canonical JSON of its inputs"""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StoryCache:
+    """Two-tier cache of finished stories: an in-process LRU in front of SQLite.
+
+    Entries expire after ``ttl_seconds`` in both tiers. The memory tier keeps
+    at most ``max_entries`` stories, the disk tier at most ``max_disk_entries``
+    (least recently used rows are evicted first).
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 max_disk_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.path = path if path is not None else STORY_CACHE_CONFIG["path"]
+        self.max_entries = max_entries or STORY_CACHE_CONFIG["max_entries"]
+        self.max_disk_entries = max_disk_entries or STORY_CACHE_CONFIG["max_disk_entries"]
+        self.ttl_seconds = STORY_CACHE_CONFIG["ttl_seconds"] if ttl_seconds is None else ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        if self.path:
+            self._init_db()
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        return sqlite_transaction(self.path)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS stories (
+                key TEXT PRIMARY KEY,
+                story TEXT NOT NULL,
+                stats TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS stories_last_access ON stories (last_access)")
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any], str]]:
+        """Return (story, stats, tier) for a fresh entry, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, story, stats = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return story, stats, "memory"
+                del self._memory[key]
+
+        if self.path:
+            with self._connect() as db:
+                row = db.execute("SELECT story, stats, created_at FROM stories WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    story, stats_json, created_at = row
+                    if now - created_at <= self.ttl_seconds:
+                        db.execute("UPDATE stories SET last_access = ? WHERE key = ?", (now, key))
+                        stats = json.loads(stats_json)
+                        with self._lock:
+                            self._remember(key, created_at, story, stats)
+                            self._counters["disk_hits"] += 1
+                        return story, stats, "disk"
+                    db.execute("DELETE FROM stories WHERE key = ?", (key,))
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, key: str, story: str, stats: Optional[Dict[str, Any]] = None):
+        """Store a finished story in both tiers"""
+        now = time.time()
+        stats = stats or {}
+        with self._lock:
+            self._remember(key, now, story, stats)
+            self._counters["writes"] += 1
+
+        if self.path:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO stories (key, story, stats, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, story, json.dumps(stats), now, now)
+                )
+                db.execute("DELETE FROM stories WHERE created_at < ?", (now - self.ttl_seconds,))
+                overflow = db.execute("SELECT COUNT(*) FROM stories").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    db.execute(
+                        "DELETE FROM stories WHERE key IN (SELECT key FROM stories ORDER BY last_access LIMIT ?)",
+                        (overflow,)
+                    )
+                    with self._lock:
+                        self._counters["evictions"] += overflow
+
+    def _remember(self, key: str, created_at: float, story: str, stats: Dict[str, Any]):
+        # Caller holds the lock
+        self._memory[key] = (created_at, story, stats)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def invalidate(self, key: str):
+        """Drop one entry from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.path:
+            with self._connect() as db:
+                db.execute("DELETE FROM stories WHERE key = ?", (key,))
+
+    def clear(self):
+        """Empty both tiers (counters are kept)"""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            with self._connect() as db:
+                db.execute("DELETE FROM stories")
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current memory tier size"""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["memory_hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+        return counters
+
+
+_cache: Optional[StoryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_story_cache() -> Optional[StoryCache]:
+    """Return the process-wide story cache, or None when caching is disabled"""
+    global _cache
+    if not STORY_CACHE_CONFIG["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = StoryCache()
+        return _cache
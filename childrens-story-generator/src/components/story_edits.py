@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+from autogen_core.models import ChatCompletionClient, CreateResult, SystemMessage, UserMessage
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.story_events import AgentStarted, MessageComplete, StoryEvent, UsageUpdate
+from components.story_extraction import Chapter, Story, parse_chapters, render_chapters
+
+EDIT_KINDS = ("chapter", "climax", "character")
+
+
+@dataclass
+class StoryEdit:
+    """One incremental change to a finished story.
+
+    ``chapter`` rewrites chapter ``chapter``; ``climax`` has the
+    Climax_Creator redo the climax chapter (the one before the last);
+    ``character`` replaces the character named ``character`` with
+    ``replacement``. ``instructions`` is optional guidance for the rewrite.
+    """
+    kind: str
+    chapter: Optional[int] = None
+    character: str = ""
+    replacement: str = ""
+    instructions: str = ""
+
+    def __post_init__(self):
+        if self.kind not in EDIT_KINDS:
+            raise ValueError(f"Unknown edit '{self.kind}', expected one of {EDIT_KINDS}")
+        if self.kind == "chapter" and not self.chapter:
+            raise ValueError("A chapter edit needs the chapter number")
+        if self.kind == "character" and not (self.character.strip() and self.replacement.strip()):
+            raise ValueError("A character edit needs the character to replace and their replacement")
+
+    @property
+    def model_calls(self) -> int:
+        return 2 if self.kind == "character" else 1
+
+    def describe(self) -> str:
+        if self.kind == "chapter":
+            return f"chapter {self.chapter} rewritten"
+        if self.kind == "climax":
+            return "climax rewritten"
+        return f"{self.character} replaced by {self.replacement}"
+
+
+def climax_chapter(story: Story) -> int:
+    """Number of the chapter holding the climax: the one before the conclusion"""
+    numbers = [chapter.number for chapter in story.chapters]
+    return numbers[-2] if len(numbers) > 1 else numbers[0]
+
+
+def outline(story: Story) -> str:
+    """A chapter-by-chapter outline of a finished story: each heading and its opening sentence"""
+    lines = []
+    for chapter in story.chapters:
+        opening = chapter.text.split(". ", 1)[0].strip()
+        lines.append(f"Chapter {chapter.number}: {chapter.title} - {opening[:200]}")
+    return "\n".join(lines)
+
+
+class StoryEditor:
+    """Change one part of a finished story with one or two model calls.
+
+    Everything the edit does not touch is frozen: the character profiles,
+    the outline and the neighbouring chapters are sent as context, and
+    every other chapter is kept verbatim. The edited story is left in
+    ``self.story``.
+    """
+
+    def __init__(self, client_for: Callable[[str], ChatCompletionClient]):
+        self.client_for = client_for
+        self.story: Optional[Story] = None
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def _ask(self, role: str, system_message: str, prompt: str) -> CreateResult:
+        result = await self.client_for(role).create([
+            SystemMessage(content=system_message),
+            UserMessage(content=prompt, source="user")
+        ])
+        self.calls += 1
+        self.prompt_tokens += result.usage.prompt_tokens
+        self.completion_tokens += result.usage.completion_tokens
+        return result
+
+    def _usage(self, role: str) -> UsageUpdate:
+        return UsageUpdate(agent=role, prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+
+    @staticmethod
+    def _chapter_context(story: Story, number: int) -> str:
+        parts = [f"CHARACTERS:\n{story.character_sheet or '(see the story)'}", f"OUTLINE:\n{outline(story)}"]
+        for chapter in story.chapters:
+            if chapter.number in (number - 1, number + 1):
+                parts.append(f"CHAPTER {chapter.number} (unchanged):\n{chapter.text}")
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def _replace_chapter(story: Story, number: int, reply: str) -> Story:
+        old = next(chapter for chapter in story.chapters if chapter.number == number)
+        parsed = [chapter for chapter in parse_chapters(reply) if chapter.number == number]
+        if parsed:
+            new = Chapter(number=number, title=parsed[0].title or old.title, text=parsed[0].text)
+        else:
+            new = Chapter(number=number, title=old.title, text=reply.replace("STORY_COMPLETE", "").strip())
+        chapters = [new if chapter.number == number else chapter for chapter in story.chapters]
+        return _with_chapters(story, chapters)
+
+    async def events(self, story: Story, edit: StoryEdit) -> AsyncIterator[StoryEvent]:
+        """Apply the edit, yielding progress events like a team run"""
+        if not story.chapters:
+            raise ValueError("Only stories with chapter headings can be edited chapter by chapter")
+        if edit.kind == "character":
+            async for event in self._swap_character(story, edit):
+                yield event
+            return
+
+        if edit.kind == "chapter":
+            number, agent = edit.chapter, WriterAgent
+            if number not in [chapter.number for chapter in story.chapters]:
+                raise ValueError(f"The story has no chapter {number}")
+            task = "Write a better version of this chapter."
+        else:
+            number, agent = climax_chapter(story), ClimaxAgent
+            task = ("This chapter holds the climax. Make it more exciting while keeping it safe and positive, "
+                    "and resolve the main conflict through the characters' strengths.")
+        old = next(chapter for chapter in story.chapters if chapter.number == number)
+        yield AgentStarted(agent=agent.NAME, turn=1)
+        result = await self._ask(agent.NAME, agent.SYSTEM_MESSAGE, (
+            f'You are revising the {story.genre} story "{story.title}". Every chapter except Chapter {number} '
+            f"is final.\n\n{self._chapter_context(story, number)}\n\n"
+            f"CURRENT CHAPTER {number}:\n{old.text}\n\n"
+            f"{task} {edit.instructions}\n"
+            f"Write ONLY Chapter {number} again, about {old.word_count} words. Start with the heading "
+            f"'Chapter {number}: <chapter title>' and make it lead naturally into the next chapter."
+        ))
+        self.story = self._replace_chapter(story, number, result.content)
+        yield MessageComplete(agent=agent.NAME, content=result.content, turn=1)
+        yield self._usage(agent.NAME)
+
+    async def _swap_character(self, story: Story, edit: StoryEdit) -> AsyncIterator[StoryEvent]:
+        yield AgentStarted(agent=CharacterAgent.NAME, turn=1)
+        result = await self._ask(CharacterAgent.NAME, CharacterAgent.SYSTEM_MESSAGE, (
+            f'These are the characters of the {story.genre} story "{story.title}":\n\n'
+            f"{story.character_sheet or outline(story)}\n\n"
+            f"Replace {edit.character} with {edit.replacement}, who takes over {edit.character}'s role in the "
+            f"story. {edit.instructions}\nReply with the full updated character profiles in the same format."
+        ))
+        sheet = result.content
+        yield MessageComplete(agent=CharacterAgent.NAME, content=sheet, turn=1)
+        yield self._usage(CharacterAgent.NAME)
+
+        yield AgentStarted(agent=WriterAgent.NAME, turn=2)
+        result = await self._ask(WriterAgent.NAME, WriterAgent.SYSTEM_MESSAGE, (
+            f"CHARACTERS:\n{sheet}\n\nSTORY:\n{render_chapters(story.chapters)}\n\n"
+            f"Rewrite this story with {edit.character} replaced by {edit.replacement} as described above. "
+            f"Keep the plot, every chapter heading and about the same length; change only what the new "
+            f"character requires."
+        ))
+        chapters = parse_chapters(result.content)
+        if not chapters:
+            raise ValueError("The rewritten story has no chapter headings")
+        self.story = _with_chapters(story, chapters, sheet)
+        yield MessageComplete(agent=WriterAgent.NAME, content=result.content, turn=2)
+        yield self._usage(WriterAgent.NAME)
+
+
+def _with_chapters(story: Story, chapters, character_sheet: Optional[str] = None) -> Story:
+    text = render_chapters(chapters)
+    return Story(title=story.title, genre=story.genre, text=text, chapters=list(chapters),
+                 character_sheet=story.character_sheet if character_sheet is None else character_sheet,
+                 source_agent=story.source_agent, word_count=len(text.split()))
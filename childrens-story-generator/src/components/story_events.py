@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+# Events are plain data; importing them must not pull in autogen
+if TYPE_CHECKING:
+    from components.metrics import RunReport
+    from components.story_extraction import Story
+
+
+@dataclass
+class StoryEvent:
+    """Base class for events emitted while a story is being generated"""
+    agent: str
+
+
+@dataclass
+class AgentStarted(StoryEvent):
+    """An agent was selected and is about to take its turn"""
+    turn: int
+
+
+@dataclass
+class TokenChunk(StoryEvent):
+    """A piece of text streamed by the model for the current agent"""
+    text: str
+
+
+@dataclass
+class MessageComplete(StoryEvent):
+    """An agent finished its turn"""
+    content: str
+    turn: int
+
+    @property
+    def word_count(self) -> int:
+        return len(self.content.split())
+
+
+@dataclass
+class UsageUpdate(StoryEvent):
+    """Running token totals for the story so far"""
+    prompt_tokens: int
+    completion_tokens: int
+
+
+@dataclass
+class Terminated(StoryEvent):
+    """The team stopped; carries the extracted story and run statistics.
+
+    ``partial`` is set when a deadline cut the run short, in which case the
+    story holds whatever had been written by then. ``structured`` is the
+    same story split into chapters, without any display notes.
+    ``transcript`` holds every message of the run as dumped dicts when the
+    story library keeps transcripts.
+    """
+    reason: str
+    story: str
+    stats: Dict[str, Any] = field(default_factory=dict)
+    report: Optional["RunReport"] = None
+    partial: bool = False
+    elapsed: float = 0.0
+    structured: Optional["Story"] = None
+    transcript: Optional[List[Dict[str, Any]]] = None
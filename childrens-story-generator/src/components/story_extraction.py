@@ -0,0 +1,204 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from autogen_agentchat.messages import BaseChatMessage, StructuredMessage
+from agents.character_agent import CharacterAgent
+from agents.writer_agent import WriterAgent
+from components.structured_output import (ChapterPatch, CharacterSheet, ClimaxEdits, StoryDraft,
+                                          render_character_sheet)
+from config import STORY_CONFIG
+
+_NUMBER_WORDS = ("one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten")
+_CHAPTER_HEADING = re.compile(
+    r"^[#*_ \t]*chapter[ \t]+(\d+|" + "|".join(_NUMBER_WORDS) + r")\b[ \t:.\-–—*_]*(.*?)[ \t*_#]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+_NOTE_PREFIX = "[Note: "
+_COMPLETE_MARKER = "STORY_COMPLETE"
+
+
+@dataclass
+class Chapter:
+    """One chapter of a story, as headed in the draft"""
+    number: int
+    title: str
+    text: str
+
+    @property
+    def word_count(self) -> int:
+        return len(self.text.split())
+
+
+@dataclass
+class Story:
+    """A story extracted from an agent transcript.
+
+    ``text`` is the final draft as written; ``chapters`` splits it on its
+    chapter headings (empty when the draft has none). ``source_agent`` and
+    ``source_index`` identify the message the draft was taken from.
+    """
+    title: str = ""
+    genre: str = ""
+    text: str = ""
+    chapters: List[Chapter] = field(default_factory=list)
+    character_sheet: str = ""
+    source_agent: Optional[str] = None
+    source_index: Optional[int] = None
+    word_count: int = 0
+
+    @classmethod
+    def from_text(cls, text: str, title: str = "", genre: str = "", character_sheet: str = "",
+                  source_agent: Optional[str] = None, source_index: Optional[int] = None) -> "Story":
+        text = _strip_note(text.replace(_COMPLETE_MARKER, "")).strip()
+        return cls(title=title, genre=genre, text=text, chapters=parse_chapters(text),
+                   character_sheet=character_sheet, source_agent=source_agent,
+                   source_index=source_index, word_count=len(text.split()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Story":
+        """The inverse of ``to_dict()``"""
+        return cls(**{**data, "chapters": [Chapter(**chapter) for chapter in data.get("chapters", [])]})
+
+
+def _strip_note(text: str) -> str:
+    # Drop a trailing "[Note: ...]" added to short or partial stories
+    text = text.rstrip()
+    start = text.rfind(_NOTE_PREFIX) if text.endswith("]") else -1
+    if start == -1 or "]" in text[start:-1]:
+        return text
+    return text[:start]
+
+
+def _chapter_number(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS.index(token.lower()) + 1
+
+
+def parse_chapters(text: str) -> List[Chapter]:
+    """Split a draft on its 'Chapter N: Title' headings in one scan"""
+    headings = list(_CHAPTER_HEADING.finditer(text))
+    chapters = []
+    for position, heading in enumerate(headings):
+        end = headings[position + 1].start() if position + 1 < len(headings) else len(text)
+        chapters.append(Chapter(number=_chapter_number(heading.group(1)), title=heading.group(2).strip(),
+                                text=text[heading.end():end].strip()))
+    return chapters
+
+
+def _is_full_draft(content: str) -> bool:
+    # A draft of the whole story has at least two chapter headings
+    first = _CHAPTER_HEADING.search(content)
+    return first is not None and _CHAPTER_HEADING.search(content, first.end()) is not None
+
+
+def _chapter_numbers(content: str) -> Set[int]:
+    return {_chapter_number(heading.group(1)) for heading in _CHAPTER_HEADING.finditer(content)}
+
+
+def _is_rewrite(numbers: Set[int]) -> bool:
+    # Another agent's message only stands in for the writer's draft when it
+    # retells the story from chapter 1, not when it lists notes on a few chapters
+    return 1 in numbers and len(numbers) >= STORY_CONFIG["chapters"]
+
+
+def extract_story(messages: Sequence, title: str = "", genre: str = "") -> Story:
+    """Pick the final draft from a transcript in a single pass over its messages.
+
+    The final draft is the latest Story_Writer message with chapter headings
+    (later revisions replace earlier ones). A later message from another
+    agent replaces it only when it is a full rewrite: it starts at chapter 1,
+    has at least ``STORY_CONFIG["chapters"]`` chapters and covers every
+    chapter of the writer's draft. Failing both, the latest Story_Writer
+    message, then the longest agent message. The latest Character_Developer
+    message is kept as the character sheet. Messages are scanned newest
+    first, so the scan stops as soon as the draft and sheet are both found,
+    and only references to the chosen messages are held, never copies.
+    """
+    draft = rewrite = writer = longest = sheet = None
+    rewrite_numbers: Set[int] = set()
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if not isinstance(message, BaseChatMessage) or message.source == "user":
+            continue
+        content = getattr(message, "content", None)
+        if not isinstance(content, str) or not content.strip():
+            continue
+        if message.source == CharacterAgent.NAME:
+            if sheet is None:
+                sheet = content
+        else:
+            if message.source == WriterAgent.NAME:
+                if draft is None and _is_full_draft(content):
+                    draft = (index, message)
+                if writer is None:
+                    writer = (index, message)
+            elif draft is None and rewrite is None and _is_full_draft(content):
+                numbers = _chapter_numbers(content)
+                if _is_rewrite(numbers):
+                    rewrite, rewrite_numbers = (index, message), numbers
+            # >= keeps the earliest of equally long messages
+            if longest is None or len(content) >= len(longest[1].content):
+                longest = (index, message)
+        if draft is not None and sheet is not None:
+            break
+
+    if rewrite is not None and (draft is None or _chapter_numbers(draft[1].content) <= rewrite_numbers):
+        draft = rewrite
+    chosen = draft or writer or longest
+    if chosen is None:
+        return Story.from_text(sheet or "", title, genre, character_sheet=sheet or "",
+                               source_agent=CharacterAgent.NAME if sheet else None)
+    index, message = chosen
+    return Story.from_text(message.content, title, genre, character_sheet=sheet or "",
+                           source_agent=message.source, source_index=index)
+
+
+def render_chapters(chapters: Sequence[Chapter]) -> str:
+    return "\n\n".join(f"Chapter {chapter.number}: {chapter.title}\n\n{chapter.text}" for chapter in chapters)
+
+
+def apply_patches(chapters: Dict[int, Chapter], patches: Sequence[ChapterPatch]):
+    """Apply Climax_Creator patches in place, skipping those that do not match"""
+    for patch in patches:
+        chapter = chapters.get(patch.chapter)
+        if chapter is None:
+            continue
+        if not patch.find:
+            chapter.text = f"{chapter.text}\n\n{patch.replace}"
+        elif patch.find in chapter.text:
+            chapter.text = chapter.text.replace(patch.find, patch.replace, 1)
+
+
+def assemble_story(messages: Sequence, title: str = "", genre: str = "") -> Story:
+    """Build the story from JSON-mode replies without parsing any prose.
+
+    Story_Writer chapters replace earlier chapters with the same number and
+    Climax_Creator patches are applied to them in order; patches naming a
+    missing chapter or a passage that is not in it are skipped. Transcripts
+    without structured drafts fall back to ``extract_story``.
+    """
+    chapters: Dict[int, Chapter] = {}
+    sheet = ""
+    source_index = None
+    for index, message in enumerate(messages):
+        if not isinstance(message, StructuredMessage):
+            continue
+        content = message.content
+        if isinstance(content, CharacterSheet):
+            sheet = render_character_sheet(content)
+        elif isinstance(content, StoryDraft):
+            for draft in content.chapters:
+                chapters[draft.number] = Chapter(number=draft.number, title=draft.title, text=draft.text)
+            source_index = index
+        elif isinstance(content, ClimaxEdits):
+            apply_patches(chapters, content.patches)
+
+    if not chapters:
+        return extract_story(messages, title, genre)
+    ordered = [chapters[number] for number in sorted(chapters)]
+    text = render_chapters(ordered)
+    return Story(title=title, genre=genre, text=text, chapters=ordered, character_sheet=sheet,
+                 source_agent=WriterAgent.NAME, source_index=source_index, word_count=len(text.split()))
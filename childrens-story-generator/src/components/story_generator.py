@@ -1,34 +1,104 @@
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import copy
+import uuid
+from autogen_agentchat.base import TaskResult
 from autogen_agentchat.teams import SelectorGroupChat
-from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
-from autogen_ext.models.openai import OpenAIChatCompletionClient
+from autogen_agentchat.messages import (BaseChatMessage, MessageFactory, ModelClientStreamingChunkEvent,
+                                        SelectSpeakerEvent)
 from agents.writer_agent import WriterAgent
 from agents.character_agent import CharacterAgent
 from agents.climax_agent import ClimaxAgent
-from config import LLM_CONFIG, TEAM_CONFIG, STORY_CONFIG
-import asyncio
+from components.best_of import BestOfDrafts
+from components.chapter_fanout import ChapterFanout
+from components.checkpoints import CheckpointStore, get_checkpoint_store
+from components.deadlines import CancellableChatCompletionClient, RunDeadline
+from components.model_clients import get_model_client, get_registry
+from components.metrics import InstrumentedChatCompletionClient, RunReport, SELECTOR_ROLE
+from components.model_contexts import build_model_context, context_strategy
+from components.model_tiers import ModelSettings, ModelTiers, get_model_tiers
+from components.rate_limits import RateLimitedChatCompletionClient, RateLimitScheduler, get_rate_limiter
+from components.story_cache import StoryCache, get_story_cache, make_cache_key
+from components.story_edits import StoryEdit, StoryEditor
+from components.story_library import StoryLibrary, get_story_library
+from components.template_drafts import TemplateDrafts, template_draft
+from components.story_extraction import Story, assemble_story, extract_story
+from components.structured_output import OUTPUT_FORMATS, STRUCTURED_MESSAGE_TYPES
+from components.termination import CollaborationMonitor, CompletionMention
+from components.story_events import (StoryEvent, AgentStarted, TokenChunk, MessageComplete,
+                                     UsageUpdate, Terminated)
+from utils.helpers import estimate_tokens
+from config import (TEAM_CONFIG, STORY_CONFIG, CHECKPOINT_CONFIG, CONTEXT_CONFIG, RATE_LIMIT_CONFIG, TERMINATION_CONFIG,
+                    STORY_LIBRARY_CONFIG)
+
+ORCHESTRATION_MODES = ("selector", "pipeline", "fanout", "best_of")
+
+@dataclass
+class StoryResult:
+    """Outcome of one story in a batch run"""
+    index: int
+    title: str
+    genre: str
+    story: str = ""
+    error: Optional[str] = None
+    stats: Dict[str, Any] = field(default_factory=dict)
+    report: Optional[RunReport] = None
+    partial: bool = False
+    elapsed: float = 0.0
+    run_id: Optional[str] = None
+    structured: Optional[Story] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 class StoryGenerator:
     """Main orchestrator for the multi-agent story generation system"""
     
-    def __init__(self):
-        # Create shared model client
-        self.model_client = OpenAIChatCompletionClient(
-            model=LLM_CONFIG["model"],
-            api_key=LLM_CONFIG["api_key"],
-            temperature=LLM_CONFIG["temperature"],
-            max_tokens=LLM_CONFIG["max_tokens"]
-        )
+    def __init__(self, mode: Optional[str] = None, rounds: Optional[int] = None,
+                 cache: Optional[StoryCache] = None, model_client=None,
+                 timeout: Optional[float] = None, turn_timeout: Optional[float] = None,
+                 checkpoints: Optional[CheckpointStore] = None, output_format: Optional[str] = None,
+                 rate_limiter: Optional[RateLimitScheduler] = None, model_tiers: Optional[ModelTiers] = None,
+                 library: Optional[StoryLibrary] = None):
+        # Each role gets the pooled client for its tier's model (from autogen_config.json)
+        # unless a client, or a dict of clients by tier name, is injected
+        self.model_client = model_client
+        self.model_tiers = model_tiers or get_model_tiers()
+        
+        # Finished stories are cached by content hash of everything that shapes them
+        self.cache = cache if cache is not None else get_story_cache()
         
-        # Initialize agents
-        self.character_agent = CharacterAgent()
-        self.writer_agent = WriterAgent()
-        self.climax_agent = ClimaxAgent()
+        # Every finished story (and edit) is kept in the searchable library
+        self.library = library if library is not None else get_story_library()
         
-        # Setup termination conditions for longer collaboration
-        self.text_mention_termination = TextMentionTermination("STORY_COMPLETE")
-        self.max_messages_termination = MaxMessageTermination(max_messages=TEAM_CONFIG["max_messages"])
-        self.termination = self.text_mention_termination | self.max_messages_termination
+        # Team state is saved after every agent turn so failed runs can be resumed
+        self.checkpoints = checkpoints if checkpoints is not None else get_checkpoint_store()
+        
+        # "selector" lets the LLM pick each speaker, "pipeline" follows a fixed order,
+        # "fanout" outlines once and writes the chapters concurrently, "best_of" writes
+        # several whole drafts concurrently and keeps the one that scores best
+        self.mode = mode or TEAM_CONFIG["orchestration_mode"]
+        if self.mode not in ORCHESTRATION_MODES:
+            raise ValueError(f"Unknown orchestration mode '{self.mode}', expected one of {ORCHESTRATION_MODES}")
+        self.rounds = max(1, rounds or STORY_CONFIG["collaborative_rounds"])
+        
+        # "json" has the team agents reply with schema objects and the climax pass with
+        # patches, so the story is assembled without parsing prose
+        self.output_format = output_format or STORY_CONFIG["output_format"]
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{self.output_format}', expected one of {OUTPUT_FORMATS}")
+        
+        # Every model call goes through the shared scheduler, which paces them to the
+        # provider's limits and retries throttled or failed calls
+        if rate_limiter is None and RATE_LIMIT_CONFIG["enabled"]:
+            rate_limiter = get_rate_limiter()
+        self.rate_limiter = rate_limiter
+        
+        # Runs past either deadline are stopped and return what was written so far
+        self.timeout = timeout or TEAM_CONFIG["timeout"]
+        self.turn_timeout = turn_timeout or TEAM_CONFIG["turn_timeout"]
         
         # Enhanced selector prompt for collaborative story creation
         self.selector_prompt = """Select an agent to perform the next task in creating a comprehensive 10+ page children's story.
@@ -49,24 +119,126 @@ COLLABORATIVE WORKFLOW:
 The goal is a complete, engaging 10+ page story (1500+ words) with rich characters and exciting plot developments.
 Only select one agent at a time."""
     
-    def generate_story(self, title: str, genre: str) -> str:
-        """Generate a comprehensive 10+ page children's story using multi-agent collaboration"""
-        try:
-            # Create the SelectorGroupChat team
-            team = SelectorGroupChat(
-                participants=[
-                    self.character_agent.get_agent(),
-                    self.writer_agent.get_agent(),
-                    self.climax_agent.get_agent()
-                ],
-                model_client=self.model_client,
-                termination_condition=self.termination,
-                selector_prompt=self.selector_prompt,
-                allow_repeated_speaker=True
+    def _client_for(self, role: str, report: Optional[RunReport], deadline: Optional[RunDeadline] = None):
+        """Model client for one role's tier: rate limited, instrumented into the run report and cancelled by the deadline"""
+        settings = self.model_tiers.for_role(role)
+        client = self._tier_client(settings)
+        if self.rate_limiter is not None:
+            client = RateLimitedChatCompletionClient(client, self.rate_limiter, settings.max_tokens)
+        if report is not None:
+            client = InstrumentedChatCompletionClient(client, role, report, settings=settings)
+        if deadline is not None:
+            client = CancellableChatCompletionClient(client, deadline.token)
+        return client
+    
+    def _tier_client(self, settings: ModelSettings):
+        if isinstance(self.model_client, dict):
+            return self.model_client[settings.tier]
+        if self.model_client is not None:
+            return self.model_client
+        return get_model_client(settings.model, settings.temperature, settings.max_tokens)
+    
+    def _create_team(self, stream: bool = False, report: Optional[RunReport] = None,
+                     deadline: Optional[RunDeadline] = None,
+                     monitor: Optional[CollaborationMonitor] = None,
+                     completion: Optional[CompletionMention] = None) -> SelectorGroupChat:
+        """Build a fresh team; agents and termination conditions keep per-run state"""
+        participants = [
+            agent_class(self._client_for(agent_class.NAME, report, deadline), stream=stream,
+                        model_context=build_model_context(agent_class.NAME, report),
+                        structured=self.structured).get_agent()
+            for agent_class in (CharacterAgent, WriterAgent, ClimaxAgent)
+        ]
+        message_types = STRUCTURED_MESSAGE_TYPES if self.structured else None
+        selector_client = self._client_for(SELECTOR_ROLE, report, deadline)
+        
+        # Setup termination conditions for longer collaboration. Only agent
+        # messages count, since the task prompt itself mentions STORY_COMPLETE.
+        # The team stops after every turn (max_turns=1) so its state can be
+        # checkpointed; _team_events enforces the overall turn limit.
+        termination = completion if completion is not None else self._create_completion()
+        
+        if self.mode == "pipeline":
+            # The selector function always answers, so no selector model call is made
+            sequence = self.pipeline_sequence([agent.name for agent in participants], self.rounds)
+            return SelectorGroupChat(
+                participants=participants,
+                model_client=selector_client,
+                termination_condition=termination,
+                max_turns=1,
+                selector_func=self._pipeline_selector(sequence),
+                allow_repeated_speaker=True,
+                emit_team_events=stream,
+                custom_message_types=message_types
             )
-            
-            # Create comprehensive task prompt for 10+ page story
-            task = f"""
+        
+        return SelectorGroupChat(
+            participants=participants,
+            model_client=selector_client,
+            termination_condition=termination,
+            max_turns=1,
+            selector_prompt=self.selector_prompt,
+            model_context=build_model_context(SELECTOR_ROLE, report),
+            allow_repeated_speaker=TEAM_CONFIG["allow_repeated_speaker"],
+            # Agents at their turn cap are no longer offered to the selector
+            candidate_func=monitor.candidates if monitor is not None else None,
+            emit_team_events=stream,
+            custom_message_types=message_types
+        )
+    
+    @staticmethod
+    def _create_completion() -> CompletionMention:
+        return CompletionMention("STORY_COMPLETE", sources=[agent_class.NAME for agent_class in
+                                                            (CharacterAgent, WriterAgent, ClimaxAgent)])
+    
+    def _create_monitor(self) -> Optional[CollaborationMonitor]:
+        if not TERMINATION_CONFIG["enabled"]:
+            return None
+        return CollaborationMonitor([agent_class.NAME for agent_class in (CharacterAgent, WriterAgent, ClimaxAgent)],
+                                    assemble_story if self.structured else extract_story,
+                                    structured=self.structured,
+                                    allow_repeated_speaker=TEAM_CONFIG["allow_repeated_speaker"])
+    
+    @property
+    def structured(self) -> bool:
+        # Fan-out and best-of prompt the model directly and always work in text
+        return self.output_format == "json" and self.mode not in ("fanout", "best_of")
+    
+    def _create_fanout(self, report: Optional[RunReport] = None,
+                       deadline: Optional[RunDeadline] = None) -> ChapterFanout:
+        return ChapterFanout(lambda role: self._client_for(role, report, deadline))
+    
+    def _create_best_of(self, report: Optional[RunReport] = None,
+                        deadline: Optional[RunDeadline] = None) -> BestOfDrafts:
+        return BestOfDrafts(lambda role: self._client_for(role, report, deadline))
+    
+    def expected_turns(self) -> int:
+        """Number of agent turns a complete run is expected to take"""
+        if self.mode == "fanout":
+            # Characters, outline, one turn per chapter and the continuity pass
+            return 2 + STORY_CONFIG["chapters"] + int(STORY_CONFIG["fanout_continuity_pass"])
+        if self.mode == "best_of":
+            # Characters and one turn per draft
+            return 1 + max(1, STORY_CONFIG["best_of_drafts"])
+        return self._max_agent_turns()
+    
+    @staticmethod
+    def pipeline_sequence(names: List[str], rounds: int) -> List[str]:
+        """Speaker order for pipeline mode: characters once, then write/enhance per round"""
+        character, writer, climax = names
+        return [character] + [writer, climax] * rounds
+    
+    @staticmethod
+    def _pipeline_selector(sequence: List[str]):
+        def select_next(messages: Sequence) -> Optional[str]:
+            turn = sum(1 for message in messages
+                       if isinstance(message, BaseChatMessage) and message.source != "user")
+            return sequence[min(turn, len(sequence) - 1)]
+        return select_next
+    
+    def _build_task(self, title: str, genre: str) -> str:
+        """Create comprehensive task prompt for 10+ page story"""
+        return f"""
             Create a comprehensive children's story that will be at least 10 pages long (1500+ words):
             
             📚 STORY DETAILS:
@@ -117,115 +289,566 @@ Only select one agent at a time."""
             Work together through multiple rounds to create a story that children will want to read again and again!
             
             When the complete 10+ page story is ready, end with "STORY_COMPLETE"
-            """
-            
-            # Run the team with extended timeout for longer stories
-            result = self._run_team_sync(team, task)
-            
-            # Extract and return the story
-            return self._extract_story_from_result(result)
+        """
+    
+    def cache_key(self, title: str, genre: str) -> str:
+        """Hash of the request and every setting and prompt that influences the story"""
+        return make_cache_key(
+            title=title,
+            genre=genre,
+            models={role: [settings.model, settings.temperature, settings.max_tokens]
+                    for role, settings in self.role_settings().items()},
+            system_messages=[agent_class.STRUCTURED_SYSTEM_MESSAGE if self.structured else agent_class.SYSTEM_MESSAGE
+                             for agent_class in (CharacterAgent, WriterAgent, ClimaxAgent)],
+            task=self._build_task(title, genre),
+            mode=self.mode,
+            rounds=self.rounds,
+            best_of=([STORY_CONFIG["best_of_drafts"], STORY_CONFIG["best_of_temperatures"]]
+                     if self.mode == "best_of" else None),
+            continuity_pass=STORY_CONFIG["fanout_continuity_pass"] if self.mode == "fanout" else None,
+            contexts={role: context_strategy(role) for role in
+                      (CharacterAgent.NAME, WriterAgent.NAME, ClimaxAgent.NAME, SELECTOR_ROLE)},
+            context_limits=[CONTEXT_CONFIG["token_limit"], CONTEXT_CONFIG["recent_messages"],
+                            CONTEXT_CONFIG["summary_words"]]
+        )
+    
+    def role_settings(self) -> Dict[str, ModelSettings]:
+        """Model settings each agent and the selector run with"""
+        return {role: self.model_tiers.for_role(role)
+                for role in (CharacterAgent.NAME, WriterAgent.NAME, ClimaxAgent.NAME, SELECTOR_ROLE)}
+    
+    def _cached_result(self, title: str, genre: str, regenerate: bool) -> Tuple[Optional[str], Optional[StoryResult]]:
+        """Return (cache key, cached result); the key is None when caching is off"""
+        if self.cache is None:
+            return None, None
+        key = self.cache_key(title, genre)
+        if regenerate:
+            return key, None
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        story, stats, tier = cached
+        return key, StoryResult(0, title, genre, story=story, stats={**stats, "cache": tier},
+                                structured=Story.from_text(story, title, genre))
+    
+    async def _store_result(self, key: Optional[str], story: str, stats: Dict[str, Any]):
+        # Only cache runs in which the agents actually produced something; the SQLite
+        # write runs in a thread so it does not hold up the other streams on the shared loop
+        if key is not None and stats.get("agent_turns"):
+            await asyncio.to_thread(self.cache.set, key, story, stats)
+    
+    async def _save_to_library(self, done: Terminated):
+        # Like the cache, keep only complete runs in which the agents wrote something.
+        # Compressing and inserting run in a thread, off the shared loop
+        if self.library is not None and done.structured is not None and done.structured.text \
+                and not done.partial and done.stats.get("agent_turns"):
+            await asyncio.to_thread(self.library.add, done.structured, done.stats, done.report, done.transcript)
+    
+    def generate_story(self, title: str, genre: str, regenerate: bool = False) -> str:
+        """Generate a comprehensive 10+ page children's story using multi-agent collaboration"""
+        return get_registry().run_sync(self.generate_story_async(title, genre, regenerate))
+    
+    async def generate_story_async(self, title: str, genre: str, regenerate: bool = False) -> str:
+        """Generate a story without blocking the caller's event loop"""
+        return self._story_text(await self.run_story(title, genre, regenerate=regenerate))
+    
+    def resume(self, run_id: str) -> str:
+        """Continue an interrupted run from its last checkpointed turn"""
+        return get_registry().run_sync(self.resume_async(run_id))
+    
+    async def resume_async(self, run_id: str) -> str:
+        """Continue an interrupted run without blocking the caller's event loop"""
+        return self._story_text(await self.resume_story(run_id))
+    
+    def _story_text(self, result: StoryResult) -> str:
+        if not result.ok:
+            message = f"Sorry, there was an error generating the story: {result.error}\n\nPlease check your API key and internet connection. For longer stories, ensure you have sufficient API credits."
+            if self.can_resume(result.run_id):
+                message += f"\n\nProgress was saved. Call resume('{result.run_id}') to continue from the last completed turn."
+            return message
+        return result.story
+    
+    def can_resume(self, run_id: Optional[str]) -> bool:
+        return bool(run_id) and self.checkpoints is not None and run_id in self.checkpoints
+    
+    async def run_story(self, title: str, genre: str, index: int = 0, regenerate: bool = False) -> StoryResult:
+        """Generate one story and return it with its run statistics.
+        
+        Cached stories are returned without running the team unless
+        ``regenerate`` is set, in which case the fresh story replaces them.
+        A run that hits its deadline returns the partial story written so far.
+        """
+        run_id = uuid.uuid4().hex
+        try:
+            key, cached = self._cached_result(title, genre, regenerate)
+            if cached is not None:
+                cached.index = index
+                return cached
             
+            done = await get_registry().run_async(self._last_event(self._run_events(title, genre, key, run_id=run_id)))
+            return self._story_result(index, title, genre, done, run_id)
         except Exception as e:
-            return f"Sorry, there was an error generating the story: {str(e)}\n\nPlease check your API key and internet connection. For longer stories, ensure you have sufficient API credits."
+            return StoryResult(index, title, genre, error=str(e), run_id=run_id)
     
-    def _run_team_sync(self, team, task):
-        """Run the team synchronously using asyncio"""
-        import asyncio
+    async def resume_story(self, run_id: str, index: int = 0) -> StoryResult:
+        """Continue a checkpointed run, paying only for the turns it had not finished"""
+        title, genre = "", ""
         try:
-            # Try to get existing event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If event loop is running, we need to use a different approach
-                import nest_asyncio
-                nest_asyncio.apply()
-                return loop.run_until_complete(team.run(task=task))
-            else:
-                return asyncio.run(team.run(task=task))
-        except RuntimeError:
-            # No event loop, create new one
-            return asyncio.run(team.run(task=task))
-    
-    async def _run_team_async(self, team, task):
-        """Run the team asynchronously"""
-        return await team.run(task=task)
+            generator, checkpoint, key = self._resumed(run_id)
+            title, genre = checkpoint["title"], checkpoint["genre"]
+            done = await get_registry().run_async(self._last_event(
+                generator._run_events(title, genre, key, run_id=run_id, checkpoint=checkpoint)))
+            return self._story_result(index, title, genre, done, run_id)
+        except Exception as e:
+            return StoryResult(index, title, genre, error=str(e), run_id=run_id)
+    
+    async def stream_resume(self, run_id: str) -> AsyncIterator[StoryEvent]:
+        """Continue a checkpointed run, yielding the same events as stream_story()"""
+        generator, checkpoint, key = self._resumed(run_id)
+        async for event in get_registry().stream_async(generator._run_events(
+                checkpoint["title"], checkpoint["genre"], key, stream=True, run_id=run_id, checkpoint=checkpoint)):
+            yield event
+    
+    def _resumed(self, run_id: str) -> Tuple["StoryGenerator", Dict[str, Any], Optional[str]]:
+        """The generator to continue a run with, its checkpoint and its cache key"""
+        if self.checkpoints is None:
+            raise RuntimeError("Checkpoints are disabled")
+        checkpoint = self.checkpoints.load(run_id)
+        
+        # Continue with the settings the run was started with
+        generator = self
+        settings = (checkpoint["mode"], checkpoint["rounds"], checkpoint.get("output_format", "text"))
+        if settings != (self.mode, self.rounds, self.output_format):
+            generator = copy.copy(self)
+            generator.mode, generator.rounds, generator.output_format = settings
+        key = generator.cache_key(checkpoint["title"], checkpoint["genre"]) if self.cache is not None else None
+        return generator, checkpoint, key
+    
+    async def edit_story(self, story: Story, edit: StoryEdit, index: int = 0) -> StoryResult:
+        """Change one part of a finished story with one or two model calls instead of a full run.
+        
+        The character profiles, an outline and the neighbouring chapters are
+        sent as frozen context and every other chapter is kept verbatim.
+        Edited stories are not cached, since they depend on the story edited.
+        """
+        run_id = uuid.uuid4().hex
+        try:
+            done = await get_registry().run_async(self._last_event(self._edit_events(story, edit, run_id)))
+            return self._story_result(index, story.title, story.genre, done, run_id)
+        except Exception as e:
+            return StoryResult(index, story.title, story.genre, error=str(e), run_id=run_id)
+    
+    async def regenerate_chapter(self, story: Story, number: int, instructions: str = "") -> StoryResult:
+        """Rewrite chapter ``number`` only (one Story_Writer call)"""
+        return await self.edit_story(story, StoryEdit("chapter", chapter=number, instructions=instructions))
+    
+    async def regenerate_climax(self, story: Story, instructions: str = "") -> StoryResult:
+        """Redo only the Climax_Creator pass over the climax chapter (one call)"""
+        return await self.edit_story(story, StoryEdit("climax", instructions=instructions))
+    
+    async def swap_character(self, story: Story, character: str, replacement: str,
+                             instructions: str = "") -> StoryResult:
+        """Replace a character: a new profile, then one rewrite of the chapters (two calls)"""
+        return await self.edit_story(story, StoryEdit("character", character=character, replacement=replacement,
+                                                      instructions=instructions))
+    
+    async def stream_edit(self, story: Story, edit: StoryEdit) -> AsyncIterator[StoryEvent]:
+        """Apply an edit, yielding the same events as stream_story()"""
+        async for event in get_registry().stream_async(self._edit_events(story, edit)):
+            yield event
+    
+    async def _edit_events(self, story: Story, edit: StoryEdit,
+                           run_id: Optional[str] = None) -> AsyncIterator[StoryEvent]:
+        report = RunReport(story.title, story.genre, "edit", run_id=run_id or uuid.uuid4().hex)
+        deadline = RunDeadline(self.timeout, self.turn_timeout)
+        editor = StoryEditor(lambda role: self._client_for(role, report, deadline))
+        async with deadline:
+            try:
+                async for event in editor.events(story, edit):
+                    if isinstance(event, MessageComplete):
+                        deadline.next_turn()
+                    yield event
+            except asyncio.CancelledError:
+                if not deadline.expired:
+                    raise
+                # Half an edit is no use, so a deadline fails it and the story stays as it was
+                raise TimeoutError(f"Edit stopped after {deadline.elapsed:.1f} seconds ({deadline.reason})") from None
+        report.finish()
+        stats = {
+            "mode": "edit",
+            "edit": edit.kind,
+            "agent_turns": editor.calls,
+            "model_calls": editor.calls,
+            "selector_calls": 0,
+            "prompt_tokens": editor.prompt_tokens,
+            "completion_tokens": editor.completion_tokens,
+            "cache": "miss",
+            "partial": False,
+            "elapsed_seconds": round(deadline.elapsed, 2),
+            "run_id": report.run_id,
+            "cost_usd": round(report.cost, 6),
+        }
+        done = Terminated(agent="editor", reason=edit.describe(), story=self._render_story(editor.story),
+                          stats=stats, report=report, elapsed=deadline.elapsed, structured=editor.story)
+        await self._save_to_library(done)
+        yield done
+    
+    @staticmethod
+    def _story_result(index: int, title: str, genre: str, done: Terminated, run_id: str) -> StoryResult:
+        return StoryResult(index, title, genre, story=done.story, stats=done.stats, report=done.report,
+                           partial=done.partial, elapsed=done.elapsed, run_id=run_id, structured=done.structured)
+    
+    @staticmethod
+    async def _last_event(events: AsyncIterator[StoryEvent]) -> StoryEvent:
+        last = None
+        async for event in events:
+            last = event
+        return last
+    
+    async def generate_many(self, requests: Iterable[Tuple[str, str]],
+                            max_concurrency: Optional[int] = None,
+                            regenerate: bool = False) -> AsyncIterator[StoryResult]:
+        """Generate many (title, genre) stories concurrently, yielding results as they finish.
+        
+        Every story runs its own team on the shared event loop; a failed story
+        is reported through StoryResult.error and does not cancel the others.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or TEAM_CONFIG["max_concurrent_stories"])
+        
+        async def run_one(index: int, title: str, genre: str) -> StoryResult:
+            async with semaphore:
+                return await self.run_story(title, genre, index, regenerate)
+        
+        tasks = [asyncio.ensure_future(run_one(index, title, genre))
+                 for index, (title, genre) in enumerate(requests)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # Stop outstanding stories if the consumer stops iterating early
+            for task in tasks:
+                task.cancel()
+    
+    async def stream_story(self, title: str, genre: str, regenerate: bool = False) -> AsyncIterator[StoryEvent]:
+        """Generate a story, yielding typed events as agents speak and tokens arrive"""
+        async for event in get_registry().stream_async(self._stream_events(title, genre, regenerate)):
+            yield event
+    
+    def stream_story_sync(self, title: str, genre: str, regenerate: bool = False) -> Iterator[StoryEvent]:
+        """Blocking iterator over stream_story() events for synchronous callers such as Streamlit"""
+        return get_registry().iterate_sync(self._stream_events(title, genre, regenerate))
+    
+    async def _stream_events(self, title: str, genre: str, regenerate: bool = False) -> AsyncIterator[StoryEvent]:
+        key, cached = self._cached_result(title, genre, regenerate)
+        if cached is not None:
+            yield Terminated(agent="cache", reason="cache hit", story=cached.story, stats=cached.stats,
+                             structured=cached.structured)
+            return
+        async for event in self._run_events(title, genre, key, stream=True):
+            yield event
+    
+    async def _run_events(self, title: str, genre: str, key: Optional[str], stream: bool = False,
+                          run_id: Optional[str] = None,
+                          checkpoint: Optional[Dict[str, Any]] = None) -> AsyncIterator[StoryEvent]:
+        """Run the team (or fan-out, or best-of drafts) under the run and turn deadlines, ending with Terminated"""
+        report = RunReport(title, genre, self.mode, run_id=run_id or uuid.uuid4().hex)
+        deadline = RunDeadline(self.timeout, self.turn_timeout)
+        if self.mode == "fanout":
+            events = self._fanout_events(title, genre, report, deadline, stream)
+        elif self.mode == "best_of":
+            events = self._best_of_events(title, genre, report, deadline)
+        else:
+            events = self._team_events(title, genre, report, deadline, stream, checkpoint)
+        if STORY_CONFIG["template_fallback"]:
+            events = self._template_fallback_events(events, title, genre, report)
+        
+        async with deadline:
+            async for event in events:
+                if isinstance(event, MessageComplete):
+                    deadline.next_turn()
+                elif isinstance(event, Terminated):
+                    report.stop_reason = event.reason or ""
+                    report.finish()
+                    event.elapsed = deadline.elapsed
+                    event.partial = deadline.expired
+                    event.report = report
+                    if event.partial:
+                        event.story += (f"\n\n[Note: Generation stopped after {event.elapsed:.1f} seconds "
+                                        f"({deadline.reason}), so this story is incomplete.]")
+                    elif event.agent != "template":
+                        await self._store_result(key, event.story, event.stats)
+                        if self.checkpoints is not None and not CHECKPOINT_CONFIG["keep_completed"]:
+                            self.checkpoints.delete(report.run_id)
+                    event.stats = {**event.stats, "cache": "miss", "partial": event.partial,
+                                   "elapsed_seconds": round(event.elapsed, 2), "run_id": report.run_id,
+                                   "context_tokens_saved": report.context_tokens_saved,
+                                   "cost_usd": round(report.cost, 6), "stop_reason": report.stop_reason,
+                                   "early_stop": report.early_stop,
+                                   "resumable": event.partial and self.can_resume(report.run_id)}
+                    await self._save_to_library(event)
+                yield event
+    
+    async def _template_fallback_events(self, events: AsyncIterator[StoryEvent], title: str, genre: str,
+                                        report: RunReport) -> AsyncIterator[StoryEvent]:
+        """``events``, ending with an offline template draft in place of the error when a call stayed throttled.
+        
+        The draft is neither cached nor kept in the library, and the run's
+        checkpoint is kept, so generating again (or resuming) once the API
+        has capacity writes the real story.
+        """
+        try:
+            async for event in events:
+                yield event
+        except Exception as e:
+            if not any(call.throttled for call in report.calls):
+                raise
+            story = TemplateDrafts().story(title, genre)
+            yield Terminated(agent="template", reason="model API throttled", structured=story, stats={
+                "mode": self.mode,
+                "agent_turns": 0,
+                "model_calls": len(report.calls),
+                "prompt_tokens": sum(call.prompt_tokens for call in report.calls),
+                "completion_tokens": sum(call.completion_tokens for call in report.calls),
+                "fallback": "template",
+                "fallback_error": str(e),
+            }, story=story.text + "\n\n[Note: The story service is busy right now, so this is a quick draft from "
+                                  "story templates. Generate again in a few minutes for a story written by the agents.]")
+    
+    async def _team_events(self, title: str, genre: str, report: RunReport, deadline: RunDeadline,
+                           stream: bool, checkpoint: Optional[Dict[str, Any]] = None) -> AsyncIterator[StoryEvent]:
+        monitor = self._create_monitor()
+        completion = self._create_completion()
+        team = self._create_team(stream=stream, report=report, deadline=deadline, monitor=monitor,
+                                 completion=completion)
+        stop_reason = None
+        if checkpoint is not None:
+            await team.load_state(checkpoint["state"])
+            factory = MessageFactory()
+            for message_type in STRUCTURED_MESSAGE_TYPES:
+                factory.register(message_type)
+            messages = [factory.create(message) for message in checkpoint["messages"]]
+            task = None
+            if monitor is not None:
+                # The checkpoint is saved before this check, so the run may already have been done
+                stop_reason = monitor.check(messages)
+                report.early_stop = monitor.kind
+        else:
+            messages = []
+            task = self._build_task(title, genre)
+        turn = self._agent_turns(messages)
+        prompt_tokens = 0
+        completion_tokens = 0
+        
+        try:
+            while stop_reason is None:
+                turns_before = self._agent_turns(messages)
+                async for item in team.run_stream(task=task, cancellation_token=deadline.token):
+                    if isinstance(item, TaskResult):
+                        # Teams run one turn per run_stream() call so they are idle whenever state is
+                        # saved; anything but one new agent turn without STORY_COMPLETE ends the run
+                        if completion.fired or self._agent_turns(messages) != turns_before + 1:
+                            stop_reason = item.stop_reason or "finished"
+                        continue
+                    if not isinstance(item, ModelClientStreamingChunkEvent):
+                        messages.append(item)
+                    if isinstance(item, SelectSpeakerEvent):
+                        turn += 1
+                        for speaker in item.content:
+                            yield AgentStarted(agent=speaker, turn=turn)
+                    elif isinstance(item, ModelClientStreamingChunkEvent):
+                        yield TokenChunk(agent=item.source, text=item.content)
+                    elif isinstance(item, BaseChatMessage) and item.source != "user":
+                        if not stream:
+                            turn += 1
+                        yield MessageComplete(agent=item.source, content=item.to_text(), turn=turn)
+                        if item.models_usage:
+                            prompt_tokens += item.models_usage.prompt_tokens
+                            completion_tokens += item.models_usage.completion_tokens
+                            yield UsageUpdate(agent=item.source, prompt_tokens=prompt_tokens,
+                                              completion_tokens=completion_tokens)
+                task = None
+                await self._save_checkpoint(report, team, messages)
+                if stop_reason is None and monitor is not None:
+                    # Complete, repeating itself or out of turns: stop before paying for more
+                    stop_reason = monitor.check(messages)
+                    report.early_stop = monitor.kind
+                if stop_reason is None and self._agent_turns(messages) >= self._max_agent_turns():
+                    stop_reason = f"Maximum number of agent turns {self._max_agent_turns()} reached"
+        except (asyncio.CancelledError, Exception):
+            if not deadline.expired:
+                raise
+            # The deadline cancelled the team; assemble what the agents wrote before it
+            stop_reason = deadline.reason
+        
+        story = (assemble_story if self.structured else extract_story)(messages, title, genre)
+        transcript = None
+        if STORY_LIBRARY_CONFIG["keep_transcripts"]:
+            transcript = [message.dump() for message in messages if isinstance(message, BaseChatMessage)]
+        yield Terminated(agent="team", reason=stop_reason, story=self._render_story(story),
+                         stats=self._collect_run_stats(messages, report), structured=story, transcript=transcript)
+    
+    def _max_agent_turns(self) -> int:
+        if self.mode == "pipeline":
+            return 1 + 2 * self.rounds
+        # The task message counts towards max_messages
+        return TEAM_CONFIG["max_messages"] - 1
+    
+    @staticmethod
+    def _agent_turns(messages) -> int:
+        return sum(1 for message in messages if isinstance(message, BaseChatMessage) and message.source != "user")
+    
+    async def _save_checkpoint(self, report: RunReport, team: SelectorGroupChat, messages):
+        """Save the idle team's state and the conversation so far under the run id"""
+        if self.checkpoints is None:
+            return
+        checkpoint = {
+            "title": report.title,
+            "genre": report.genre,
+            "mode": self.mode,
+            "rounds": self.rounds,
+            "output_format": self.output_format,
+            "agent_turns": self._agent_turns(messages),
+            "state": await team.save_state(),
+            "messages": [message.dump() for message in messages if isinstance(message, BaseChatMessage)],
+        }
+        # Written in a thread so the file write does not hold up the other streams on the shared loop
+        await asyncio.to_thread(self.checkpoints.save, report.run_id, checkpoint)
+    
+    async def _fanout_events(self, title: str, genre: str, report: RunReport, deadline: RunDeadline,
+                             stream: bool) -> AsyncIterator[StoryEvent]:
+        fanout = self._create_fanout(report, deadline)
+        try:
+            async for event in fanout.events(title, genre):
+                yield event
+        except (asyncio.CancelledError, Exception):
+            if not deadline.expired:
+                raise
+            # Keep the chapters that finished before the deadline
+            fanout.story = fanout.stitch() or fanout.outline or fanout.characters
+        story = self._fanout_story(fanout, title, genre)
+        yield Terminated(agent="fanout", reason=deadline.reason or "chapters complete",
+                         story=self._render_story(story), stats=self._fanout_stats(fanout), structured=story)
+    
+    async def _best_of_events(self, title: str, genre: str, report: RunReport,
+                              deadline: RunDeadline) -> AsyncIterator[StoryEvent]:
+        best_of = self._create_best_of(report, deadline)
+        try:
+            async for event in best_of.events(title, genre):
+                yield event
+        except (asyncio.CancelledError, Exception):
+            if not deadline.expired:
+                raise
+            # Pick from the drafts that finished before the deadline
+            best_of.story = best_of.pick(title, genre) or best_of.characters
+        story = Story.from_text(best_of.story, title, genre, character_sheet=best_of.characters,
+                                source_agent=WriterAgent.NAME)
+        kept = f"draft {best_of.winner + 1} of {best_of.drafts} kept" if best_of.winner is not None else "no draft written"
+        reason = deadline.reason or kept
+        yield Terminated(agent="best_of", reason=reason, story=self._render_story(story),
+                         stats=self._best_of_stats(best_of), structured=story)
+    
+    def _collect_run_stats(self, messages, report: RunReport) -> Dict[str, Any]:
+        """Count model calls and tokens, including what the LLM selector cost (or would have cost).
+        
+        Selector calls and tokens are the recorded usage of the run's selector
+        calls; turns with a single candidate speaker make none. In pipeline
+        mode no selector runs, and the ``_estimate`` figures are what one call
+        per turn carrying the whole history would have cost.
+        """
+        agent_turns = 0
+        prompt_tokens = 0
+        completion_tokens = 0
+        selector_tokens_estimate = 0
+        history_chars = 0
+        
+        for message in messages:
+            if not isinstance(message, BaseChatMessage):
+                continue
+            if message.source != "user":
+                agent_turns += 1
+                selector_tokens_estimate += estimate_tokens(self.selector_prompt) + history_chars // 4
+            if message.models_usage:
+                prompt_tokens += message.models_usage.prompt_tokens
+                completion_tokens += message.models_usage.completion_tokens
+            history_chars += len(message.to_text())
+        
+        selector_calls = [call for call in report.calls if call.role == SELECTOR_ROLE]
+        selector_mode = self.mode == "selector"
+        return {
+            "mode": self.mode,
+            "agent_turns": agent_turns,
+            "model_calls": agent_turns + len(selector_calls),
+            "selector_calls": len(selector_calls),
+            "selector_calls_saved_estimate": 0 if selector_mode else agent_turns,
+            "selector_input_tokens": sum(call.prompt_tokens for call in selector_calls),
+            "selector_input_tokens_saved_estimate": 0 if selector_mode else selector_tokens_estimate,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+    
+    def _fanout_story(self, fanout: ChapterFanout, title: str = "", genre: str = "") -> Story:
+        return Story.from_text(fanout.story, title, genre, character_sheet=fanout.characters,
+                               source_agent=WriterAgent.NAME)
+    
+    def _fanout_stats(self, fanout: ChapterFanout) -> Dict[str, Any]:
+        """Run statistics for fan-out mode; every call is an agent turn and no selector is used"""
+        return {
+            "mode": self.mode,
+            "agent_turns": fanout.calls,
+            "model_calls": fanout.calls,
+            "selector_calls": 0,
+            "selector_calls_saved_estimate": 0,
+            "selector_input_tokens": 0,
+            "selector_input_tokens_saved_estimate": 0,
+            "prompt_tokens": fanout.prompt_tokens,
+            "completion_tokens": fanout.completion_tokens,
+            "chapters": sum(1 for text in fanout.chapter_texts if text),
+            "chapter_errors": [fanout.chapter_errors.get(number) for number in range(1, fanout.chapters + 1)],
+            # Parallel phase wall time against the time the chapters would take one after another
+            "chapter_phase_seconds": round(fanout.chapter_phase_seconds, 3),
+            "chapter_seconds_sum": round(sum(fanout.chapter_seconds), 3),
+        }
+    
+    def _best_of_stats(self, best_of: BestOfDrafts) -> Dict[str, Any]:
+        """Run statistics for best-of mode, with every draft's score and the one kept"""
+        return {
+            "mode": self.mode,
+            "agent_turns": best_of.calls,
+            "model_calls": best_of.calls,
+            "selector_calls": 0,
+            "selector_calls_saved_estimate": 0,
+            "selector_input_tokens": 0,
+            "selector_input_tokens_saved_estimate": 0,
+            "prompt_tokens": best_of.prompt_tokens,
+            "completion_tokens": best_of.completion_tokens,
+            "drafts": best_of.drafts,
+            "draft_temperatures": [best_of.temperature(index) for index in range(best_of.drafts)],
+            # Local quality score (0 to 1) of each draft, None for drafts that did not finish
+            "draft_scores": [best_of.scores.get(index) for index in range(best_of.drafts)],
+            "winning_draft": best_of.winner + 1 if best_of.winner is not None else None,
+            "draft_errors": [best_of.draft_errors.get(index) for index in range(best_of.drafts)],
+            "draft_phase_seconds": round(best_of.draft_phase_seconds, 3),
+            "draft_seconds_sum": round(sum(best_of.draft_seconds), 3),
+        }
     
     def _extract_story_from_result(self, result) -> str:
         """Extract the final story content from the team result"""
         try:
             if hasattr(result, 'messages') and result.messages:
-                # Look for the complete story content
-                story_content = ""
-                all_content = []
-                
-                for message in result.messages:
-                    if hasattr(message, 'content') and message.content:
-                        content = message.content
-                        # Skip system/coordination messages
-                        if not any(skip_word in content.lower() for skip_word in ['select an agent', 'perform the next task', 'story_complete']):
-                            all_content.append(content)
-                
-                # Look for the longest continuous story content
-                for content in reversed(all_content):
-                    # Check if this looks like a complete story
-                    if (len(content) > 800 and  # Longer content for 10+ page stories
-                        any(story_word in content.lower() for story_word in ['chapter', 'once upon', 'story', 'adventure', 'tale']) and
-                        content.count('.') > 10):  # Has substantial content
-                        story_content = content
-                        break
-                
-                # If no single long story found, combine relevant content
-                if not story_content:
-                    story_parts = []
-                    character_content = ""
-                    main_story = ""
-                    enhancement_content = ""
-                    
-                    for content in all_content:
-                        if len(content) > 100:
-                            # Categorize content by likely source
-                            if any(char_word in content.lower() for char_word in ['character', 'name:', 'personality', 'traits']):
-                                character_content += content + "\n\n"
-                            elif any(story_word in content.lower() for story_word in ['chapter', 'once upon', 'adventure', 'story begins']):
-                                main_story += content + "\n\n"
-                            elif any(climax_word in content.lower() for climax_word in ['climax', 'exciting', 'enhancement', 'tension']):
-                                enhancement_content += content + "\n\n"
-                            else:
-                                story_parts.append(content)
-                    
-                    # Combine in logical order if we have categorized content
-                    if main_story:
-                        story_content = main_story
-                        if enhancement_content and "enhancement" not in main_story.lower():
-                            story_content += "\n\n" + enhancement_content
-                    else:
-                        story_content = "\n\n".join(story_parts) if story_parts else "\n\n".join(all_content)
-                
-                # Clean up the content
-                if "STORY_COMPLETE" in story_content:
-                    story_content = story_content.replace("STORY_COMPLETE", "").strip()
-                
-                # Validate story length
-                word_count = len(story_content.split())
-                if word_count < STORY_CONFIG["min_total_words"]:
-                    story_content += f"\n\n[Note: This story contains {word_count} words. For a full 10+ page experience, consider generating again for more detailed content.]"
-                
-                return story_content if story_content else "Unable to generate a complete story. Please try again with a different title or genre."
-            
+                return self._render_story(extract_story(result.messages))
             return "No story content was generated. Please try again."
-            
         except Exception as e:
             return f"Error processing story result: {str(e)}"
+    
+    @staticmethod
+    def _render_story(story: Story) -> str:
+        """Story text for display, with a note when it falls short of the target length"""
+        if not story.text:
+            return "Unable to generate a complete story. Please try again with a different title or genre."
+        if story.word_count < STORY_CONFIG["min_total_words"]:
+            return story.text + f"\n\n[Note: This story contains {story.word_count} words. For a full 10+ page experience, consider generating again for more detailed content.]"
+        return story.text
 
-# Legacy function for backward compatibility
-def generate_story(title: str, genre: str) -> str:
-    writer_agent = WriterAgent()
-    character_agent = CharacterAgent()
-    climax_agent = ClimaxAgent()
-
-    characters = character_agent.create_characters(genre)
-    plot = f"{title} involves {', '.join(characters)}."
-    story = writer_agent.generate_story(plot)
-    climax = climax_agent.generate_climax(story)
-
-    final_story = f"{story}\n\nAnd then, the climax happens: {climax}"
-    return final_story
\ No newline at end of file
+# Legacy function for backward compatibility: an offline template draft, with no model call
+def generate_story(title: str, genre: str, seed: int = 0) -> str:
+    return template_draft(title, genre, seed)
\ No newline at end of file
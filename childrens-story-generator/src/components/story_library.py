@@ -0,0 +1,291 @@
+import gzip
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from components.story_extraction import Story
+from config import STORY_LIBRARY_CONFIG
+from utils.helpers import sqlite_transaction
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; stories are gzip-compressed without it
+    zstandard = None
+
+_SUMMARY_COLUMNS = ("id, run_id, title, genre, mode, models, created_at, word_count, chapter_count, "
+                    "prompt_tokens, completion_tokens, elapsed_seconds, cost_usd")
+
+
+@dataclass
+class LibraryEntry:
+    """One stored story without its text; load_story() reads and decompresses that"""
+    id: int
+    run_id: str
+    title: str
+    genre: str
+    mode: str
+    models: str
+    created_at: float
+    word_count: int
+    chapter_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    elapsed_seconds: float
+    cost_usd: float
+
+
+def content_hash(title: str, genre: str, text: str) -> str:
+    """sha256 of the title, genre and story text, with whitespace normalised so reflowed copies match"""
+    payload = "\n".join((title.strip().lower(), genre, " ".join(text.split())))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def match_query(query: str) -> str:
+    """FTS5 query that matches every word of ``query`` as a prefix, with any syntax quoted away"""
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+
+
+class StoryLibrary:
+    """Every finished story, kept in SQLite for browsing, search and reuse.
+
+    A row holds the run's metadata (models, tokens, timing, cost) in plain
+    columns and the story (text, chapters and character sheet), the run
+    stats and report, and optionally the transcript as compressed JSON
+    blobs. Stories with the same title, genre and text are stored once.
+    A contentless FTS5 table indexes titles, character sheets and text
+    without keeping a second copy of them. Ids grow with every story and
+    are never reused (AUTOINCREMENT), so pages are read newest first by
+    keyset pagination on the id (in the table or in the full-text index),
+    every page costs the same however deep it is, and an id kept from an
+    earlier page never comes to mean another story. ``close()`` releases
+    the connection that keeps the write-ahead log open.
+    """
+
+    def __init__(self, path: Optional[str] = None, compression: Optional[str] = None):
+        self.path = path if path is not None else STORY_LIBRARY_CONFIG["path"]
+        codec = compression or STORY_LIBRARY_CONFIG["compression"]
+        if codec not in ("zstd", "gzip"):
+            raise ValueError(f"Unknown compression '{codec}', expected 'zstd' or 'gzip'")
+        self.codec = codec if codec == "gzip" or zstandard is not None else "gzip"
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        return sqlite_transaction(self.path)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            # Readers (the app's library page) do not block the workers saving stories
+            db.execute("PRAGMA journal_mode=WAL")
+            self._add_autoincrement(db)
+            db.execute("""CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT NOT NULL UNIQUE,
+                run_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                genre TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                models TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                word_count INTEGER NOT NULL,
+                chapter_count INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                elapsed_seconds REAL NOT NULL,
+                cost_usd REAL NOT NULL,
+                codec TEXT NOT NULL,
+                story BLOB NOT NULL,
+                metadata BLOB NOT NULL,
+                transcript BLOB
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS stories_genre ON stories (genre, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS stories_title ON stories (title COLLATE NOCASE, genre)")
+            db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(
+                title, characters, text, content='', tokenize='unicode61 remove_diacritics 2'
+            )""")
+        # Closing the last connection to a WAL database checkpoints and deletes the
+        # log, so one idle connection stays open and per-call connections close cheaply
+        self._wal_holder: Optional[sqlite3.Connection] = sqlite3.connect(self.path, check_same_thread=False)
+
+    @staticmethod
+    def _add_autoincrement(db: sqlite3.Connection):
+        # Libraries created before ids were AUTOINCREMENT could reuse the id of a deleted
+        # newest story; rebuild their table (the indexes are recreated after this)
+        row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'stories'").fetchone()
+        if row is None or "AUTOINCREMENT" in row[0].upper():
+            return
+        db.execute("ALTER TABLE stories RENAME TO stories_old")
+        db.execute(row[0].replace("INTEGER PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", 1))
+        db.execute("INSERT INTO stories SELECT * FROM stories_old")
+        db.execute("DROP TABLE stories_old")
+
+    def close(self):
+        """Close the connection that keeps the write-ahead log; the library stays usable"""
+        if self._wal_holder is not None:
+            self._wal_holder.close()
+            self._wal_holder = None
+
+    def _compress(self, value: Any) -> bytes:
+        data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=6).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(codec: str, blob: Optional[bytes]) -> Any:
+        if blob is None:
+            return None
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("This story was stored with zstd; install the zstandard package to read it")
+            data = zstandard.ZstdDecompressor().decompress(blob)
+        else:
+            data = gzip.decompress(blob)
+        return json.loads(data)
+
+    def add(self, story: Story, stats: Optional[Dict[str, Any]] = None, report=None,
+            transcript: Optional[Sequence[Dict[str, Any]]] = None) -> int:
+        """Store a finished story and return its id; a story already stored keeps its first row"""
+        stats = stats or {}
+        digest = content_hash(story.title, story.genre, story.text)
+        models = sorted({call.model for call in report.calls if call.model}) if report is not None else []
+        metadata = {"stats": stats, "report": report.to_dict() if report is not None else None}
+        row = (
+            digest, stats.get("run_id") or (report.run_id if report is not None else ""), story.title, story.genre,
+            stats.get("mode", ""), ",".join(models), time.time(), story.word_count, len(story.chapters),
+            stats.get("prompt_tokens", 0), stats.get("completion_tokens", 0), stats.get("elapsed_seconds", 0.0),
+            stats.get("cost_usd", 0.0), self.codec, self._compress(story.to_dict()), self._compress(metadata),
+            self._compress(list(transcript)) if transcript is not None else None
+        )
+        with self._lock, self._connect() as db:
+            existing = db.execute("SELECT id FROM stories WHERE content_hash = ?", (digest,)).fetchone()
+            if existing is not None:
+                return existing[0]
+            cursor = db.execute(
+                "INSERT INTO stories (content_hash, run_id, title, genre, mode, models, created_at, word_count, "
+                "chapter_count, prompt_tokens, completion_tokens, elapsed_seconds, cost_usd, codec, story, "
+                "metadata, transcript) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            db.execute("INSERT INTO stories_fts (rowid, title, characters, text) VALUES (?, ?, ?, ?)",
+                       (cursor.lastrowid, story.title, story.character_sheet, story.text))
+            return cursor.lastrowid
+
+    def page(self, limit: Optional[int] = None, cursor: Optional[int] = None, genre: Optional[str] = None,
+             query: Optional[str] = None) -> Tuple[List[LibraryEntry], Optional[int]]:
+        """One page of stories, newest first, and the cursor of the next page (None on the last)"""
+        limit = limit or STORY_LIBRARY_CONFIG["page_size"]
+        clauses, params = [], []
+        if query and query.strip():
+            # Walk the index newest first rather than collecting every match, so common
+            # words cost no more than rare ones
+            source, key = "stories_fts JOIN stories ON stories.id = stories_fts.rowid", "stories_fts.rowid"
+            clauses.append("stories_fts MATCH ?")
+            params.append(match_query(query))
+        else:
+            source, key = "stories", "stories.id"
+        if genre:
+            clauses.append("stories.genre = ?")
+            params.append(genre)
+        if cursor is not None:
+            clauses.append(f"{key} < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = ", ".join(f"stories.{column.strip()}" for column in _SUMMARY_COLUMNS.split(","))
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {columns} FROM {source} {where} ORDER BY {key} DESC LIMIT ?",
+                              (*params, limit + 1)).fetchall()
+        entries = [LibraryEntry(*row) for row in rows[:limit]]
+        next_cursor = entries[-1].id if len(rows) > limit else None
+        return entries, next_cursor
+
+    def count(self, genre: Optional[str] = None) -> int:
+        with self._connect() as db:
+            if genre:
+                return db.execute("SELECT COUNT(*) FROM stories WHERE genre = ?", (genre,)).fetchone()[0]
+            return db.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def find(self, title: str, genre: Optional[str] = None, limit: int = 5) -> List[LibraryEntry]:
+        """Stories with this title (ignoring case), newest first"""
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM stories WHERE title = ? COLLATE NOCASE"
+        params: List[Any] = [title.strip()]
+        if genre:
+            sql += " AND genre = ?"
+            params.append(genre)
+        with self._connect() as db:
+            rows = db.execute(sql + " ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [LibraryEntry(*row) for row in rows]
+
+    def get(self, entry_id: int) -> Optional[LibraryEntry]:
+        with self._connect() as db:
+            row = db.execute(f"SELECT {_SUMMARY_COLUMNS} FROM stories WHERE id = ?", (entry_id,)).fetchone()
+        return LibraryEntry(*row) if row is not None else None
+
+    def _blob(self, entry_id: int, column: str) -> Any:
+        with self._connect() as db:
+            row = db.execute(f"SELECT codec, {column} FROM stories WHERE id = ?", (entry_id,)).fetchone()
+        return self._decompress(*row) if row is not None else None
+
+    def load_story(self, entry_id: int) -> Optional[Story]:
+        data = self._blob(entry_id, "story")
+        return Story.from_dict(data) if data is not None else None
+
+    def stories(self, genre: Optional[str] = None, query: Optional[str] = None,
+                batch_size: int = 500) -> Iterator[Tuple[LibraryEntry, Story]]:
+        """Every matching story with its entry, newest first, read ``batch_size`` rows per query"""
+        cursor = None
+        while True:
+            entries, cursor = self.page(batch_size, cursor, genre, query)
+            if not entries:
+                return
+            with self._connect() as db:
+                rows = db.execute(f"SELECT id, codec, story FROM stories WHERE id IN "
+                                  f"({', '.join('?' * len(entries))})", [entry.id for entry in entries]).fetchall()
+            blobs = {row[0]: row[1:] for row in rows}
+            for entry in entries:
+                if entry.id in blobs:
+                    yield entry, Story.from_dict(self._decompress(*blobs[entry.id]))
+            if cursor is None:
+                return
+
+    def load_metadata(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """The run stats and the run report as a dict (per-role and per-tier summaries included)"""
+        return self._blob(entry_id, "metadata")
+
+    def load_transcript(self, entry_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Every agent message of the run, when transcripts were kept"""
+        return self._blob(entry_id, "transcript")
+
+    def delete(self, entry_id: int) -> bool:
+        story = self.load_story(entry_id)
+        if story is None:
+            return False
+        with self._lock, self._connect() as db:
+            # A contentless index forgets a row only when given the values it indexed
+            db.execute("INSERT INTO stories_fts (stories_fts, rowid, title, characters, text) "
+                       "VALUES ('delete', ?, ?, ?, ?)", (entry_id, story.title, story.character_sheet, story.text))
+            db.execute("DELETE FROM stories WHERE id = ?", (entry_id,))
+        return True
+
+
+_library: Optional[StoryLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_story_library() -> Optional[StoryLibrary]:
+    """Return the process-wide story library, or None when it is disabled"""
+    global _library
+    if not STORY_LIBRARY_CONFIG["enabled"]:
+        return None
+    with _library_lock:
+        if _library is None:
+            _library = StoryLibrary()
+            atexit.register(_library.close)
+        return _library
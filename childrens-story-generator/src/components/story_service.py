@@ -0,0 +1,305 @@
+import asyncio
+import contextlib
+import importlib
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from components.jobs import Job, JobQueue, QueueFullError
+from components.metrics import get_metrics
+from config import DEFAULT_GENRE, GENRES, SERVICE_CONFIG
+
+# An event stream with nothing new sends a comment this often, so proxies keep it open
+_KEEP_ALIVE_SECONDS = 15.0
+_MAX_TITLE_LENGTH = 200
+
+
+class StoryService:
+    """HTTP front end of a JobQueue: submit stories, follow them and fetch the results.
+
+    The queue's workers bound how many stories are written at once and its
+    ``max_queued`` how many may wait; beyond that, submissions get a 429
+    with Retry-After. ``drain()`` stops taking stories (submissions and
+    readiness get a 503) and gives the queued and running ones up to
+    ``drain_seconds`` to finish before cancelling the rest, so a server
+    behind a load balancer can be stopped without losing work in progress.
+    """
+
+    def __init__(self, queue: Optional[JobQueue] = None, drain_seconds: Optional[float] = None,
+                 retry_after: Optional[int] = None, event_interval: Optional[float] = None):
+        self.queue = queue if queue is not None else JobQueue()
+        self.drain_seconds = SERVICE_CONFIG["drain_seconds"] if drain_seconds is None else drain_seconds
+        self.retry_after = retry_after or SERVICE_CONFIG["retry_after"]
+        self.event_interval = event_interval or SERVICE_CONFIG["event_interval"]
+        self.started = False
+        self.draining = False
+        self._drain_started: Optional[float] = None
+
+    async def start(self):
+        """Load the generator before reporting ready, so the first story does not pay for the import"""
+        await asyncio.to_thread(importlib.import_module, "components.story_generator")
+        self.started = True
+
+    def start_drain(self):
+        """Refuse new stories from now on; safe to call from a signal handler"""
+        if not self.draining:
+            self.draining = True
+            self._drain_started = time.monotonic()
+
+    async def drain(self):
+        """Wait up to ``drain_seconds`` (counted from ``start_drain()``) for the queue to empty, then stop it"""
+        self.start_drain()
+        deadline = self._drain_started + self.drain_seconds
+        while (self.queue.queued or self.queue.running) and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, self.event_interval))
+        # Cancels whatever is still unfinished and waits for its tasks
+        await asyncio.to_thread(self.queue.shutdown)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: Starlette):
+        await self.start()
+        try:
+            yield
+        finally:
+            await self.drain()
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.draining and self.queue.queued < self.queue.max_queued
+
+    def health(self) -> Dict[str, Any]:
+        status = "draining" if self.draining else "ready" if self.ready else "starting" if not self.started else "full"
+        return {"status": status, "queue": self.queue.stats()}
+
+    def job_status(self, job: Job, live_text: bool = False) -> Dict[str, Any]:
+        """What a client needs to follow a job, without its story"""
+        status = {
+            "job_id": job.job_id,
+            "title": job.title,
+            "genre": job.genre,
+            "mode": job.mode,
+            "regenerate": job.regenerate,
+            "status": job.status,
+            "position": self.queue.position(job.job_id),
+            "agent": job.agent,
+            "turn": job.turn,
+            "progress": round(job.progress, 3),
+            "submitted_at": job.submitted_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "wait_seconds": round(job.wait_seconds, 3),
+            "error": job.error,
+            "parent_id": job.parent_id,
+            "resume_id": job.resume_id,
+        }
+        if live_text:
+            status["live_text"] = job.live_text
+        return status
+
+    def job_result(self, job: Job) -> Dict[str, Any]:
+        """The status plus the story, its chapters, run stats and run report (the last two only for jobs this process ran)"""
+        return {
+            **self.job_status(job),
+            "story": job.story,
+            "stats": job.stats,
+            "structured": job.structured.to_dict() if job.structured is not None else None,
+            "report": job.report.to_dict() if job.report is not None else None,
+        }
+
+    def _busy(self, message: str, status_code: int) -> JSONResponse:
+        return JSONResponse({"error": message}, status_code=status_code,
+                            headers={"Retry-After": str(self.retry_after)})
+
+    async def _job_or_404(self, request: Request):
+        # JobQueue calls may touch SQLite, so they run in the thread pool, never on the event loop
+        job = await run_in_threadpool(self.queue.get, request.path_params["job_id"])
+        if job is None:
+            return None, JSONResponse({"error": "No such story"}, status_code=404)
+        return job, None
+
+    async def _body(self, request: Request) -> Dict[str, Any]:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise ValueError("The request body must be a JSON object")
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _story_request(body: Dict[str, Any]):
+        from components.story_generator import ORCHESTRATION_MODES
+        title = body.get("title")
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError("'title' is required")
+        if len(title) > _MAX_TITLE_LENGTH:
+            raise ValueError(f"'title' is longer than {_MAX_TITLE_LENGTH} characters")
+        genres = {genre.lower(): genre for genre in GENRES}
+        genre = genres.get(str(body.get("genre") or DEFAULT_GENRE).strip().lower())
+        if genre is None:
+            raise ValueError(f"Unknown genre '{body.get('genre')}', expected one of {GENRES}")
+        mode = body.get("mode")
+        if mode is not None and mode not in ORCHESTRATION_MODES:
+            raise ValueError(f"Unknown orchestration mode '{mode}', expected one of {ORCHESTRATION_MODES}")
+        return title.strip(), genre, bool(body.get("regenerate", False)), mode
+
+    async def submit(self, request: Request) -> Response:
+        if self.draining:
+            return self._busy("The story service is shutting down; please try another server", 503)
+        try:
+            title, genre, regenerate, mode = self._story_request(await self._body(request))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        try:
+            job_id = await run_in_threadpool(self.queue.submit, title, genre, regenerate=regenerate, mode=mode)
+        except QueueFullError as e:
+            return self._busy(str(e), 429)
+        return JSONResponse(self.job_status(await run_in_threadpool(self.queue.get, job_id)), status_code=202,
+                            headers={"Location": f"/stories/{job_id}"})
+
+    async def submit_edit(self, request: Request) -> Response:
+        from components.story_edits import StoryEdit
+        from components.story_extraction import Story
+        if self.draining:
+            return self._busy("The story service is shutting down; please try another server", 503)
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        if job.status != "done":
+            return JSONResponse({"error": f"Only finished stories can be edited (this one is {job.status})"},
+                                status_code=409)
+        try:
+            body = await self._body(request)
+            chapter = body.get("chapter")
+            edit = StoryEdit(str(body.get("kind", "")), chapter=int(chapter) if chapter is not None else None,
+                             character=str(body.get("character", "")), replacement=str(body.get("replacement", "")),
+                             instructions=str(body.get("instructions", "")).strip())
+        except (TypeError, ValueError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        # Jobs read back from the store keep only the text
+        source = job.structured if job.structured is not None else Story.from_text(job.story, job.title, job.genre)
+        try:
+            job_id = await run_in_threadpool(self.queue.submit_edit, source, edit, parent_id=job.job_id)
+        except QueueFullError as e:
+            return self._busy(str(e), 429)
+        return JSONResponse(self.job_status(await run_in_threadpool(self.queue.get, job_id)), status_code=202,
+                            headers={"Location": f"/stories/{job_id}"})
+
+    async def submit_resume(self, request: Request) -> Response:
+        """Continue a partial story from its last checkpointed turn"""
+        if self.draining:
+            return self._busy("The story service is shutting down; please try another server", 503)
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        if job.status != "done" or not job.stats.get("resumable"):
+            return JSONResponse({"error": "Only partial stories with a saved checkpoint can be resumed"},
+                                status_code=409)
+        try:
+            job_id = await run_in_threadpool(self.queue.submit_resume, job.stats["run_id"], job.title, job.genre,
+                                             parent_id=job.job_id)
+        except QueueFullError as e:
+            return self._busy(str(e), 429)
+        return JSONResponse(self.job_status(await run_in_threadpool(self.queue.get, job_id)), status_code=202,
+                            headers={"Location": f"/stories/{job_id}"})
+
+    async def status(self, request: Request) -> Response:
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        return JSONResponse(self.job_status(job, live_text=True))
+
+    async def result(self, request: Request) -> Response:
+        """200 with the story once done; 202 with the status while it is being written; 409 when it failed"""
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        if job.active:
+            return JSONResponse(self.job_status(job, live_text=True), status_code=202,
+                                headers={"Retry-After": "1"})
+        return JSONResponse(self.job_result(job), status_code=200 if job.status == "done" else 409)
+
+    async def cancel(self, request: Request) -> Response:
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        if not await run_in_threadpool(self.queue.cancel, job.job_id):
+            return JSONResponse({"error": f"The story already finished ({job.status})"}, status_code=409)
+        return JSONResponse(self.job_status(job), status_code=202)
+
+    async def events(self, request: Request) -> Response:
+        job, missing = await self._job_or_404(request)
+        if missing is not None:
+            return missing
+        return StreamingResponse(self._events(request, job.job_id), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def _events(self, request: Request, job_id: str) -> AsyncIterator[str]:
+        """Server-sent events: ``status`` on every change of state, ``text`` as the current agent writes, then ``result``"""
+        last_status, sent, quiet = None, "", 0.0
+        while True:
+            job = await run_in_threadpool(self.queue.get, job_id)
+            if job is None:
+                return
+            status = self.job_status(job)
+            changed = {key: status[key] for key in ("status", "position", "agent", "turn", "progress")}
+            if changed != last_status:
+                last_status, quiet = changed, 0.0
+                yield _event("status", status)
+            if not job.active:
+                yield _event("result", self.job_result(job))
+                return
+            text = job.live_text
+            if text != sent:
+                # Usually the new tokens only; the whole text when a new turn starts over
+                replace = not text.startswith(sent)
+                yield _event("text", {"agent": job.agent, "turn": job.turn, "replace": replace,
+                                      "text": text if replace else text[len(sent):]})
+                sent, quiet = text, 0.0
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(self.event_interval)
+            quiet += self.event_interval
+            if quiet >= _KEEP_ALIVE_SECONDS:
+                quiet = 0.0
+                yield ": keep-alive\n\n"
+
+    async def healthz(self, request: Request) -> Response:
+        """Liveness: the process is up and serving requests"""
+        return JSONResponse(self.health())
+
+    async def readyz(self, request: Request) -> Response:
+        """Readiness: 503 while starting, draining or with a full queue, so the load balancer sends stories elsewhere"""
+        return JSONResponse(self.health(), status_code=200 if self.ready else 503)
+
+    async def metrics(self, request: Request) -> Response:
+        return PlainTextResponse(get_metrics().to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _event(name: str, data: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def create_app(service: Optional[StoryService] = None) -> Starlette:
+    """The ASGI app; serve it with uvicorn (see src/server.py)"""
+    service = service if service is not None else StoryService()
+    app = Starlette(routes=[
+        Route("/stories", service.submit, methods=["POST"]),
+        Route("/stories/{job_id}", service.status, methods=["GET"]),
+        Route("/stories/{job_id}", service.cancel, methods=["DELETE"]),
+        Route("/stories/{job_id}/result", service.result, methods=["GET"]),
+        Route("/stories/{job_id}/events", service.events, methods=["GET"]),
+        Route("/stories/{job_id}/edits", service.submit_edit, methods=["POST"]),
+        Route("/stories/{job_id}/resume", service.submit_resume, methods=["POST"]),
+        Route("/healthz", service.healthz, methods=["GET"]),
+        Route("/readyz", service.readyz, methods=["GET"]),
+        Route("/metrics", service.metrics, methods=["GET"]),
+    ], lifespan=service.lifespan)
+    app.state.service = service
+    return app
@@ -0,0 +1,66 @@
+from typing import List
+
+from autogen_agentchat.messages import StructuredMessage
+from pydantic import BaseModel
+
+OUTPUT_FORMATS = ("text", "json")
+
+# Every field is required so the schemas are accepted by strict structured output
+
+
+class CharacterProfile(BaseModel):
+    name: str
+    age: str
+    personality: str
+    goal: str
+    growth_arc: str
+    relationships: str
+
+
+class CharacterSheet(BaseModel):
+    """Character_Developer's reply in JSON mode"""
+    characters: List[CharacterProfile]
+    notes: str
+
+
+class ChapterDraft(BaseModel):
+    number: int
+    title: str
+    text: str
+
+
+class StoryDraft(BaseModel):
+    """Story_Writer's reply in JSON mode: only the chapters written or rewritten this turn"""
+    chapters: List[ChapterDraft]
+    status: str
+
+
+class ChapterPatch(BaseModel):
+    """One targeted edit; an empty ``find`` appends ``replace`` to the chapter"""
+    chapter: int
+    find: str
+    replace: str
+
+
+class ClimaxEdits(BaseModel):
+    """Climax_Creator's reply in JSON mode: patches against chapter numbers"""
+    patches: List[ChapterPatch]
+    status: str
+
+
+# Registered with teams and checkpoint loading so these messages round-trip
+STRUCTURED_MESSAGE_TYPES = [StructuredMessage[CharacterSheet], StructuredMessage[StoryDraft],
+                            StructuredMessage[ClimaxEdits]]
+
+
+def render_character_sheet(sheet: CharacterSheet) -> str:
+    """Plain-text character profiles, in the shape the text-mode agent writes them"""
+    lines = ["CHARACTER PROFILES"]
+    for character in sheet.characters:
+        lines.append(f"\n{character.name} ({character.age}): {character.personality}")
+        lines.append(f"Goal: {character.goal}")
+        lines.append(f"Growth: {character.growth_arc}")
+        lines.append(f"Relationships: {character.relationships}")
+    if sheet.notes:
+        lines.append(f"\n{sheet.notes}")
+    return "\n".join(lines)
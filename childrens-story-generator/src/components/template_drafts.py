@@ -0,0 +1,454 @@
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from config import STORY_CONFIG
+
+if TYPE_CHECKING:
+    from components.story_extraction import Story
+
+# Cast, places and plot pieces for each entry of GENRES. Quests are verb phrases
+# ("to ..."), obstacles noun phrases and twists clauses ("just when ..., <twist>").
+GENRE_TABLES: Dict[str, Dict[str, list]] = {
+    "Fantasy": {
+        "characters": [
+            {"name": "Elara", "type": "elf", "trait": "wise"},
+            {"name": "Thorn", "type": "dragon", "trait": "fierce"},
+            {"name": "Bramble", "type": "fairy", "trait": "playful"},
+            {"name": "Wren", "type": "young wizard", "trait": "curious"},
+            {"name": "Pip", "type": "hedgehog knight", "trait": "loyal"},
+        ],
+        "settings": ["the Whispering Woods", "the Crystal Mountains", "the floating castle of Lumen",
+                     "the Valley of Sleeping Stars"],
+        "quests": ["find the lost moonstone", "wake the sleeping dragon queen", "mend the broken rainbow bridge",
+                   "bring the colors back to the enchanted garden"],
+        "obstacles": ["a river of singing water", "a maze of thorny hedges", "a riddle carved on a giant door",
+                      "a storm cloud that would not move"],
+        "twists": ["the moonstone had been glowing inside the smallest pebble all along",
+                   "the grumpy troll turned out to be the guardian of the bridge",
+                   "the magic only worked when all the friends held hands",
+                   "the dragon was not fierce at all, just very lonely"],
+        "lessons": ["Real magic is the kindness we share with others.",
+                    "Being brave does not mean never feeling scared.",
+                    "Everyone has a special gift, even the smallest of us."],
+    },
+    "Adventure": {
+        "characters": [
+            {"name": "Jack", "type": "explorer", "trait": "brave"},
+            {"name": "Luna", "type": "pirate", "trait": "clever"},
+            {"name": "Finn", "type": "treasure hunter", "trait": "determined"},
+            {"name": "Amara", "type": "mountain guide", "trait": "patient"},
+            {"name": "Coco", "type": "parrot", "trait": "chatty"},
+        ],
+        "settings": ["Skull-Shaped Island", "the Jungle of a Thousand Vines", "the snowy peaks of Mount Frost",
+                     "the hidden canyon of echoes"],
+        "quests": ["find the treasure of Captain Goldbeard", "reach the top of the tallest waterfall",
+                   "return the lost map to the island village", "follow the old compass to its secret"],
+        "obstacles": ["a rope bridge with missing boards", "a cave full of echoing tunnels",
+                      "a sudden rainstorm", "a cliff far too steep to climb"],
+        "twists": ["the treasure chest was full of seeds for a new forest",
+                   "the map had been upside down the whole time",
+                   "the rival explorers were lost too and needed their help",
+                   "the compass pointed to home, not to gold"],
+        "lessons": ["The best adventures are the ones we share with friends.",
+                    "Never give up, even when the path is hard.",
+                    "Working together gets you further than going alone."],
+    },
+    "Fairy Tale": {
+        "characters": [
+            {"name": "Rosalind", "type": "princess", "trait": "kind"},
+            {"name": "Tobias", "type": "shoemaker", "trait": "humble"},
+            {"name": "Grandmother Willow", "type": "talking tree", "trait": "gentle"},
+            {"name": "Sir Hopsalot", "type": "frog", "trait": "cheerful"},
+            {"name": "Mira", "type": "goose girl", "trait": "truthful"},
+        ],
+        "settings": ["a kingdom beyond the seven hills", "the glass palace by the sea", "a cottage at the edge of the forest",
+                     "the royal rose garden"],
+        "quests": ["break the sleeping spell on the village", "find the golden key to the tower",
+                   "help the king remember how to laugh", "return the stolen song to the nightingale"],
+        "obstacles": ["a wall of roses that grew back every night", "a tricky three-question riddle",
+                      "a bridge guarded by a sleepy giant", "a spell that turned every word backwards"],
+        "twists": ["the spell could only be broken by a simple act of kindness",
+                   "the wicked witch was really a fairy godmother in disguise",
+                   "the golden key had been in the shoemaker's pocket all along",
+                   "the frog was the one who remembered the way home"],
+        "lessons": ["Kindness is the strongest magic of all.",
+                    "True beauty comes from the heart.",
+                    "Honesty always finds its way home."],
+    },
+    "Science Fiction": {
+        "characters": [
+            {"name": "Nova", "type": "space cadet", "trait": "curious"},
+            {"name": "Bolt", "type": "robot", "trait": "helpful"},
+            {"name": "Zib", "type": "alien", "trait": "friendly"},
+            {"name": "Captain Orion", "type": "star pilot", "trait": "calm"},
+            {"name": "Dot", "type": "tiny drone", "trait": "speedy"},
+        ],
+        "settings": ["the space station Starlight", "the purple moon of Zorbit", "a colony under the ocean of Neptune",
+                     "the rings of a faraway planet"],
+        "quests": ["fix the broken star engine", "send a hello message to a new planet",
+                   "find the missing moon rover", "grow the first garden in space"],
+        "obstacles": ["a shower of tiny space rocks", "a computer that spoke only in beeps",
+                      "a power failure on the whole station", "a gravity switch that kept flipping"],
+        "twists": ["the strange signal was a song from a friendly alien choir",
+                   "the robot had been learning to dream",
+                   "the missing rover had been collecting flowers for the crew",
+                   "the engine only needed a tiny spare part from a toy"],
+        "lessons": ["Being curious helps us discover amazing things.",
+                    "Friends can come from anywhere in the universe.",
+                    "Every problem can be solved one step at a time."],
+    },
+    "Mystery": {
+        "characters": [
+            {"name": "Detective Sam", "type": "detective", "trait": "observant"},
+            {"name": "Maggie", "type": "journalist", "trait": "curious"},
+            {"name": "Mr. Whiskers", "type": "cat", "trait": "sneaky"},
+            {"name": "Ollie", "type": "schoolboy", "trait": "thoughtful"},
+            {"name": "Professor Plum", "type": "librarian", "trait": "clever"},
+        ],
+        "settings": ["the old library on Maple Street", "a sleepy seaside town", "the museum of toys",
+                     "the big house on the hill"],
+        "quests": ["find out who took the town's golden trophy", "discover why the clock tower stopped",
+                   "solve the puzzle of the missing cookies", "find the owner of the mysterious letter"],
+        "obstacles": ["a trail of muddy footprints that went nowhere", "a locked door with no key",
+                      "a code written in tiny dots", "a storm that knocked out every light"],
+        "twists": ["the thief was a squirrel building a shiny nest",
+                   "the secret letter was a birthday surprise for the detective",
+                   "the strange noises came from a lost puppy in the attic",
+                   "the missing trophy had been polished and put back in the wrong case"],
+        "lessons": ["Looking closely helps us understand the world.",
+                    "It is important to listen before we decide.",
+                    "Every clue matters, even the smallest one."],
+    },
+    "Animal Story": {
+        "characters": [
+            {"name": "Benny", "type": "bear cub", "trait": "gentle"},
+            {"name": "Hazel", "type": "squirrel", "trait": "busy"},
+            {"name": "Ozzie", "type": "owl", "trait": "wise"},
+            {"name": "Tilly", "type": "turtle", "trait": "patient"},
+            {"name": "Rusty", "type": "fox", "trait": "clever"},
+        ],
+        "settings": ["Willow Creek Meadow", "the tall pine forest", "the farm by the red barn",
+                     "the reef under the warm blue sea"],
+        "quests": ["find a new home before winter", "help the baby birds learn to fly",
+                   "save the pond from drying up", "bring back the lost lamb"],
+        "obstacles": ["a fallen log across the stream", "a cold wind from the north",
+                      "a hungry fox on the path", "a field too wide to cross in one day"],
+        "twists": ["the slowest animal knew the fastest path",
+                   "the scary shadow was only a friendly moose",
+                   "the lost lamb had been following them the whole time",
+                   "the beavers had already started building a new dam"],
+        "lessons": ["Every animal, big or small, has something to give.",
+                    "Helping others makes our home a better place.",
+                    "Slow and steady can win the day."],
+    },
+    "Friendship": {
+        "characters": [
+            {"name": "Maya", "type": "girl", "trait": "shy"},
+            {"name": "Leo", "type": "boy", "trait": "funny"},
+            {"name": "Priya", "type": "new classmate", "trait": "creative"},
+            {"name": "Sunny", "type": "puppy", "trait": "bouncy"},
+            {"name": "Mr. Gomez", "type": "neighbor", "trait": "kind"},
+        ],
+        "settings": ["Sunnyside School", "the park at the end of the street", "the town summer fair",
+                     "a treehouse in the backyard"],
+        "quests": ["build the best treehouse in town", "win the school kite contest together",
+                   "help the new girl feel at home", "plan a surprise party for a friend"],
+        "obstacles": ["a big argument about whose idea was best", "a rainy day that ruined their plans",
+                      "a misunderstanding that hurt feelings", "a project that was too big for one person"],
+        "twists": ["the new classmate had been just as nervous as everyone else",
+                   "the broken kite flew higher once they fixed it together",
+                   "the surprise party turned into a surprise for all of them",
+                   "the quiet friend had the idea that saved the day"],
+        "lessons": ["Good friends listen to each other.",
+                    "Saying sorry can fix a lot of things.",
+                    "Everyone is better together."],
+    },
+    "Educational": {
+        "characters": [
+            {"name": "Ada", "type": "young scientist", "trait": "curious"},
+            {"name": "Max", "type": "student", "trait": "eager"},
+            {"name": "Professor Hoot", "type": "owl teacher", "trait": "wise"},
+            {"name": "Gizmo", "type": "robot helper", "trait": "precise"},
+            {"name": "Lila", "type": "gardener", "trait": "patient"},
+        ],
+        "settings": ["the science museum", "the school garden", "a weather station on the hill",
+                     "the great city library"],
+        "quests": ["learn how plants drink water", "find out why the sky is blue",
+                   "count all the stars in the night sky", "build a bridge that can hold ten books"],
+        "obstacles": ["an experiment that fizzled", "a puzzle with too many numbers",
+                      "a seed that would not sprout", "a bridge that wobbled and fell"],
+        "twists": ["the failed experiment showed them the right answer",
+                   "the answer was hiding in a simple glass of water",
+                   "the smallest shape made the strongest bridge",
+                   "the plant had been growing roots under the soil all along"],
+        "lessons": ["Mistakes help us learn.",
+                    "Asking questions is the first step to understanding.",
+                    "Learning is an adventure that never ends."],
+    },
+}
+
+# Genres outside GENRES fall back to this table
+DEFAULT_TABLE: Dict[str, list] = {
+    "characters": [
+        {"name": "Charlie", "type": "child", "trait": "imaginative"},
+        {"name": "Riley", "type": "dog", "trait": "loyal"},
+        {"name": "Ruby", "type": "neighbor", "trait": "cheerful"},
+    ],
+    "settings": ["a small town by the river", "a big green park"],
+    "quests": ["find the missing kite", "help a friend in need"],
+    "obstacles": ["a very long walk", "a sudden storm"],
+    "twists": ["the hero discovered a hidden power within themselves",
+               "a long-lost friend appeared to help",
+               "the villain revealed their true intentions",
+               "an unexpected ally joined the fight",
+               "the hero realized that love was the greatest strength"],
+    "lessons": ["Kindness makes every day brighter.", "Friends help each other."],
+}
+
+_TABLES_BY_NAME = {genre.lower(): table for genre, table in GENRE_TABLES.items()}
+
+# Paragraph templates of each chapter stage: one "lead", then "middle" ones (with the
+# shared ones below) until the chapter is long enough, then one "close"
+STAGES: Dict[str, Dict[str, List[str]]] = {
+    "opening": {
+        "titles": ["A New Day", "Meet {hero}", "The Start of Something Big"],
+        "lead": [
+            "Once upon a time, in {setting}, there lived {hero}, {hero_a}. {hero} loved to explore and ask questions about everything. "
+            "Every morning, {hero} looked out at the sky and wondered what the day would bring.",
+            "Far away, in {setting}, the sun came up bright and warm. {hero} was {hero_a}, and today felt different. "
+            "The air smelled like adventure.",
+        ],
+        "middle": [
+            "{hero}'s best friend was {friend}, {friend_a}. \"Good morning!\" called {friend}. \"Are you ready for a big day?\" "
+            "{hero} laughed and nodded. They always did everything together.",
+            "Everyone in {setting} knew {helper}, {helper_a}. {helper} always had a smile and a story to tell. "
+            "\"Something special is going to happen,\" {helper} said with a wink.",
+            "That afternoon, {hero} heard some news. Someone needed to {quest}. Nobody knew how to do it. "
+            "{hero} felt a little flutter of excitement.",
+            "\"We could do it,\" said {hero}. \"We could {quest}!\" {friend} looked surprised. "
+            "\"Do you really think so?\" {hero} took a deep breath. \"I know we can try.\"",
+        ],
+        "close": [
+            "That night, {hero} packed a small bag with snacks, a warm scarf and a lantern. "
+            "\"Tomorrow,\" {hero} whispered, \"our adventure begins.\"",
+            "As the stars came out, {hero} and {friend} made a plan. They would set off at sunrise to {quest}.",
+        ],
+    },
+    "journey": {
+        "titles": ["The Journey Begins", "Into the Unknown", "A Path Full of Surprises"],
+        "lead": [
+            "Early the next morning, {hero} and {friend} set off. The path twisted and turned. "
+            "Birds sang in the trees, and the sun peeked through the leaves.",
+            "The friends walked for a long time. {hero} led the way, and {friend} counted every step out loud. "
+            "\"One hundred and two, one hundred and three!\"",
+        ],
+        "middle": [
+            "Soon they met {helper}. \"Where are you going?\" asked {helper}. "
+            "\"We want to {quest},\" said {hero}. {helper} smiled. \"Then you will need a friend who knows the way.\"",
+            "They stopped by a stream to rest. {friend} shared some apples, and {hero} splashed water on a sleepy frog. "
+            "Everyone giggled, even the frog.",
+            "\"Look!\" cried {friend}, pointing ahead. Something sparkled on the ground. It was a clue. "
+            "{hero} picked it up carefully and turned it over in their hands.",
+            "The way was not always easy. Sometimes the path was muddy, and sometimes it was steep. "
+            "But {hero} remembered to be {hero_trait}, and they kept going.",
+        ],
+        "close": [
+            "By sunset, they could see it in the distance. {hero} smiled. \"We are getting closer,\" {hero} said.",
+            "As the day ended, the friends sat together and looked at the stars. Tomorrow would bring new surprises.",
+        ],
+    },
+    "challenge": {
+        "titles": ["A Big Problem", "Trouble Ahead", "The Hardest Part"],
+        "lead": [
+            "The next day, the friends came to {obstacle}. They stopped and stared. "
+            "\"Oh no,\" said {friend}. \"How will we ever get past this?\"",
+            "Just when things were going well, they found {obstacle}. {hero} felt worried. "
+            "This was going to be much harder than they thought.",
+        ],
+        "middle": [
+            "{friend} tried first, but it did not work. Then {helper} tried, but that did not work either. "
+            "Everyone sat down on a rock and sighed.",
+            "\"Maybe we should go home,\" said {friend} quietly. {hero} thought about it. "
+            "Then {hero} shook their head. \"Not yet. Let's think of another way.\"",
+            "{hero} closed their eyes and thought hard. What would {hero_a} do? "
+            "Slowly, an idea began to grow.",
+            "\"Remember why we came,\" said {hero}. \"We want to {quest}.\" Everyone nodded.",
+            "\"I am a little scared,\" {friend} admitted. {hero} held out a hand. "
+            "\"Me too,\" said {hero}. \"But we can be scared together.\"",
+        ],
+        "close": [
+            "Together, they made a new plan. It was a good plan, and it used everyone's talents. "
+            "\"Let's try again,\" said {hero}.",
+            "The friends worked side by side until the problem was behind them. They were tired, but they were proud.",
+        ],
+    },
+    "climax": {
+        "titles": ["The Big Moment", "When Everything Changed", "The Surprise"],
+        "lead": [
+            "At last, they reached the end of the path. This was the moment they had been waiting for. "
+            "{hero}'s heart beat fast.",
+            "The biggest challenge was right in front of them. The wind blew, and the sky grew dark. "
+            "\"Stay close,\" said {hero}.",
+        ],
+        "middle": [
+            "Just when everything seemed lost, {twist}. Everyone gasped. \"I can't believe it!\" shouted {friend}.",
+            "{hero} remembered everything they had learned on the journey. Being {hero_trait} had helped before. "
+            "It could help again.",
+            "{helper} stepped forward. \"You do not have to do this alone,\" {helper} said. "
+            "Together, they stood tall and faced the challenge.",
+            "With one last brave step, {hero} reached out. Everyone held their breath. And then it happened. "
+            "They did it! They were able to {quest}!",
+        ],
+        "close": [
+            "Everyone cheered and danced in a circle. {friend} hugged {hero} so tightly that they both fell over, laughing.",
+            "A warm, happy feeling filled the air. The friends looked at each other and smiled. They had done it together.",
+        ],
+    },
+    "ending": {
+        "titles": ["Home Again", "What We Learned", "A Happy Ending"],
+        "lead": [
+            "The next morning, the friends went home to {setting}. Everyone came out to greet them. "
+            "\"Tell us everything!\" they cried.",
+            "The journey home felt short and happy. {hero} and {friend} sang songs the whole way.",
+        ],
+        "middle": [
+            "{hero} told the story of the adventure, from the first step to the big surprise. "
+            "Everyone listened with wide eyes.",
+            "That night, {hero} thought about the adventure. {hero} had been scared sometimes, but {hero} had never given up.",
+            "\"Thank you for being my friend,\" {hero} said to {friend}. \"I could not have done it without you.\" "
+            "{friend} grinned. \"That is what friends are for.\"",
+            "{helper} gave {hero} a small gift to remember the journey. {hero} promised to keep it forever.",
+        ],
+        "close": [
+            "{lesson} And from that day on, {hero} and {friend} were ready for any adventure that came their way. The End.",
+            "As {hero} fell asleep, {hero} smiled. {lesson} The End.",
+        ],
+    },
+}
+
+# Middle paragraphs that fit any stage
+SHARED_MIDDLE = [
+    "The wind whispered through {setting}, and the clouds drifted by like soft, white sheep.",
+    "\"What do you think will happen next?\" asked {friend}. {hero} shrugged and smiled. \"Let's find out!\"",
+    "{helper} hummed a little tune. It was an old song about friends who never gave up.",
+    "{friend}'s tummy rumbled loudly. Everyone laughed, and they stopped to share a snack.",
+    "{hero} looked around and noticed tiny details: a shiny beetle, a curly leaf and a feather as blue as the sky.",
+    "A little breeze carried the smell of flowers. {friend} closed their eyes and took a long, happy breath.",
+    "{helper} pointed at a funny cloud shaped like a teapot. \"Look, it is pouring rain tea!\" Everyone giggled.",
+    "\"Are you tired?\" asked {hero}. \"Only a little,\" said {friend}. \"My feet are tired, but my heart is not.\"",
+    "{hero} wrote a note in a small notebook to remember this day. Drawing pictures helped {hero} think.",
+    "The friends counted to three and took a big step together. It felt good to be a team.",
+    "Somewhere nearby, a bird called out a bright, bouncy song. {friend} whistled back, and the bird answered.",
+]
+
+
+def _article(phrase: str) -> str:
+    return ("an " if phrase[0].lower() in "aeiou" else "a ") + phrase
+
+
+def _stages(chapters: int) -> List[str]:
+    """Stage of each chapter: an opening and an ending, the climax just before the ending
+    (as the agents are asked to write it) and journey then challenges in between"""
+    if chapters <= 1:
+        return ["opening"][:chapters]
+    middle = ["journey"] + ["challenge"] * (chapters - 4) if chapters >= 4 else ["challenge"] * (chapters - 3)
+    return ["opening"] + middle + (["climax"] if chapters >= 3 else []) + ["ending"]
+
+
+def genre_table(genre: str) -> Dict[str, list]:
+    """Template table of ``genre``, matched ignoring case; unknown genres get the default table"""
+    return _TABLES_BY_NAME.get((genre or "").strip().lower(), DEFAULT_TABLE)
+
+
+class TemplateDrafts:
+    """Complete story drafts from fixed templates, with no model call.
+
+    Each genre in ``GENRES`` has its own characters, settings, quests,
+    obstacles, twists and lessons. A draft picks a cast and plot from the
+    genre's table and fills ``chapters`` chapters (from ``STORY_CONFIG``)
+    of at least ``words_per_chapter`` words with paragraphs for the
+    chapter's place in the story: opening, journey, challenges, climax and
+    ending. Choices come from a generator seeded with the title, genre and
+    ``seed``, so the same arguments always give the same draft. A 5-chapter
+    draft takes well under a millisecond, which makes it an instant preview
+    while a model run is in progress, a fallback when the API is throttled
+    and cheap payload for load tests.
+    """
+
+    def __init__(self, chapters: Optional[int] = None, words_per_chapter: Optional[int] = None):
+        self.chapters = chapters or STORY_CONFIG["chapters"]
+        self.words_per_chapter = words_per_chapter or STORY_CONFIG["min_total_words"] // self.chapters
+        self.stages = _stages(self.chapters)
+
+    @staticmethod
+    def _random(title: str, genre: str, seed: int) -> random.Random:
+        # String seeds are hashed with SHA-512, so drafts repeat across processes
+        return random.Random(f"{title}|{(genre or '').strip().lower()}|{seed}")
+
+    def characters(self, genre: str, seed: int = 0, count: int = 3) -> List[Dict[str, str]]:
+        """``count`` characters of the genre's cast, the hero first"""
+        cast = genre_table(genre)["characters"]
+        return self._random("", genre, seed).sample(cast, min(count, len(cast)))
+
+    def twist(self, genre: str, seed: int = 0) -> str:
+        """A climax twist of the genre, as a clause"""
+        return self._random("", genre, seed).choice(genre_table(genre)["twists"])
+
+    def _plot(self, rng: random.Random, title: str, genre: str):
+        """Cast (hero, friend, helper) and the words filled into the templates"""
+        table = genre_table(genre)
+        cast = rng.sample(table["characters"], 3)
+        words = {"title": title, "setting": rng.choice(table["settings"]), "quest": rng.choice(table["quests"]),
+                 "obstacle": rng.choice(table["obstacles"]), "twist": rng.choice(table["twists"]),
+                 "lesson": rng.choice(table["lessons"])}
+        for role, character in zip(("hero", "friend", "helper"), cast):
+            words[role] = character["name"]
+            words[f"{role}_type"] = character["type"]
+            words[f"{role}_trait"] = character["trait"]
+            words[f"{role}_a"] = _article(f"{character['trait']} {character['type']}")
+        return cast, words
+
+    def _chapters(self, rng: random.Random, words: Dict[str, str]) -> List[str]:
+        chapters = []
+        for number, stage in enumerate(self.stages, 1):
+            templates = STAGES[stage]
+            # The stage's middles keep their order, with the shared ones dropped in at random places
+            middles = list(templates["middle"])
+            for paragraph in rng.sample(SHARED_MIDDLE, len(SHARED_MIDDLE)):
+                middles.insert(rng.randint(0, len(middles)), paragraph)
+            paragraphs = [rng.choice(templates["lead"]).format_map(words)]
+            close = rng.choice(templates["close"]).format_map(words)
+            count = paragraphs[0].count(" ") + close.count(" ") + 2
+            position = 0
+            # Repeat the middles from the start should a long chapter use them all up
+            while count < self.words_per_chapter:
+                paragraph = middles[position % len(middles)].format_map(words)
+                paragraphs.append(paragraph)
+                count += paragraph.count(" ") + 1
+                position += 1
+            paragraphs.append(close)
+            heading = f"Chapter {number}: " + rng.choice(templates["titles"]).format_map(words)
+            chapters.append(heading + "\n\n" + "\n\n".join(paragraphs))
+        return chapters
+
+    def draft(self, title: str, genre: str, seed: int = 0) -> str:
+        """The full draft, each chapter under a 'Chapter N: Title' heading"""
+        rng = self._random(title, genre, seed)
+        _, words = self._plot(rng, title, genre)
+        return "\n\n".join(self._chapters(rng, words))
+
+    def story(self, title: str, genre: str, seed: int = 0) -> "Story":
+        """The draft as a ``Story``, split into its chapters, with its cast as the character sheet"""
+        # story_extraction imports the agents, which draw on these tables
+        from components.story_extraction import Story
+        rng = self._random(title, genre, seed)
+        cast, words = self._plot(rng, title, genre)
+        sheet = "\n".join(f"- {character['name']}: {_article(character['trait'] + ' ' + character['type'])}"
+                          for character in cast)
+        return Story.from_text("\n\n".join(self._chapters(rng, words)), title, genre, character_sheet=sheet,
+                               source_agent="template")
+
+
+def template_draft(title: str, genre: str, seed: int = 0) -> str:
+    """A full draft of ``title`` from the genre's templates, at the configured length"""
+    return TemplateDrafts().draft(title, genre, seed)
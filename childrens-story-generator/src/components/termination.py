@@ -0,0 +1,190 @@
+import heapq
+import re
+from array import array
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+
+from autogen_agentchat.conditions import TextMentionTermination
+from autogen_agentchat.messages import BaseChatMessage, StopMessage, StructuredMessage
+from agents.climax_agent import ClimaxAgent
+from components.story_extraction import Story, parse_chapters
+from components.structured_output import ClimaxEdits, StoryDraft
+from config import STORY_CONFIG, TERMINATION_CONFIG
+
+# Kinds of early stop, recorded on the run report and counted in the metrics
+STOP_COMPLETE = "complete"
+STOP_DUPLICATE = "duplicate"
+STOP_REVISION_CAP = "revision_cap"
+EARLY_STOP_KINDS = (STOP_COMPLETE, STOP_DUPLICATE, STOP_REVISION_CAP)
+
+_WORD = re.compile(r"\w+")
+
+
+def sketch(text: str, size: Optional[int] = None, keep: Optional[int] = None) -> array:
+    """Bottom-k sketch of a text: the ``keep`` smallest hashes of its ``size``-word shingles.
+
+    Case and punctuation are ignored. The hashes are kept as a sorted array
+    of 64-bit integers, so holding a sketch per chapter between turns costs
+    about a kilobyte each however long the drafts are.
+    """
+    size = size or TERMINATION_CONFIG["shingle_words"]
+    keep = keep or TERMINATION_CONFIG["sketch_size"]
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return array("q", [hash(tuple(words))] if words else [])
+    # zip() over offset slices yields every shingle as a tuple without indexing in Python
+    hashes = set(map(hash, zip(*(words[offset:] for offset in range(size)))))
+    return array("q", sorted(hashes)[:keep])
+
+
+def similarity(a: array, b: array, keep: Optional[int] = None) -> float:
+    """Estimated Jaccard overlap of the texts behind two sketches (exact for short texts)"""
+    if not a and not b:
+        return 1.0
+    a, b = set(a), set(b)
+    union = heapq.nsmallest(keep or TERMINATION_CONFIG["sketch_size"], a | b)
+    return sum(1 for value in union if value in a and value in b) / len(union)
+
+
+class CompletionMention(TextMentionTermination):
+    """Stops a team run when an agent mentions ``text``, and remembers that it did.
+
+    The team resets its termination condition whenever a run stops, so
+    ``fired`` is the only way to tell afterwards whether this condition
+    ended the run rather than the one-turn step limit.
+    """
+
+    def __init__(self, text: str, sources: Optional[Sequence[str]] = None):
+        super().__init__(text, sources=sources)
+        self.fired = False
+
+    async def __call__(self, messages: Sequence) -> Optional[StopMessage]:
+        stop = await super().__call__(messages)
+        if stop is not None:
+            self.fired = True
+        return stop
+
+
+class CollaborationMonitor:
+    """Ends a team run once further turns would be wasted.
+
+    ``check()`` is called after every agent turn with the whole transcript
+    and returns why the run should stop, or None:
+
+    - complete: the story has every chapter and ``min_total_words``, and the
+      Climax_Creator's latest pass is in it (its patches were applied, or a
+      full draft came after its suggestions);
+    - duplicate: a draft is a near-copy of the chapters it rewrites, by
+      shingle overlap of at least ``duplicate_similarity`` per chapter
+      (estimated from bottom-k sketches);
+    - revision_cap: every agent has taken ``max_turns_per_agent`` turns.
+
+    ``candidates()`` is the selector's candidate function, so an agent at
+    its cap is no longer offered; it relies on the turn counts of the last
+    ``check()``. The kind of the last stop is kept in ``kind``. Checking a
+    restored transcript rebuilds the state, so a resumed run picks up
+    where it stopped.
+    """
+
+    def __init__(self, participants: Sequence[str], story_for: Callable[[Sequence], Story],
+                 structured: bool = False, chapters: Optional[int] = None, min_words: Optional[int] = None,
+                 duplicate_similarity: Optional[float] = None, max_turns_per_agent: Optional[int] = None,
+                 allow_repeated_speaker: bool = True):
+        self.participants = list(participants)
+        self.story_for = story_for
+        self.structured = structured
+        self.chapters = chapters or STORY_CONFIG["chapters"]
+        self.min_words = min_words or STORY_CONFIG["min_total_words"]
+        self.duplicate_similarity = duplicate_similarity or TERMINATION_CONFIG["duplicate_similarity"]
+        self.max_turns_per_agent = (TERMINATION_CONFIG["max_turns_per_agent"] if max_turns_per_agent is None
+                                    else max_turns_per_agent)
+        self.allow_repeated_speaker = allow_repeated_speaker
+        self.turns: Counter = Counter()
+        self.kind: Optional[str] = None
+        self._seen = 0
+        self._chapter_sketches: Dict[int, array] = {}
+        self._drafted = False
+        self._suggested = False
+        self._reviewed = False
+
+    def _draft_chapters(self, message: BaseChatMessage) -> Dict[int, str]:
+        """Chapter texts a message writes, by number; empty when it is not a draft"""
+        if isinstance(message, StructuredMessage):
+            if isinstance(message.content, StoryDraft):
+                return {chapter.number: chapter.text for chapter in message.content.chapters}
+            return {}
+        content = getattr(message, "content", None)
+        if not isinstance(content, str):
+            return {}
+        chapters = parse_chapters(content)
+        # A draft of the whole story has at least two chapter headings
+        return {chapter.number: chapter.text for chapter in chapters} if len(chapters) > 1 else {}
+
+    def _observe(self, message: BaseChatMessage) -> Optional[str]:
+        """Update the state with one agent message; returns a duplicate-draft reason"""
+        self.turns[message.source] += 1
+        chapters = self._draft_chapters(message)
+        is_climax = message.source == ClimaxAgent.NAME
+        if self.structured:
+            # Patches are applied to the assembled story as soon as they arrive
+            if is_climax and self._drafted and isinstance(getattr(message, "content", None), ClimaxEdits):
+                self._reviewed = True
+        elif chapters and (is_climax or self._suggested):
+            # A full draft written by, or after, the Climax_Creator carries its pass
+            self._reviewed = True
+        elif is_climax and self._drafted:
+            self._suggested = True
+
+        reason = None
+        if chapters:
+            self._drafted = True
+            scores = []
+            for number, text in chapters.items():
+                new = sketch(text)
+                if number in self._chapter_sketches:
+                    scores.append(similarity(self._chapter_sketches[number], new))
+                self._chapter_sketches[number] = new
+            if scores and len(scores) == len(chapters) and min(scores) >= self.duplicate_similarity:
+                reason = (f"{message.source}'s draft repeats the previous one "
+                          f"({min(scores):.0%} of each chapter unchanged)")
+        return reason
+
+    def check(self, messages: Sequence) -> Optional[str]:
+        """Why the run should stop after the turns added to ``messages`` since the last check"""
+        duplicate = None
+        changed = False
+        for message in messages[self._seen:]:
+            if isinstance(message, BaseChatMessage) and message.source != "user":
+                duplicate = self._observe(message) or duplicate
+                changed = True
+        self._seen = len(messages)
+        if not changed:
+            return None
+
+        if duplicate:
+            self.kind = STOP_DUPLICATE
+            return duplicate
+        if self._reviewed:
+            story = self.story_for(messages)
+            if len(story.chapters) >= self.chapters and story.word_count >= self.min_words:
+                self.kind = STOP_COMPLETE
+                return (f"Story complete: {len(story.chapters)} chapters and {story.word_count} words "
+                        f"after the climax pass")
+        if self.max_turns_per_agent and not self._below_cap():
+            self.kind = STOP_REVISION_CAP
+            return f"Every agent reached the limit of {self.max_turns_per_agent} turns"
+        return None
+
+    def _below_cap(self) -> List[str]:
+        if not self.max_turns_per_agent:
+            return list(self.participants)
+        return [name for name in self.participants if self.turns[name] < self.max_turns_per_agent]
+
+    def candidates(self, thread: Sequence) -> List[str]:
+        """Agents the selector may pick next: those below their turn cap"""
+        names = self._below_cap() or list(self.participants)
+        if not self.allow_repeated_speaker and len(names) > 1:
+            previous = next((message.source for message in reversed(thread)
+                             if isinstance(message, BaseChatMessage) and message.source != "user"), None)
+            names = [name for name in names if name != previous] or names
+        return names
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP service for story generation.
+
+Serves the story job queue over HTTP so generation can run, and scale,
+apart from the Streamlit UI:
+
+    python src/server.py --port 8000 --workers 4 --max-queued 100
+
+    POST   /stories                  {"title": ..., "genre": ..., "regenerate": false, "mode": null}
+    GET    /stories/{id}             status, place in line and progress
+    GET    /stories/{id}/events      server-sent events until the story is finished
+    GET    /stories/{id}/result      the story (202 while it is still being written)
+    POST   /stories/{id}/edits       {"kind": "chapter", "chapter": 2, "instructions": ...}
+    POST   /stories/{id}/resume      continue a partial story from its last checkpoint
+    DELETE /stories/{id}             cancel
+    GET    /healthz, /readyz, /metrics
+
+On SIGTERM or Ctrl+C the server stops taking stories and gives the ones in
+progress up to SERVICE_DRAIN_SECONDS to finish before it exits.
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to the Python path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+from components.jobs import JobQueue
+from components.story_service import StoryService, create_app
+from config import SERVICE_CONFIG
+
+
+class DrainingServer(uvicorn.Server):
+    """Stops taking stories as soon as the server is told to exit, not only once its connections close"""
+
+    def __init__(self, config: uvicorn.Config, service: StoryService):
+        super().__init__(config)
+        self.service = service
+
+    def handle_exit(self, sig, frame):
+        self.service.start_drain()
+        super().handle_exit(sig, frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVICE_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG["port"])
+    parser.add_argument("--workers", type=int, help="Stories generated at the same time (default JOB_WORKERS)")
+    parser.add_argument("--max-queued", type=int, help="Stories that may wait before submissions get a 429 (default JOB_MAX_QUEUED)")
+    parser.add_argument("--drain-seconds", type=float, default=SERVICE_CONFIG["drain_seconds"],
+                        help="Time the stories in progress get to finish on shutdown")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    service = StoryService(JobQueue(workers=args.workers, max_queued=args.max_queued),
+                           drain_seconds=args.drain_seconds)
+    # Open event streams may hold the shutdown for as long as the drain, after which they are closed
+    config = uvicorn.Config(create_app(service), host=args.host, port=args.port, log_level=args.log_level,
+                            timeout_graceful_shutdown=max(1, int(args.drain_seconds)))
+    DrainingServer(config, service).run()
+
+
+if __name__ == "__main__":
+    main()
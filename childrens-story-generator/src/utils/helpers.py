@@ -1,7 +1,22 @@
+import contextlib
+import sqlite3
+from typing import Iterator
+
 def validate_input(input: str) -> bool:
     """Validates the input for the story title and genre."""
     return isinstance(input, str) and len(input) > 0
 
 def format_output(story: str) -> str:
     """Formats the generated story for display."""
-    return story.strip() if story else "No story generated."
\ No newline at end of file
+    return story.strip() if story else "No story generated."
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the token count of a text (about 4 characters per token)."""
+    return max(1, len(text) // 4) if text else 0
+
+@contextlib.contextmanager
+def sqlite_transaction(path: str, timeout: float = 10) -> Iterator[sqlite3.Connection]:
+    """Opens a connection for one transaction, committed (or rolled back on error) and closed on exit."""
+    # A sqlite3 connection's own context manager ends the transaction but leaves it open
+    with contextlib.closing(sqlite3.connect(path, timeout=timeout)) as db, db:
+        yield db
\ No newline at end of file
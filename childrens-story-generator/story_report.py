@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Readability and quality report over the story library.
+
+Scores every stored story (Flesch-Kincaid grade, length, words per chapter,
+dialogue ratio and vocabulary diversity), prints the averages and pass rate
+per genre and lists the stories that fail the quality checks:
+
+    python story_report.py
+    python story_report.py --genre Fantasy --csv .cache/fantasy_scores.csv
+    python story_report.py --check    # exits with 1 when any story fails
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "src"))
+
+import pandas as pd
+
+from components.story_analytics import analyze_library, summarize
+from components.story_library import StoryLibrary
+from config import ANALYTICS_CONFIG, STORY_LIBRARY_CONFIG
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--library", default=STORY_LIBRARY_CONFIG["path"], help="Story library database")
+    parser.add_argument("--genre", help="Only score stories of this genre")
+    parser.add_argument("--query", help="Only score stories matching this full-text search")
+    parser.add_argument("--by", default="genre", choices=("genre", "mode"), help="Group the summary by")
+    parser.add_argument("--csv", help="Write every story's scores to this CSV file")
+    parser.add_argument("--failing", type=int, default=20, help="Failing stories to list (0 lists none)")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when any story fails")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.library):
+        parser.error(f"No story library at {args.library}")
+    frame = analyze_library(StoryLibrary(args.library), genre=args.genre, query=args.query)
+    if frame.empty:
+        print("No stories to score.")
+        return 0
+
+    pd.set_option("display.width", 160)
+    print(f"📚 {len(frame)} stories from {args.library}\n")
+    print(summarize(frame, by=args.by).round(3).to_string())
+    failing = frame[~frame["passes"]]
+    print(f"\n{len(failing)} stories fail the checks (grade {ANALYTICS_CONFIG['min_grade']:g} to "
+          f"{ANALYTICS_CONFIG['max_grade']:g}, length and chapters)")
+    if args.failing and not failing.empty:
+        columns = ["title", "genre", "words", "chapters", "fk_grade", "readable", "long_enough", "complete"]
+        print(failing[columns].head(args.failing).round(2).to_string())
+    if args.csv:
+        frame.to_csv(args.csv)
+        print(f"\n📁 Scores written to {args.csv}")
+    return 1 if args.check and not failing.empty else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
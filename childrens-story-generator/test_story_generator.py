@@ -9,6 +9,7 @@ import os
 # Add the src directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from components.story_analytics import analyze_stories
 from components.story_generator import StoryGenerator
 
 async def test_story_generation():
@@ -44,6 +45,10 @@ async def test_story_generation():
         print(f"🎯 Target Met: {'✅ Yes' if word_count >= 1500 else '❌ No'}")
         print(f"🔤 Character Count: {len(story):,}")
         
+        scores = analyze_stories([story]).iloc[0]
+        print(f"🎓 Reading Grade: {scores['fk_grade']:.1f} {'✅' if scores['readable'] else '❌'}")
+        print(f"💬 Dialogue: {scores['dialogue_ratio']:.0%} of words")
+        
         # Check for story elements
         has_chapters = "chapter" in story.lower()
         has_dialogue = '"' in story or "'" in story
@@ -0,0 +1,13 @@
+import pytest
+
+import config
+from components.model_clients import get_registry
+
+
+@pytest.fixture(autouse=True)
+def no_shared_stores(monkeypatch):
+    # Keep generators off the process-wide cache, library and checkpoints on disk
+    for settings in (config.STORY_CACHE_CONFIG, config.STORY_LIBRARY_CONFIG, config.CHECKPOINT_CONFIG):
+        monkeypatch.setitem(settings, "enabled", False)
+    yield
+    get_registry().shutdown()
@@ -0,0 +1,259 @@
+import asyncio
+import random
+import re
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+from autogen_core.models import (AssistantMessage, ChatCompletionClient, CreateResult, ModelInfo,
+                                 RequestUsage, SystemMessage)
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.metrics import SELECTOR_ROLE
+from components.structured_output import (ChapterDraft, ChapterPatch, CharacterProfile, CharacterSheet,
+                                          ClimaxEdits, StoryDraft)
+from utils.helpers import estimate_tokens
+from config import STORY_CONFIG
+
+_VOCABULARY = (
+    "the little fox found a shining key under the old oak tree and smiled at her friends "
+    "who laughed together while the river sang softly past the meadow full of bright flowers "
+    "brave curious kind gentle clever dragon owl garden castle star lantern bridge secret"
+).split()
+
+
+class ScriptedRateLimitError(Exception):
+    """Shaped like the OpenAI SDK's RateLimitError: a 429 status and a Retry-After header"""
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached, retry after {retry_after:g}s")
+        self.response = httpx.Response(429, headers={"retry-after": f"{retry_after:g}"})
+
+
+def _message_text(message) -> str:
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+class ScriptedChatCompletionClient(ChatCompletionClient):
+    """Deterministic, offline stand-in for the OpenAI client.
+
+    Works out which role is calling from the system message (or the selector
+    prompt) and answers with scripted replies, or with generated text of the
+    configured size. When a call asks for ``json_output`` with one of the
+    structured-output schemas, the generated reply is that object as JSON. ``latency`` is the time to first token and
+    ``tokens_per_second`` the simulated generation speed (None means
+    instant). The time spent simulating the model is kept in
+    ``simulated_seconds`` so callers can separate it from orchestration cost.
+    With ``max_concurrent_calls`` set, calls beyond that many in flight are
+    rejected with a 429 and a ``retry_after`` hint, like a rate-limited API.
+    ``short_draft_rate`` is the share of whole-story Story_Writer drafts that
+    come out at half length, drawn from a seeded sequence so runs repeat.
+    """
+
+    def __init__(self, replies: Optional[Dict[str, List[str]]] = None, latency: float = 0.0,
+                 tokens_per_second: Optional[float] = None, chunk_tokens: int = 8,
+                 character_words: int = 200, chapter_words: Optional[int] = None,
+                 climax_words: int = 150, complete_after: int = 1,
+                 max_concurrent_calls: Optional[int] = None, retry_after: float = 0.1,
+                 short_draft_rate: float = 0.0):
+        self.replies = replies or {}
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.character_words = character_words
+        self.chapter_words = chapter_words or STORY_CONFIG["words_per_page"] * 2
+        self.climax_words = climax_words
+        self.complete_after = complete_after
+        self.max_concurrent_calls = max_concurrent_calls
+        self.retry_after = retry_after
+        self.short_draft_rate = short_draft_rate
+        self._draft_lengths = random.Random(0)
+        self.calls = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self.simulated_seconds = 0.0
+        self._usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._system_roles = {
+            CharacterAgent.SYSTEM_MESSAGE: CharacterAgent.NAME,
+            WriterAgent.SYSTEM_MESSAGE: WriterAgent.NAME,
+            ClimaxAgent.SYSTEM_MESSAGE: ClimaxAgent.NAME,
+            CharacterAgent.STRUCTURED_SYSTEM_MESSAGE: CharacterAgent.NAME,
+            WriterAgent.STRUCTURED_SYSTEM_MESSAGE: WriterAgent.NAME,
+            ClimaxAgent.STRUCTURED_SYSTEM_MESSAGE: ClimaxAgent.NAME,
+        }
+
+    def _role_of(self, messages: Sequence) -> str:
+        for message in messages:
+            if isinstance(message, SystemMessage) and message.content in self._system_roles:
+                return self._system_roles[message.content]
+        return SELECTOR_ROLE
+
+    def _next_speaker(self, prompt: str) -> str:
+        # History lines look like "<source>: <content>"; the task comes first
+        start = max(prompt.find("\nuser:"), 0)
+        last_speaker, last_position = None, -1
+        for name in (CharacterAgent.NAME, WriterAgent.NAME, ClimaxAgent.NAME):
+            position = prompt.rfind(f"\n{name}:", start)
+            if position > last_position:
+                last_speaker, last_position = name, position
+        if last_speaker is None:
+            return CharacterAgent.NAME
+        if last_speaker == WriterAgent.NAME:
+            return ClimaxAgent.NAME
+        return WriterAgent.NAME
+
+    def _words(self, seed: str, count: int) -> str:
+        rng = random.Random(seed)
+        sentences = []
+        while count > 0:
+            length = min(count, rng.randint(6, 12))
+            words = [rng.choice(_VOCABULARY) for _ in range(length)]
+            sentences.append(" ".join(words).capitalize() + ".")
+            count -= length
+        return " ".join(sentences)
+
+    def _generate(self, role: str, turn: int, prompt: str = "") -> str:
+        # Fan-out mode and story edits ask for an outline, a single chapter or chapter bridges
+        chapters = STORY_CONFIG["chapters"]
+        single = re.search(r"Write ONLY Chapter (\d+)", prompt)
+        if role in (WriterAgent.NAME, ClimaxAgent.NAME) and single:
+            chapter = int(single.group(1))
+            return f"Chapter {chapter}: Part {chapter}\n\n" + self._words(f"{role}:{turn}:{chapter}", self.chapter_words)
+        if role == WriterAgent.NAME and "chapter-by-chapter outline" in prompt:
+            return "\n".join(f"Chapter {chapter}: Part {chapter} - " + self._words(f"outline:{chapter}", 20)
+                             for chapter in range(1, chapters + 1))
+        if role == ClimaxAgent.NAME and "BRIDGE N" in prompt:
+            return "\n".join(f"BRIDGE {chapter}: " + self._words(f"bridge:{chapter}", 16)
+                             for chapter in range(2, chapters + 1))
+        if role == CharacterAgent.NAME:
+            return "CHARACTER PROFILES\n\n" + self._words(f"{role}:{turn}", self.character_words)
+        if role == WriterAgent.NAME:
+            words = self.chapter_words
+            if self.short_draft_rate and self._draft_lengths.random() < self.short_draft_rate:
+                words //= 2
+            return "\n\n".join(
+                f"Chapter {chapter}\n\n" + self._words(f"{role}:{turn}:{chapter}", words)
+                for chapter in range(1, chapters + 1)
+            )
+        if role == ClimaxAgent.NAME:
+            text = "CLIMAX ENHANCEMENTS\n\n" + self._words(f"{role}:{turn}", self.climax_words)
+            return text + "\n\nSTORY_COMPLETE" if turn >= self.complete_after else text
+        return self._words(f"{role}:{turn}", 20)
+
+    def _generate_structured(self, role: str, turn: int, output_type) -> str:
+        chapters = STORY_CONFIG["chapters"]
+        complete = "STORY_COMPLETE" if turn >= self.complete_after else ""
+        if output_type is CharacterSheet:
+            words = max(5, self.character_words // 12)
+            reply = CharacterSheet(characters=[
+                CharacterProfile(name=name, age=str(6 + number), personality=self._words(f"{role}:{turn}:{name}", words),
+                                 goal=self._words(f"goal:{name}", words), growth_arc=self._words(f"arc:{name}", words),
+                                 relationships=self._words(f"friends:{name}", words))
+                for number, name in enumerate(("Pip", "Luna", "Bramble"))
+            ], notes=self._words(f"{role}:{turn}:notes", words))
+        elif output_type is StoryDraft:
+            # The first draft has every chapter, later turns rewrite one chapter each
+            numbers = range(1, chapters + 1) if turn == 1 else [(turn - 2) % chapters + 1]
+            reply = StoryDraft(chapters=[
+                ChapterDraft(number=chapter, title=f"Part {chapter}",
+                             text=self._words(f"{role}:{turn}:{chapter}", self.chapter_words))
+                for chapter in numbers
+            ], status="")
+        elif output_type is ClimaxEdits:
+            reply = ClimaxEdits(patches=[
+                ChapterPatch(chapter=min(4, chapters), find="", replace=self._words(f"{role}:{turn}", self.climax_words))
+            ], status=complete)
+        else:
+            raise ValueError(f"Unsupported json_output type {output_type}")
+        return reply.model_dump_json()
+
+    def _reply(self, messages: Sequence, output_type=None) -> str:
+        role = self._role_of(messages)
+        if role == SELECTOR_ROLE:
+            return self._next_speaker("\n".join(_message_text(message) for message in messages))
+        # An agent sees its own earlier turns as assistant messages
+        turn = 1 + sum(1 for message in messages if isinstance(message, AssistantMessage))
+        scripted = self.replies.get(role)
+        if scripted:
+            return scripted[(turn - 1) % len(scripted)]
+        if isinstance(output_type, type):
+            return self._generate_structured(role, turn, output_type)
+        prompt = _message_text(messages[-1]) if messages else ""
+        return self._generate(role, turn, prompt)
+
+    def _result(self, messages: Sequence, text: str) -> CreateResult:
+        usage = RequestUsage(
+            prompt_tokens=sum(estimate_tokens(_message_text(message)) for message in messages),
+            completion_tokens=estimate_tokens(text)
+        )
+        self.calls += 1
+        self._usage = RequestUsage(
+            prompt_tokens=self._usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._usage.completion_tokens + usage.completion_tokens
+        )
+        return CreateResult(finish_reason="stop", content=text, usage=usage, cached=False)
+
+    async def _sleep(self, seconds: float):
+        if seconds > 0:
+            self.simulated_seconds += seconds
+            await asyncio.sleep(seconds)
+
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _admit(self):
+        if self.max_concurrent_calls is not None and self._in_flight >= self.max_concurrent_calls:
+            self.throttled += 1
+            raise ScriptedRateLimitError(self.retry_after)
+        self._in_flight += 1
+
+    async def create(self, messages, **kwargs) -> CreateResult:
+        self._admit()
+        try:
+            text = self._reply(messages, kwargs.get("json_output"))
+            await self._sleep(self.latency + self._generation_time(estimate_tokens(text)))
+            return self._result(messages, text)
+        finally:
+            self._in_flight -= 1
+
+    async def create_stream(self, messages, **kwargs):
+        self._admit()
+        try:
+            text = self._reply(messages, kwargs.get("json_output"))
+            await self._sleep(self.latency)
+            words = text.split(" ")
+            for start in range(0, len(words), self.chunk_tokens):
+                chunk = " ".join(words[start:start + self.chunk_tokens])
+                if start + self.chunk_tokens < len(words):
+                    chunk += " "
+                await self._sleep(self._generation_time(estimate_tokens(chunk)))
+                yield chunk
+            yield self._result(messages, text)
+        finally:
+            self._in_flight -= 1
+
+    async def close(self):
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._usage
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        return sum(estimate_tokens(_message_text(message)) for message in messages)
+
+    def remaining_tokens(self, messages, **kwargs) -> int:
+        return max(0, 128000 - self.count_tokens(messages))
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ModelInfo(vision=False, function_calling=False, json_output=True,
+                         family="unknown", structured_output=True)
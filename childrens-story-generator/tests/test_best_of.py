@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+
+import config
+from components.best_of import BestOfDrafts
+from components.model_clients import DelegatingChatCompletionClient
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from components.template_drafts import template_draft
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+class ContentFilterError(Exception):
+    """Shaped like the OpenAI SDK's BadRequestError for a refused prompt"""
+    status_code = 400
+
+
+class DraftsByTemperature(DelegatingChatCompletionClient):
+    """Writes a short draft at every temperature but ``best``, and fails at those in ``failing``"""
+
+    def __init__(self, best: float, failing=None):
+        super().__init__(ScriptedChatCompletionClient())
+        self.best = best
+        self.failing = failing or {}
+
+    async def create(self, messages, **kwargs):
+        temperature = kwargs.get("extra_create_args", {}).get("temperature")
+        if temperature in self.failing:
+            raise self.failing[temperature]
+        result = await self.inner.create(messages, **kwargs)
+        if temperature is not None:
+            draft = template_draft("The Lost Star", "Fantasy", seed=int(temperature * 10))
+            result.content = draft if temperature == self.best else draft[:len(draft) // 3]
+        return result
+
+
+def _best_of(client) -> BestOfDrafts:
+    return BestOfDrafts(lambda role: client, drafts=3, temperatures=[0.6, 0.8, 1.0])
+
+
+def test_the_highest_scoring_draft_is_kept():
+    best_of = _best_of(DraftsByTemperature(best=0.8))
+    story = asyncio.run(best_of.run("The Lost Star", "Fantasy"))
+    assert best_of.winner == 1
+    assert story == best_of.draft_texts[1]
+    assert max(best_of.scores.values()) == best_of.scores[1]
+    assert best_of.calls == 4
+
+
+def test_a_draft_refused_by_the_api_is_left_out():
+    best_of = _best_of(DraftsByTemperature(best=0.8, failing={0.8: ContentFilterError("content_filter"),
+                                                              1.0: httpx.ConnectError("reset")}))
+    asyncio.run(best_of.run("The Lost Star", "Fantasy"))
+    assert best_of.winner == 0
+    assert best_of.scores[1] is None and best_of.scores[2] is None
+    assert best_of.draft_errors == {1: "content_filter", 2: "reset"}
+
+
+def test_the_round_fails_when_every_draft_fails():
+    error = ContentFilterError("content_filter")
+    best_of = _best_of(DraftsByTemperature(best=0.8, failing={0.6: error, 0.8: error, 1.0: error}))
+    with pytest.raises(ContentFilterError):
+        asyncio.run(best_of.run("The Lost Star", "Fantasy"))
+    assert best_of.story == ""
+
+
+def test_a_bug_in_a_draft_is_not_swallowed():
+    best_of = _best_of(DraftsByTemperature(best=0.8, failing={1.0: KeyError("chapters")}))
+    with pytest.raises(KeyError):
+        asyncio.run(best_of.run("The Lost Star", "Fantasy"))
+
+
+def test_best_of_settings_are_part_of_the_cache_key(monkeypatch):
+    best_of = StoryGenerator(model_client=ScriptedChatCompletionClient(), mode="best_of",
+                             rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    pipeline = StoryGenerator(model_client=ScriptedChatCompletionClient(), mode="pipeline",
+                              rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    keys = best_of.cache_key("The Lost Star", "Fantasy"), pipeline.cache_key("The Lost Star", "Fantasy")
+
+    drafts = config.STORY_CONFIG["best_of_drafts"]
+    monkeypatch.setitem(config.STORY_CONFIG, "best_of_drafts", drafts + 2)
+    assert best_of.cache_key("The Lost Star", "Fantasy") != keys[0]
+    monkeypatch.setitem(config.STORY_CONFIG, "best_of_drafts", drafts)
+    monkeypatch.setitem(config.STORY_CONFIG, "best_of_temperatures", [0.7])
+    assert best_of.cache_key("The Lost Star", "Fantasy") != keys[0]
+    # Other modes do not depend on them
+    assert pipeline.cache_key("The Lost Star", "Fantasy") == keys[1]
@@ -0,0 +1,104 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from autogen_core.models import CreateResult, UserMessage
+
+from components import cassettes
+from components.cassettes import (Cassette, CassetteMiss, RecordingChatCompletionClient,
+                                  ReplayingChatCompletionClient)
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+def _messages(index: int):
+    return [UserMessage(content=f"Tell me story number {index}", source="user")]
+
+
+def _lines(path) -> int:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _members(path) -> int:
+    data, members = path.read_bytes(), 0
+    while data:
+        decompressor = zlib.decompressobj(wbits=31)
+        decompressor.decompress(data)
+        data, members = decompressor.unused_data, members + 1
+    return members
+
+
+def test_recorded_calls_and_streams_replay_without_the_model(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    recording = RecordingChatCompletionClient(ScriptedChatCompletionClient(tokens_per_second=10000),
+                                              Cassette(path))
+
+    async def record():
+        created = await recording.create(_messages(1))
+        streamed = [chunk async for chunk in recording.create_stream(_messages(2))]
+        return created, streamed
+
+    created, streamed = asyncio.run(record())
+    recording.cassette.flush()
+
+    replaying = ReplayingChatCompletionClient(Cassette.load(path))
+
+    async def replay():
+        return await replaying.create(_messages(1)), [chunk async for chunk in replaying.create_stream(_messages(2))]
+
+    replayed, replayed_stream = asyncio.run(replay())
+    assert replayed.content == created.content
+    assert replayed.usage == created.usage
+    assert replayed_stream[:-1] == streamed[:-1]
+    assert isinstance(replayed_stream[-1], CreateResult)
+    assert replayed_stream[-1].content == streamed[-1].content
+    assert replaying.calls == 2
+    assert replaying.model_info["family"] == recording.model_info["family"]
+
+    with pytest.raises(CassetteMiss):
+        asyncio.run(replaying.create(_messages(3)))
+
+
+def test_a_recorded_story_replays_to_the_same_story(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+
+    def generator(client):
+        return StoryGenerator(model_client=client, mode="pipeline", rounds=1,
+                              rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+
+    recording = RecordingChatCompletionClient(ScriptedChatCompletionClient(), Cassette(path))
+    recorded = asyncio.run(generator(recording).run_story("The Lost Star", "Fantasy"))
+    recording.cassette.flush()
+
+    replaying = ReplayingChatCompletionClient(Cassette.load(path))
+    replayed = asyncio.run(generator(replaying).run_story("The Lost Star", "Fantasy"))
+    assert replayed.story == recorded.story
+    assert replaying.calls == len(recording.cassette) == 3
+
+
+def test_recordings_are_written_in_batches_and_on_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(cassettes, "_FLUSH_EVERY", 4)
+    path = tmp_path / "cassette.jsonl.gz"
+    cassette = Cassette(str(path))
+    recording = RecordingChatCompletionClient(ScriptedChatCompletionClient(), cassette)
+
+    async def record(count: int):
+        for index in range(count):
+            await recording.create(_messages(index))
+
+    asyncio.run(record(3))
+    assert not path.exists()
+    asyncio.run(record(3))
+    # One full batch is on disk, two interactions are still buffered
+    assert _lines(path) == 4
+    cassette.flush()
+    assert _lines(path) == 6
+    cassette.flush()
+    assert _lines(path) == 6
+
+    # Each batch is its own gzip member, and the file reads back as one cassette
+    assert _members(path) == 2
+    assert len(Cassette.load(str(path))) == 6
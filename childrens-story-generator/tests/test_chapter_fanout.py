@@ -0,0 +1,95 @@
+import asyncio
+import re
+
+import pytest
+
+import config
+from components.chapter_fanout import ChapterFanout
+from components.model_clients import DelegatingChatCompletionClient
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+class RefusedChapterError(Exception):
+    status_code = 400
+
+
+class RefusingChapters(DelegatingChatCompletionClient):
+    """Fails the requests for the chapter numbers in ``refused`` with ``error``"""
+
+    def __init__(self, refused, error=None):
+        super().__init__(ScriptedChatCompletionClient())
+        self.refused = refused
+        self.error = error or RefusedChapterError("content_filter")
+
+    async def create(self, messages, **kwargs):
+        single = re.search(r"Write ONLY Chapter (\d+)", messages[-1].content)
+        if single and int(single.group(1)) in self.refused:
+            raise self.error
+        return await self.inner.create(messages, **kwargs)
+
+
+def _fanout(client=None, continuity_pass=True) -> ChapterFanout:
+    client = client or ScriptedChatCompletionClient()
+    return ChapterFanout(lambda role: client, chapters=3, continuity_pass=continuity_pass)
+
+
+def test_parse_bridges_keeps_chapters_two_to_the_last():
+    bridges = _fanout().parse_bridges("Here you go:\nBRIDGE 1: Too early.\nbridge 2:  Pip ran on. \n"
+                                      "BRIDGE 3: Then night fell.\nBRIDGE 4: Too late.\nBRIDGE x: nonsense")
+    assert bridges == {2: "Pip ran on.", 3: "Then night fell."}
+
+
+def test_stitch_opens_each_chapter_with_its_bridge_as_a_paragraph():
+    fanout = _fanout()
+    fanout.chapter_texts = ["Chapter 1: Home\n\nPip woke up.", "Chapter 2: Away\nPip left home.",
+                            "Pip came back."]
+    fanout.bridges = {2: "The road was long.", 3: "At last the lights of home appeared."}
+    assert fanout.stitch() == ("Chapter 1: Home\n\nPip woke up.\n\n"
+                               "Chapter 2: Away\n\nThe road was long.\n\nPip left home.\n\n"
+                               "At last the lights of home appeared.\n\nPip came back.")
+
+
+def test_stitch_skips_chapters_that_were_not_written():
+    fanout = _fanout()
+    fanout.chapter_texts = ["Chapter 1: Home\n\nPip woke up.", "", "Chapter 3: Back\n\nPip came back."]
+    assert fanout.stitch() == "Chapter 1: Home\n\nPip woke up.\n\nChapter 3: Back\n\nPip came back."
+
+
+def test_chapters_are_written_and_bridged():
+    fanout = _fanout()
+    story = asyncio.run(fanout.run("The Lost Star", "Fantasy"))
+    assert [text.split(":")[0] for text in fanout.chapter_texts] == ["Chapter 1", "Chapter 2", "Chapter 3"]
+    assert set(fanout.bridges) == {2, 3}
+    assert f"\n\n{fanout.bridges[2]}\n\n" in story
+    # Characters, outline, three chapters and the continuity pass
+    assert fanout.calls == 6
+
+
+def test_a_refused_chapter_is_left_out_and_not_bridged():
+    fanout = _fanout(RefusingChapters({2}))
+    story = asyncio.run(fanout.run("The Lost Star", "Fantasy"))
+    assert fanout.chapter_errors == {2: "content_filter"}
+    assert fanout.chapter_texts[1] == ""
+    assert "Chapter 1" in story and "Chapter 3" in story and "Chapter 2" not in story
+    assert fanout.bridges == {}
+
+
+def test_the_fanout_fails_when_no_chapter_is_written():
+    with pytest.raises(RefusedChapterError):
+        asyncio.run(_fanout(RefusingChapters({1, 2, 3})).run("The Lost Star", "Fantasy"))
+
+
+def test_a_bug_in_a_chapter_is_not_swallowed():
+    with pytest.raises(KeyError):
+        asyncio.run(_fanout(RefusingChapters({2}, KeyError("outline"))).run("The Lost Star", "Fantasy"))
+
+
+def test_the_continuity_pass_setting_is_part_of_the_fanout_cache_key(monkeypatch):
+    generator = StoryGenerator(model_client=ScriptedChatCompletionClient(), mode="fanout",
+                               rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    key = generator.cache_key("The Lost Star", "Fantasy")
+    monkeypatch.setitem(config.STORY_CONFIG, "fanout_continuity_pass",
+                        not config.STORY_CONFIG["fanout_continuity_pass"])
+    assert generator.cache_key("The Lost Star", "Fantasy") != key
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from agents.climax_agent import ClimaxAgent
+from components.checkpoints import CheckpointStore
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+class DroppedConnectionClient(ScriptedChatCompletionClient):
+    """Fails the Climax_Creator's first call, as if the connection dropped mid-run"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.dropped = False
+
+    async def create(self, messages, **kwargs):
+        if not self.dropped and self._role_of(messages) == ClimaxAgent.NAME:
+            self.dropped = True
+            raise RuntimeError("Connection dropped")
+        return await super().create(messages, **kwargs)
+
+
+def _generator(client, checkpoints, output_format="text") -> StoryGenerator:
+    return StoryGenerator(model_client=client, mode="pipeline", rounds=1, output_format=output_format,
+                          checkpoints=checkpoints,
+                          rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+
+
+@pytest.mark.parametrize("output_format", ["text", "json"])
+def test_a_failed_run_resumes_from_its_checkpoint(tmp_path, output_format):
+    checkpoints = CheckpointStore(str(tmp_path))
+    client = DroppedConnectionClient()
+    generator = _generator(client, checkpoints, output_format)
+
+    failed = asyncio.run(generator.run_story("The Lost Star", "Fantasy"))
+    assert "Connection dropped" in failed.error
+    assert generator.can_resume(failed.run_id)
+    checkpoint = checkpoints.load(failed.run_id)
+    assert (checkpoint["title"], checkpoint["mode"], checkpoint["agent_turns"]) == ("The Lost Star", "pipeline", 2)
+    assert [message["source"] for message in checkpoint["messages"]] == ["user", "Character_Developer",
+                                                                          "Story_Writer"]
+
+    calls = client.calls
+    resumed = asyncio.run(_generator(client, checkpoints, output_format).resume_story(failed.run_id))
+    assert resumed.ok, resumed.error
+    # Only the unfinished Climax_Creator turn is paid for again
+    assert client.calls == calls + 1
+    assert resumed.stats["agent_turns"] == 3
+    assert len(resumed.structured.chapters) == 5
+    assert failed.run_id not in checkpoints
+
+
+def test_state_that_is_not_json_is_refused_and_the_last_checkpoint_kept(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path))
+    checkpoints.save("run1", {"title": "The Lost Star", "agent_turns": 1})
+    with pytest.raises(TypeError):
+        checkpoints.save("run1", {"title": "The Lost Star", "agent_turns": 2, "state": object()})
+    assert checkpoints.load("run1")["agent_turns"] == 1
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+from autogen_core.models import SystemMessage, UserMessage
+
+from agents.climax_agent import ClimaxAgent
+from components.checkpoints import CheckpointStore
+from components.deadlines import CancellableChatCompletionClient, RunDeadline
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+class StuckClimaxClient(ScriptedChatCompletionClient):
+    """Never answers the Climax_Creator, like a request that hangs"""
+
+    async def create(self, messages, **kwargs):
+        if self._role_of(messages) == ClimaxAgent.NAME:
+            await asyncio.Event().wait()
+        return await super().create(messages, **kwargs)
+
+
+def _generator(client, **kwargs) -> StoryGenerator:
+    return StoryGenerator(model_client=client, mode="pipeline", rounds=1,
+                          rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0), **kwargs)
+
+
+def test_turns_that_keep_finishing_do_not_hit_the_turn_deadline():
+    async def scenario():
+        async with RunDeadline(timeout=5, turn_timeout=0.2) as deadline:
+            for _ in range(4):
+                await asyncio.sleep(0.1)
+                deadline.next_turn()
+            assert not deadline.expired
+            await asyncio.sleep(0.3)
+            return deadline
+
+    deadline = asyncio.run(scenario())
+    assert deadline.reason == "turn deadline of 0.2s reached"
+    assert deadline.token.is_cancelled()
+
+
+def test_an_expired_deadline_cancels_the_call_in_flight():
+    async def scenario():
+        async with RunDeadline(timeout=0.2, turn_timeout=5) as deadline:
+            client = CancellableChatCompletionClient(StuckClimaxClient(), deadline.token)
+            with pytest.raises(asyncio.CancelledError):
+                await client.create([SystemMessage(content=ClimaxAgent.SYSTEM_MESSAGE), UserMessage(content="Go", source="user")])
+            return deadline
+
+    started = time.monotonic()
+    deadline = asyncio.run(scenario())
+    assert deadline.reason == "run deadline of 0.2s reached"
+    assert time.monotonic() - started < 1
+
+
+def test_a_stuck_turn_returns_the_story_so_far_and_can_be_resumed(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path))
+    started = time.monotonic()
+    result = asyncio.run(_generator(StuckClimaxClient(), turn_timeout=0.3, timeout=30,
+                                    checkpoints=checkpoints).run_story("The Lost Star", "Fantasy"))
+    assert time.monotonic() - started < 5
+    assert result.ok and result.partial
+    assert result.stats["partial"] and result.stats["resumable"]
+    assert result.stats["stop_reason"] == "turn deadline of 0.3s reached"
+    # The Story_Writer's draft is kept, with a note that the story was cut short
+    assert len(result.structured.chapters) == 5
+    assert result.story.endswith("(turn deadline of 0.3s reached), so this story is incomplete.]")
+    assert checkpoints.load(result.run_id)["agent_turns"] == 2
+
+
+def test_the_run_deadline_stops_a_slow_run_between_turns():
+    result = asyncio.run(_generator(ScriptedChatCompletionClient(latency=0.2), turn_timeout=30,
+                                    timeout=0.5).run_story("The Lost Star", "Fantasy"))
+    assert result.partial
+    assert result.stats["stop_reason"] == "run deadline of 0.5s reached"
+    assert result.stats["agent_turns"] < 3
+    assert result.elapsed < 2
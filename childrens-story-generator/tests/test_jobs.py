@@ -0,0 +1,152 @@
+import copy
+import threading
+import time
+
+import pytest
+
+from components.jobs import Job, JobQueue, JobStore, QueueFullError
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+def _queue(tmp_path, latency: float, store: JobStore = None, **kwargs) -> JobQueue:
+    def generator():
+        return StoryGenerator(model_client=ScriptedChatCompletionClient(latency=latency), mode="pipeline",
+                              rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    store = store if store is not None else JobStore(str(tmp_path / "jobs.sqlite3"))
+    return JobQueue(workers=1, store=store, generator_factory=generator, **kwargs)
+
+
+def _wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_cancel_a_queued_and_a_running_job(tmp_path):
+    queue = _queue(tmp_path, latency=0.5)
+    running = queue.submit("The Lost Star", "Fantasy")
+    queued = queue.submit("The Brave Owl", "Adventure")
+    _wait_for(lambda: queue.get(running).status == "running")
+    assert queue.position(queued) == 1
+
+    assert queue.cancel(queued)
+    assert queue.get(queued).status == "cancelled"
+    assert queue.store.load(queued).error == "Cancelled before it started"
+    assert not queue.cancel(queued)
+
+    assert queue.cancel(running)
+    _wait_for(lambda: not queue.get(running).active)
+    assert queue.get(running).status == "cancelled"
+    _wait_for(lambda: queue.store.load(running).status == "cancelled")
+    assert queue.store.load(running).error == "Cancelled while generating"
+    assert queue.stats()["running"] == 0 and queue.stats()["queued"] == 0
+    queue.shutdown()
+
+
+def test_the_next_job_runs_after_a_cancel(tmp_path):
+    queue = _queue(tmp_path, latency=0.0)
+    cancelled = queue.submit("The Lost Star", "Fantasy")
+    queue.cancel(cancelled)
+    finished = queue.submit("The Brave Owl", "Adventure")
+    _wait_for(lambda: not queue.get(finished).active)
+    assert queue.get(finished).status == "done"
+    assert queue.get(finished).story
+    _wait_for(lambda: queue.store.load(finished).status == "done")
+    queue.shutdown()
+
+
+def test_shutdown_cancels_and_records_every_unfinished_job(tmp_path):
+    queue = _queue(tmp_path, latency=0.5)
+    running = queue.submit("The Lost Star", "Fantasy")
+    queued = queue.submit("The Brave Owl", "Adventure")
+    _wait_for(lambda: queue.get(running).status == "running")
+
+    started = time.monotonic()
+    queue.shutdown(timeout=5)
+    assert time.monotonic() - started < 5
+    for job_id in (running, queued):
+        assert queue.get(job_id).status == "cancelled"
+        # The worker's own late save of the cancelled run must not overwrite this
+        assert queue.store.load(job_id).status == "cancelled"
+    time.sleep(0.2)
+    assert queue.store.load(running).error == "The server stopped before the story was finished"
+
+
+def test_a_late_save_never_overwrites_a_finished_job(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = Job(job_id="job1", title="The Lost Star", genre="Fantasy")
+    store.save(job)
+    running = copy.copy(job)
+    running.status, running.started_at = "running", time.time()
+    job.status, job.story, job.finished_at = "done", "Once upon a time", time.time()
+    store.save(job)
+    # The worker's save of the running snapshot arrives after the outcome
+    store.save(running)
+    assert store.load("job1").status == "done"
+    assert store.load("job1").story == "Once upon a time"
+
+
+def test_jobs_left_unfinished_by_a_restart_are_marked_failed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    JobStore(path).save(Job(job_id="job1", title="The Lost Star", genre="Fantasy", status="running"))
+    job = JobStore(path).load("job1")
+    assert (job.status, job.error) == ("failed", "Interrupted by a server restart")
+
+
+def test_a_full_queue_refuses_new_jobs(tmp_path):
+    queue = _queue(tmp_path, latency=0.5, max_queued=1)
+    running = queue.submit("The Lost Star", "Fantasy")
+    _wait_for(lambda: queue.get(running).status == "running")
+    queue.submit("The Brave Owl", "Adventure")
+    with pytest.raises(QueueFullError):
+        queue.submit("The Kind Dragon", "Fantasy")
+    assert queue.stats()["queued"] == 1
+    queue.shutdown()
+
+
+class BlockingStore(JobStore):
+    """Holds every save until ``release`` is set"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.saving = threading.Event()
+        self.release = threading.Event()
+
+    def save(self, job: Job):
+        self.saving.set()
+        assert self.release.wait(10), "save was never released"
+        super().save(job)
+
+
+def test_a_slow_store_does_not_hold_the_queue_lock(tmp_path):
+    store = BlockingStore(str(tmp_path / "jobs.sqlite3"))
+    queue = _queue(tmp_path, latency=0.0, store=store)
+    submitted = []
+    submitter = threading.Thread(target=lambda: submitted.append(queue.submit("The Lost Star", "Fantasy")))
+    submitter.start()
+    assert store.saving.wait(5)
+
+    # The submit is stuck writing its row; the queue still answers
+    answered = []
+    reader = threading.Thread(target=lambda: answered.append(queue.stats()))
+    reader.start()
+    reader.join(2)
+    assert answered and answered[0]["queued"] == 1
+
+    store.release.set()
+    submitter.join(5)
+    _wait_for(lambda: not queue.get(submitted[0]).active)
+    assert queue.get(submitted[0]).status == "done"
+    queue.shutdown()
+
+
+def test_expired_jobs_are_pruned_from_memory_and_the_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), retention_seconds=0.2)
+    queue = _queue(tmp_path, latency=0.0, store=store, prune_interval=0.1)
+    finished = queue.submit("The Lost Star", "Fantasy")
+    _wait_for(lambda: store.load(finished) is not None and store.load(finished).status == "done")
+    _wait_for(lambda: queue.get(finished) is None)
+    queue.shutdown()
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from autogen_core.models import AssistantMessage, UserMessage
+
+import config
+from components.metrics import RunReport
+from components.model_contexts import (LatestDraftContext, RollingSummaryContext, TokenLimitedContext,
+                                       build_model_context)
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from components.structured_output import ChapterDraft, ChapterPatch, ClimaxEdits, StoryDraft
+from tests.scripted_client import ScriptedChatCompletionClient
+
+_TASK = UserMessage(content="Write a story about a lost star", source="user")
+
+
+def _message(source: str, content: str):
+    return UserMessage(content=content, source=source)
+
+
+def _draft(*chapters, status: str = "") -> str:
+    return StoryDraft(chapters=[ChapterDraft(number=number, title=f"Part {number}", text=text)
+                                for number, text in chapters], status=status).model_dump_json()
+
+
+def _view(context, messages):
+    async def scenario():
+        for message in messages:
+            await context.add_message(message)
+        return await context.get_messages()
+
+    return asyncio.run(scenario())
+
+
+def test_the_default_is_autogens_unbounded_context(monkeypatch):
+    assert config.CONTEXT_CONFIG["strategy"] == "unbounded"
+    assert build_model_context("Story_Writer") is None
+    monkeypatch.setitem(config.CONTEXT_CONFIG, "agent_strategies", {"Story_Writer": "draft", "selector": "nope"})
+    assert isinstance(build_model_context("Story_Writer"), LatestDraftContext)
+    with pytest.raises(ValueError):
+        build_model_context("selector")
+
+
+def test_token_limited_keeps_the_task_and_the_newest_turns_that_fit():
+    report = RunReport(run_id="run", title="The Lost Star", genre="Fantasy", mode="pipeline")
+    turns = [_message("Story_Writer", " ".join(["word"] * 300)) for _ in range(4)]
+    view = _view(TokenLimitedContext(token_limit=1000, report=report), [_TASK] + turns)
+    assert view[0] == _TASK
+    assert 1 < len(view) < 5
+    assert view[1:] == turns[-(len(view) - 1):]
+    assert report.context_tokens_saved > 0
+
+    # The newest turn is sent even when it alone is over the limit
+    assert _view(TokenLimitedContext(token_limit=10), [_TASK] + turns)[1:] == turns[-1:]
+
+
+def test_the_summary_replaces_older_turns_with_excerpts():
+    turns = [_message("Story_Writer", f"turn {index} " + " ".join(["word"] * 50)) for index in range(4)]
+    view = _view(RollingSummaryContext(recent_messages=2, summary_words=3), [_TASK] + turns)
+    assert view[-2:] == turns[-2:]
+    assert view[1].content == "Summary of earlier turns:\n- Story_Writer: turn 0 word ...\n- Story_Writer: turn 1 word ..."
+
+
+def test_the_latest_text_draft_is_sent_as_written():
+    turns = [_message("Character_Developer", "CHARACTER PROFILES"), _message("Story_Writer", "Chapter 1\n\nOld"),
+             _message("Story_Writer", "Chapter 1\n\nNew"), _message("Climax_Creator", "CLIMAX"),
+             _message("Character_Developer", "Notes"), _message("Climax_Creator", "More")]
+    view = _view(LatestDraftContext(recent_messages=2), [_TASK] + turns)
+    assert view == [_TASK, turns[0], turns[2], turns[4], turns[5]]
+
+
+def test_a_json_draft_is_sent_with_every_chapter_merged():
+    turns = [
+        _message("Story_Writer", _draft((1, "One"), (2, "Two"), (3, "Three"))),
+        _message("Climax_Creator", ClimaxEdits(patches=[ChapterPatch(chapter=2, find="Two", replace="Two!"),
+                                                        ChapterPatch(chapter=3, find="", replace="Then")],
+                                               status="").model_dump_json()),
+        _message("Story_Writer", _draft((1, "One again"), status="revised")),
+        _message("Character_Developer", "Notes"),
+        _message("Climax_Creator", "More"),
+    ]
+    view = _view(LatestDraftContext(recent_messages=2), [_TASK] + turns)
+    assert [message.source for message in view] == ["user", "Story_Writer", "Character_Developer", "Climax_Creator"]
+    merged = StoryDraft.model_validate_json(view[1].content)
+    assert [(chapter.number, chapter.text) for chapter in merged.chapters] == [
+        (1, "One again"), (2, "Two!"), (3, "Three\n\nThen")]
+    assert merged.status == "revised"
+    assert isinstance(view[1], UserMessage)
+
+    # The writer's own turns are assistant messages and keep that type
+    own = AssistantMessage(content=_draft((2, "Two again")), source="Story_Writer")
+    view = _view(LatestDraftContext(recent_messages=1), [_TASK, turns[0], own, turns[3]])
+    assert isinstance(view[1], AssistantMessage)
+    assert [chapter.text for chapter in StoryDraft.model_validate_json(view[1].content).chapters] == [
+        "One", "Two again", "Three"]
+
+
+def test_a_json_run_with_the_draft_context_shows_the_whole_story(monkeypatch):
+    monkeypatch.setitem(config.CONTEXT_CONFIG, "strategy", "draft")
+    monkeypatch.setitem(config.CONTEXT_CONFIG, "recent_messages", 1)
+    seen = []
+
+    class Recording(ScriptedChatCompletionClient):
+        async def create(self, messages, **kwargs):
+            seen.append(messages)
+            return await super().create(messages, **kwargs)
+
+    generator = StoryGenerator(model_client=Recording(complete_after=2), mode="pipeline", rounds=2,
+                               output_format="json",
+                               rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    asyncio.run(generator.run_story("The Lost Star", "Fantasy"))
+    # The last Climax_Creator turn follows a writer turn that rewrote a single chapter
+    drafts = [StoryDraft.model_validate_json(message.content) for message in seen[-1]
+              if getattr(message, "source", None) == "Story_Writer"]
+    assert len(drafts) == 1
+    assert [chapter.number for chapter in drafts[0].chapters] == list(range(1, config.STORY_CONFIG["chapters"] + 1))
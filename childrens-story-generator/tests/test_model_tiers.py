@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from components.metrics import SELECTOR_ROLE
+from components.model_tiers import ModelTiers
+from config import LLM_CONFIG, MODEL_TIER_CONFIG
+
+_TIERS = {"fast": {"model": "gpt-4o-mini", "temperature": 0.2, "max_tokens": 500}, "large": {"temperature": 0.9}}
+_PRICES = {"gpt-4o-mini": {"prompt": 0.15, "completion": 0.6}}
+
+
+def test_roles_get_their_tier_with_their_own_overrides():
+    tiers = ModelTiers(_TIERS, {"Character_Developer": {"tier": "fast"},
+                                SELECTOR_ROLE: {"tier": "fast", "max_tokens": 50},
+                                "Story_Writer": {"tier": "large"}}, _PRICES)
+    character = tiers.for_role("Character_Developer")
+    assert (character.tier, character.model, character.temperature, character.max_tokens) == \
+        ("fast", "gpt-4o-mini", 0.2, 500)
+    assert tiers.for_role(SELECTOR_ROLE).max_tokens == 50
+    # Unset fields fall back to MODEL_NAME and MAX_TOKENS
+    writer = tiers.for_role("Story_Writer")
+    assert (writer.model, writer.temperature, writer.max_tokens) == (LLM_CONFIG["model"], 0.9,
+                                                                     LLM_CONFIG["max_tokens"])
+    default = tiers.for_role("Climax_Creator")
+    assert (default.tier, default.model, default.max_tokens) == ("default", LLM_CONFIG["model"],
+                                                                 LLM_CONFIG["max_tokens"])
+
+
+def test_calls_are_priced_from_the_model_prices():
+    settings = ModelTiers(_TIERS, {"Character_Developer": {"tier": "fast"}}, _PRICES).for_role("Character_Developer")
+    assert settings.cost(1_000_000, 500_000) == pytest.approx(0.45)
+    assert ModelTiers(_TIERS, {"Story_Writer": {"tier": "large", "model": "unpriced"}}).for_role(
+        "Story_Writer").cost(1000, 1000) == 0.0
+
+
+def test_an_unknown_tier_is_refused():
+    with pytest.raises(ValueError, match="unknown model tier 'huge'"):
+        ModelTiers(_TIERS, {"Story_Writer": {"tier": "huge"}})
+
+
+def test_single_tier_moves_every_role():
+    tiers = ModelTiers(_TIERS, {"Character_Developer": {"tier": "fast"}, "Story_Writer": {"tier": "large"}})
+    assert {tiers.single_tier("large").for_role(role).tier for role in ("Character_Developer", "Story_Writer")} \
+        == {"large"}
+
+
+def test_from_file_reads_agents_and_the_selector(tmp_path):
+    path = tmp_path / "autogen_config.json"
+    path.write_text(json.dumps({
+        "model_tiers": _TIERS, "model_prices": _PRICES,
+        "agents": [{"name": "Character_Developer", "llm_config": {"tier": "fast"}},
+                   {"name": "Story_Writer", "llm_config": {"max_tokens": 999}}],
+        "group_chat_config": {"selector_llm_config": {"tier": "fast", "max_tokens": 50}},
+    }))
+    tiers = ModelTiers.from_file(str(path))
+    assert tiers.for_role("Character_Developer").tier == "fast"
+    assert tiers.for_role(SELECTOR_ROLE).max_tokens == 50
+    # An llm_config without a tier is ignored, as before tiers existed
+    assert tiers.for_role("Story_Writer").max_tokens == LLM_CONFIG["max_tokens"]
+    untiered = ModelTiers.from_file(str(path), tiered=False)
+    assert untiered.for_role(SELECTOR_ROLE).tier == "default"
+    assert untiered.for_role(SELECTOR_ROLE).cost(1_000_000, 0) == (0.15 if LLM_CONFIG["model"] == "gpt-4o-mini"
+                                                                   else 0.0)
+
+
+def test_the_shipped_config_leaves_the_writing_roles_uncapped():
+    tiers = ModelTiers.from_file(MODEL_TIER_CONFIG["path"])
+    for role in ("Story_Writer", "Climax_Creator"):
+        assert tiers.for_role(role).tier == "large"
+        assert tiers.for_role(role).max_tokens == LLM_CONFIG["max_tokens"]
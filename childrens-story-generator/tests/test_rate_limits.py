@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from autogen_core.models import UserMessage
+
+from components.metrics import CallRecord
+from components.rate_limits import RateLimitedChatCompletionClient, RateLimitScheduler
+from tests.scripted_client import ScriptedChatCompletionClient, ScriptedRateLimitError
+
+_MESSAGES = [UserMessage(content="Who speaks next?", source="user")]
+
+
+def _scheduler(**kwargs) -> RateLimitScheduler:
+    # No request or token buckets, so only the concurrency limit gates calls
+    return RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0, **kwargs)
+
+
+def test_a_waiter_cancelled_after_the_hand_off_gives_its_slot_back():
+    scheduler = _scheduler(max_concurrency=1)
+
+    async def scenario():
+        await scheduler.acquire()
+        handed = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 1
+        # The slot goes to the waiter, which is cancelled before its loop wakes it
+        scheduler.release()
+        handed.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handed
+        # A leaked slot would leave this waiting forever
+        await asyncio.wait_for(scheduler.acquire(), timeout=2)
+        scheduler.release()
+
+    asyncio.run(scenario())
+    assert scheduler.stats() == {"concurrency_limit": 1, "in_flight": 0, "waiting": 0, "throttled": 0}
+
+
+async def _queue_length(scheduler: RateLimitScheduler, length: int):
+    # Yields to the loop until the waiters started so far have joined the line
+    while scheduler.waiting < length:
+        await asyncio.sleep(0)
+
+
+def test_waiters_on_another_loop_are_served_in_order():
+    scheduler = _scheduler(max_concurrency=1)
+    order = []
+    queued = threading.Event()
+
+    async def waiter(name):
+        await scheduler.acquire()
+        order.append(name)
+        scheduler.release()
+
+    async def other_loop():
+        second = asyncio.ensure_future(waiter("second"))
+        await _queue_length(scheduler, 2)
+        third = asyncio.ensure_future(waiter("third"))
+        await _queue_length(scheduler, 3)
+        queued.set()
+        await asyncio.gather(second, third)
+
+    async def scenario():
+        await scheduler.acquire()
+        first = asyncio.ensure_future(waiter("first"))
+        await _queue_length(scheduler, 1)
+        thread = asyncio.ensure_future(asyncio.to_thread(asyncio.run, other_loop()))
+        assert await asyncio.to_thread(queued.wait, 5)
+        scheduler.release()
+        await asyncio.gather(first, thread)
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+    assert order == ["first", "second", "third"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_a_burst_of_429s_halves_the_limit_once():
+    scheduler = _scheduler(max_concurrency=8)
+    started = time.monotonic()
+    for _ in range(3):
+        # Three calls sent under the same limit, all throttled
+        scheduler.in_flight += 1
+        scheduler.failed(ScriptedRateLimitError(0), started)
+    assert scheduler.stats() == {"concurrency_limit": 4, "in_flight": 0, "waiting": 0, "throttled": 3}
+    scheduler.in_flight += 1
+    scheduler.failed(ScriptedRateLimitError(0), time.monotonic())
+    assert scheduler.stats()["concurrency_limit"] == 2
+
+
+def test_throttled_calls_retry_then_give_up_and_the_limit_grows_back():
+    scheduler = _scheduler(max_concurrency=8, max_retries=2, backoff_base=0.01, backoff_max=0.01)
+    throttling = RateLimitedChatCompletionClient(
+        ScriptedChatCompletionClient(max_concurrent_calls=0, retry_after=0.01), scheduler=scheduler)
+    records = [CallRecord(role="Story_Writer", model="scripted", started_at=time.time()) for _ in range(4)]
+
+    async def burst():
+        return await asyncio.gather(*(throttling.create(_MESSAGES, call_record=record) for record in records),
+                                    return_exceptions=True)
+
+    results = asyncio.run(asyncio.wait_for(burst(), timeout=5))
+    assert all(isinstance(result, ScriptedRateLimitError) for result in results)
+    assert all(record.retries == 2 and record.throttled for record in records)
+    stats = scheduler.stats()
+    assert stats["throttled"] == 12
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert 1 <= stats["concurrency_limit"] < 8
+
+    healthy = RateLimitedChatCompletionClient(ScriptedChatCompletionClient(), scheduler=scheduler)
+
+    async def recover():
+        for _ in range(100):
+            await healthy.create(_MESSAGES)
+
+    asyncio.run(asyncio.wait_for(recover(), timeout=5))
+    assert scheduler.stats()["concurrency_limit"] == 8
+
+
+class FailingClient(ScriptedChatCompletionClient):
+    def __init__(self, error: BaseException):
+        super().__init__()
+        self.error = error
+
+    async def create(self, messages, **kwargs):
+        raise self.error
+
+    async def create_stream(self, messages, **kwargs):
+        raise self.error
+        yield
+
+
+class RefusedError(Exception):
+    status_code = 400
+
+
+def _available_after_failure(error: BaseException, stream: bool = False) -> float:
+    scheduler = RateLimitScheduler(requests_per_minute=0, tokens_per_minute=10000, max_retries=0)
+    client = RateLimitedChatCompletionClient(FailingClient(error), scheduler=scheduler, max_tokens=4000)
+
+    async def call():
+        if stream:
+            return [chunk async for chunk in client.create_stream(_MESSAGES)]
+        return await client.create(_MESSAGES)
+
+    with pytest.raises(type(error)):
+        asyncio.run(call())
+    assert scheduler.stats()["in_flight"] == 0
+    return scheduler.tokens.available
+
+
+def test_failed_calls_give_their_reserved_tokens_back():
+    prompt = RateLimitedChatCompletionClient(ScriptedChatCompletionClient(), scheduler=_scheduler(),
+                                             max_tokens=4000)._reserved_tokens(_MESSAGES) - 4000
+    assert prompt > 0
+    # The API refused the request, so nothing was counted against the limit
+    assert _available_after_failure(RefusedError("Bad request")) == pytest.approx(10000, abs=1)
+    assert _available_after_failure(RefusedError("Bad request"), stream=True) == pytest.approx(10000, abs=1)
+    # A connection that dropped may have sent the prompt, but no completion came back
+    dropped = httpx.ConnectError("Connection dropped")
+    assert _available_after_failure(dropped) == pytest.approx(10000 - prompt, abs=1)
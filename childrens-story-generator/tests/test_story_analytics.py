@@ -0,0 +1,72 @@
+import pytest
+
+import config
+from components.story_analytics import COUNT_COLUMNS, analyze_library, analyze_stories, summarize
+from components.story_extraction import Story
+from components.story_library import StoryLibrary
+from components.template_drafts import template_draft
+
+_DIALOGUE = 'Chapter 1: Start\n\nThe cat sat. "Hello there," said Pip! It\'s a lovely day...'
+_REPEATED = "The cat sat. The cat sat."
+
+
+def _counts(frame, row: int):
+    return {column: int(frame[column].iloc[row]) for column in COUNT_COLUMNS}
+
+
+def test_counts_of_words_sentences_syllables_and_dialogue():
+    frame = analyze_stories([_DIALOGUE, _REPEATED, ""])
+    # A heading ends a sentence at its line break, and the ellipsis ends the last one
+    assert _counts(frame, 0) == {"words": 14, "sentences": 4, "syllables": 18, "unique_words": 14,
+                                 "dialogue_words": 2}
+    assert _counts(frame, 1) == {"words": 6, "sentences": 2, "syllables": 6, "unique_words": 3,
+                                 "dialogue_words": 0}
+    assert _counts(frame, 2) == dict.fromkeys(COUNT_COLUMNS, 0)
+    assert list(frame["chapters"]) == [1, 0, 0]
+    assert frame["fk_grade"].iloc[1] == pytest.approx(0.39 * 3 + 11.8 * 1 - 15.59)
+    assert frame["dialogue_ratio"].iloc[0] == pytest.approx(2 / 14)
+    # An empty story has no grade and fails every check
+    assert frame["fk_grade"].isna().iloc[2] and not frame["passes"].iloc[2]
+
+
+def test_unique_words_and_quotes_are_counted_per_story():
+    frame = analyze_stories(['"The cat', 'sat."', "The cat sat."])
+    assert list(frame["unique_words"]) == [2, 1, 3]
+    # An unclosed quote does not run into the next story
+    assert list(frame["dialogue_words"]) == [2, 0, 0]
+
+
+def test_batches_give_the_same_counts(monkeypatch):
+    texts = [template_draft(f"Story {index}", "Fantasy", seed=index) for index in range(6)] + [_DIALOGUE]
+    whole = analyze_stories(texts)
+    monkeypatch.setitem(config.ANALYTICS_CONFIG, "batch_chars", 5000)
+    batched = analyze_stories(texts)
+    for column in COUNT_COLUMNS:
+        assert list(batched[column]) == list(whole[column])
+
+
+def test_template_drafts_pass_and_the_summary_averages_by_genre():
+    stories = [Story.from_text(template_draft(f"Story {index}", genre, seed=index), f"Story {index}", genre)
+               for index, genre in enumerate(["Fantasy", "Fantasy", "Mystery"])]
+    stories.append(Story.from_text(_REPEATED, "Short", "Mystery"))
+    frame = analyze_stories(stories)
+    assert list(frame["passes"]) == [True, True, True, False]
+    assert frame["quality"].iloc[0] == pytest.approx(1.0)
+    assert 0 < frame["quality"].iloc[3] < 1
+
+    summary = summarize(frame)
+    assert list(summary.index) == ["Fantasy", "Mystery", "All"]
+    assert list(summary["stories"]) == [2, 2, 4]
+    assert list(summary["pass_rate"]) == [1.0, 0.5, 0.75]
+    assert summary.loc["All", "words"] == pytest.approx(frame["words"].mean())
+
+
+def test_library_stories_are_scored_by_their_ids(tmp_path):
+    library = StoryLibrary(str(tmp_path / "library.sqlite3"))
+    ids = [library.add(Story.from_text(template_draft(f"Story {index}", genre, seed=index), f"Story {index}", genre))
+           for index, genre in enumerate(["Fantasy", "Mystery", "Fantasy"])]
+    frame = analyze_library(library, genre="Fantasy")
+    assert sorted(frame.index) == [ids[0], ids[2]]
+    assert set(frame["title"]) == {"Story 0", "Story 2"}
+    assert frame.loc[ids[0], "words"] == analyze_stories([library.load_story(ids[0])])["words"].iloc[0]
+    library.close()
@@ -0,0 +1,84 @@
+import asyncio
+
+from components import story_cache
+from components.rate_limits import RateLimitScheduler
+from components.story_cache import StoryCache
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_stories_evicted_from_memory_are_served_from_disk(tmp_path):
+    cache = StoryCache(str(tmp_path / "stories.sqlite3"), max_entries=1)
+    cache.set("a", "Story A", {"agent_turns": 3})
+    cache.set("b", "Story B")
+    assert cache.stats["memory_entries"] == 1
+
+    assert cache.get("a") == ("Story A", {"agent_turns": 3}, "disk")
+    # The disk hit is promoted back into memory
+    assert cache.get("a") == ("Story A", {"agent_turns": 3}, "memory")
+    assert cache.get("b")[2] == "disk"
+    # And outlives the process
+    assert StoryCache(str(tmp_path / "stories.sqlite3")).get("a")[2] == "disk"
+    assert cache.get("c") is None
+    stats = cache.stats
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 2, 1)
+
+
+def test_the_disk_tier_drops_the_least_recently_used_story(tmp_path):
+    cache = StoryCache(str(tmp_path / "stories.sqlite3"), max_entries=1, max_disk_entries=2)
+    cache.set("a", "Story A")
+    cache.set("b", "Story B")
+    cache.get("a")
+    cache.set("c", "Story C")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(story_cache, "time", clock)
+    cache = StoryCache(str(tmp_path / "stories.sqlite3"), ttl_seconds=60)
+    cache.set("a", "Story A")
+    clock.now += 60
+    assert cache.get("a")[2] == "memory"
+    clock.now += 1
+    assert cache.get("a") is None
+    # Expired rows are deleted from disk too
+    assert StoryCache(str(tmp_path / "stories.sqlite3"), ttl_seconds=3600).get("a") is None
+
+
+def test_a_zero_ttl_caches_nothing(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(story_cache, "time", clock)
+    cache = StoryCache(str(tmp_path / "stories.sqlite3"), ttl_seconds=0)
+    cache.set("a", "Story A")
+    clock.now += 0.001
+    assert cache.get("a") is None
+
+
+def test_regenerate_bypasses_the_cache_and_replaces_the_story(tmp_path):
+    client = ScriptedChatCompletionClient()
+    generator = StoryGenerator(model_client=client, mode="pipeline", rounds=1,
+                               cache=StoryCache(str(tmp_path / "stories.sqlite3")),
+                               rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    first = asyncio.run(generator.run_story("The Lost Star", "Fantasy"))
+    assert first.stats["cache"] == "miss"
+    calls = client.calls
+
+    cached = asyncio.run(generator.run_story("The Lost Star", "Fantasy"))
+    assert cached.stats["cache"] == "memory"
+    assert cached.story == first.story
+    assert client.calls == calls
+
+    fresh = asyncio.run(generator.run_story("The Lost Star", "Fantasy", regenerate=True))
+    assert fresh.stats["cache"] == "miss"
+    assert client.calls == calls + 3
+    assert generator.cache.stats["writes"] == 2
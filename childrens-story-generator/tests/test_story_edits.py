@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from components.rate_limits import RateLimitScheduler
+from components.story_edits import StoryEdit, climax_chapter
+from components.story_extraction import Story
+from components.story_generator import StoryGenerator
+from components.template_drafts import template_draft
+from tests.scripted_client import ScriptedChatCompletionClient
+
+_STORY = Story.from_text(template_draft("The Lost Star", "Fantasy"), "The Lost Star", "Fantasy",
+                         character_sheet="CHARACTER PROFILES\n\nPip (7): a brave owl")
+
+
+def _generator(replies) -> StoryGenerator:
+    return StoryGenerator(model_client=ScriptedChatCompletionClient(replies=replies), mode="pipeline",
+                          rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+
+
+def _texts(story: Story):
+    return {chapter.number: chapter.text for chapter in story.chapters}
+
+
+def test_edits_are_validated():
+    with pytest.raises(ValueError):
+        StoryEdit("ending")
+    with pytest.raises(ValueError):
+        StoryEdit("chapter")
+    with pytest.raises(ValueError):
+        StoryEdit("character", character="Pip", replacement=" ")
+    assert StoryEdit("character", character="Pip", replacement="Luna").model_calls == 2
+
+
+def test_a_chapter_rewrite_keeps_every_other_chapter_verbatim():
+    generator = _generator({"Story_Writer": ["Chapter 3: The Bright Path\n\nPip flew over the hills."]})
+    result = asyncio.run(generator.regenerate_chapter(_STORY, 3, "More flying"))
+    assert result.ok, result.error
+    edited = result.structured
+    assert (edited.chapters[2].title, edited.chapters[2].text) == ("The Bright Path", "Pip flew over the hills.")
+    before, after = _texts(_STORY), _texts(edited)
+    assert {number: text for number, text in after.items() if number != 3} == \
+        {number: text for number, text in before.items() if number != 3}
+    assert edited.character_sheet == _STORY.character_sheet
+    assert result.stats["model_calls"] == 1 and result.stats["edit"] == "chapter"
+
+
+def test_a_streamed_edit_reports_like_a_team_run():
+    generator = _generator({"Story_Writer": ["Chapter 2: Home\n\nPip came home."]})
+
+    async def stream():
+        return [event async for event in generator.stream_edit(_STORY, StoryEdit("chapter", chapter=2))]
+
+    events = asyncio.run(stream())
+    assert [type(event).__name__ for event in events] == ["AgentStarted", "MessageComplete", "UsageUpdate",
+                                                          "Terminated"]
+    assert events[-1].reason == "chapter 2 rewritten"
+    assert events[-1].structured.chapters[1].text == "Pip came home."
+
+
+def test_a_reply_without_a_heading_keeps_the_chapter_title():
+    generator = _generator({"Climax_Creator": ["The storm broke and Pip found the star. STORY_COMPLETE"]})
+    result = asyncio.run(generator.regenerate_climax(_STORY))
+    number = climax_chapter(_STORY)
+    assert number == 4
+    chapter = result.structured.chapters[number - 1]
+    assert chapter.title == _STORY.chapters[number - 1].title
+    assert chapter.text == "The storm broke and Pip found the star."
+
+
+def test_a_character_swap_rewrites_the_profiles_and_the_story():
+    rewritten = "\n\n".join(f"Chapter {number}: Part {number}\n\nLuna and the star, part {number}."
+                            for number in range(1, 6))
+    generator = _generator({"Character_Developer": ["CHARACTER PROFILES\n\nLuna (8): a curious fox"],
+                            "Story_Writer": [rewritten]})
+    result = asyncio.run(generator.swap_character(_STORY, "Pip", "Luna"))
+    assert result.ok, result.error
+    assert result.structured.character_sheet == "CHARACTER PROFILES\n\nLuna (8): a curious fox"
+    assert [chapter.text for chapter in result.structured.chapters] == [
+        f"Luna and the star, part {number}." for number in range(1, 6)]
+    assert result.stats["model_calls"] == 2
+
+
+def test_failed_edits_leave_the_story_alone():
+    generator = _generator({"Story_Writer": ["Sorry, no chapters here."]})
+    result = asyncio.run(generator.swap_character(_STORY, "Pip", "Luna"))
+    assert result.error == "The rewritten story has no chapter headings"
+    assert not result.story
+    result = asyncio.run(generator.regenerate_chapter(_STORY, 9))
+    assert result.error == "The story has no chapter 9"
+    untitled = Story.from_text("Just one paragraph.", "The Lost Star", "Fantasy")
+    assert "chapter headings" in asyncio.run(generator.regenerate_climax(untitled)).error
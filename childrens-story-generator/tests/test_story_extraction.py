@@ -0,0 +1,40 @@
+from autogen_agentchat.messages import TextMessage
+
+from components.story_extraction import extract_story
+from components.template_drafts import template_draft
+
+
+def _transcript(*replies):
+    return [TextMessage(content="Write 'The Lost Star'", source="user")] + [
+        TextMessage(content=content, source=source) for source, content in replies
+    ]
+
+
+def test_climax_suggestions_do_not_replace_the_writers_draft():
+    draft = template_draft("The Lost Star", "Fantasy")
+    suggestions = ("A few ideas for the ending:\n\n"
+                   "**Chapter 4: The Storm**\nLet the storm break the bridge.\n\n"
+                   "**Chapter 5: Home Again**\nEnd with a song.")
+    story = extract_story(_transcript(("Character_Developer", "Pip, a brave mouse"),
+                                      ("Story_Writer", draft), ("Climax_Creator", suggestions)))
+    assert story.source_agent == "Story_Writer"
+    assert [chapter.number for chapter in story.chapters] == [1, 2, 3, 4, 5]
+    assert story.word_count > 1000
+    assert story.character_sheet == "Pip, a brave mouse"
+
+
+def test_a_full_climax_rewrite_replaces_the_draft():
+    draft = template_draft("The Lost Star", "Fantasy")
+    rewrite = template_draft("The Lost Star", "Fantasy", seed=1)
+    story = extract_story(_transcript(("Story_Writer", draft), ("Climax_Creator", rewrite)))
+    assert story.source_agent == "Climax_Creator"
+    assert story.source_index == 2
+
+
+def test_a_later_writer_revision_wins():
+    first = template_draft("The Lost Star", "Fantasy")
+    revision = template_draft("The Lost Star", "Fantasy", seed=2)
+    story = extract_story(_transcript(("Story_Writer", first), ("Climax_Creator", first),
+                                      ("Story_Writer", revision)))
+    assert story.source_index == 3
+    assert story.text == revision.strip()
@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from components.story_extraction import Story
+from components.story_library import StoryLibrary, match_query
+from components.template_drafts import template_draft
+
+_GENRES = ("Fantasy", "Adventure", "Mystery")
+
+
+@pytest.fixture
+def library(tmp_path):
+    library = StoryLibrary(str(tmp_path / "library.sqlite3"), compression="gzip")
+    yield library
+    library.close()
+
+
+def _story(index: int, genre: str = None) -> Story:
+    genre = genre or _GENRES[index % len(_GENRES)]
+    return Story.from_text(template_draft(f"Story {index}", genre, seed=index) + f" marker{index}",
+                           f"Story {index}", genre, character_sheet=f"Pip{index} the brave owl")
+
+
+def _all_pages(library: StoryLibrary, limit: int, **filters):
+    entries, cursor, pages = [], None, 0
+    while True:
+        page, cursor = library.page(limit, cursor, **filters)
+        entries += page
+        pages += 1
+        if cursor is None:
+            return entries, pages
+
+
+def test_pages_walk_every_story_newest_first(library):
+    ids = [library.add(_story(index)) for index in range(7)]
+    entries, pages = _all_pages(library, 3)
+    assert [entry.id for entry in entries] == ids[::-1]
+    assert pages == 3
+    assert library.count() == 7
+
+    mysteries, _ = _all_pages(library, 1, genre="Mystery")
+    assert [entry.title for entry in mysteries] == ["Story 5", "Story 2"]
+    assert library.count("Mystery") == 2
+
+
+def test_search_matches_prefixes_in_titles_characters_and_text(library):
+    for index in range(12):
+        library.add(_story(index))
+    assert [entry.title for entry in library.page(20, query="marker7")[0]] == ["Story 7"]
+    assert [entry.title for entry in library.page(20, query="pip1")[0]] == ["Story 11", "Story 10", "Story 1"]
+    # Every word has to match
+    assert [entry.title for entry in library.page(20, query="brave pip4")[0]] == ["Story 4"]
+    found, _ = _all_pages(library, 2, query="marker1", genre="Adventure")
+    assert [entry.title for entry in found] == ["Story 10", "Story 1"]
+
+
+def test_search_syntax_is_quoted_away(library):
+    library.add(_story(0))
+    assert match_query('pip0 "OR') == '"pip0"* """OR"*'
+    # FTS5 operators are searched for as words, not parsed
+    assert [entry.title for entry in library.page(20, query='pip0 AND (')[0]] == ["Story 0"]
+    assert library.page(20, query='pip0 qqq)')[0] == []
+    assert library.page(20, query="  ")[0][0].title == "Story 0"
+
+
+def test_a_story_is_stored_once_and_ids_are_not_reused(library):
+    first = library.add(_story(0))
+    newest = library.add(_story(1))
+    assert library.add(_story(1)) == newest
+    assert library.delete(newest)
+    assert library.page(20, query="marker1")[0] == []
+    assert library.get(newest) is None
+    assert library.add(_story(2)) > newest
+    assert library.load_story(first).title == "Story 0"
+
+
+def test_libraries_without_autoincrement_are_migrated(tmp_path):
+    path = str(tmp_path / "library.sqlite3")
+    library = StoryLibrary(path)
+    entry_id = library.add(_story(0))
+    library.close()
+    with sqlite3.connect(path) as db:
+        # Rebuild the table the way libraries were first created
+        sql = db.execute("SELECT sql FROM sqlite_master WHERE name = 'stories'").fetchone()[0]
+        db.execute("ALTER TABLE stories RENAME TO stories_new")
+        db.execute(sql.replace(" AUTOINCREMENT", ""))
+        db.execute("INSERT INTO stories SELECT * FROM stories_new")
+        db.execute("DROP TABLE stories_new")
+
+    library = StoryLibrary(path)
+    with library._connect() as db:
+        assert "AUTOINCREMENT" in db.execute("SELECT sql FROM sqlite_master WHERE name = 'stories'").fetchone()[0]
+        indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"stories_genre", "stories_title"} <= indexes
+    assert library.load_story(entry_id).title == "Story 0"
+    assert [entry.id for entry in library.page(20, query="marker0")[0]] == [entry_id]
+    library.close()
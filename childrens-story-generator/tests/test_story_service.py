@@ -0,0 +1,100 @@
+import signal
+import time
+
+import uvicorn
+from starlette.testclient import TestClient
+
+from components.jobs import JobQueue, JobStore
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from components.story_service import StoryService, create_app
+from server import DrainingServer
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+def _service(tmp_path, latency: float, drain_seconds: float = 10, **kwargs) -> StoryService:
+    def generator():
+        return StoryGenerator(model_client=ScriptedChatCompletionClient(latency=latency), mode="pipeline",
+                              rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    queue = JobQueue(workers=1, store=JobStore(str(tmp_path / "jobs.sqlite3")), generator_factory=generator,
+                     **kwargs)
+    return StoryService(queue, drain_seconds=drain_seconds, retry_after=7, event_interval=0.05)
+
+
+def _wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def _submit(client: TestClient, title: str = "The Lost Star"):
+    return client.post("/stories", json={"title": title, "genre": "fantasy"})
+
+
+def test_a_full_queue_answers_429_with_retry_after(tmp_path):
+    service = _service(tmp_path, latency=0.3, max_queued=1)
+    with TestClient(create_app(service)) as client:
+        running = _submit(client)
+        assert running.status_code == 202
+        assert running.headers["location"] == f"/stories/{running.json()['job_id']}"
+        _wait_for(lambda: service.queue.running == 1)
+        assert _submit(client, "The Brave Owl").json()["position"] == 1
+
+        refused = _submit(client, "The Kind Dragon")
+        assert refused.status_code == 429
+        assert refused.headers["retry-after"] == "7"
+        assert "error" in refused.json()
+        ready = client.get("/readyz")
+        assert (ready.status_code, ready.json()["status"]) == (503, "full")
+
+        # Once the line moves there is room again
+        _wait_for(lambda: service.queue.queued == 0)
+        assert _submit(client, "The Kind Dragon").status_code == 202
+
+
+def test_bad_submissions_get_a_400(tmp_path):
+    with TestClient(create_app(_service(tmp_path, latency=0.0))) as client:
+        assert client.post("/stories", json={"genre": "Fantasy"}).status_code == 400
+        assert client.post("/stories", json={"title": "The Lost Star", "genre": "Opera"}).status_code == 400
+        assert client.post("/stories", content=b"[1]").json() == {"error": "The request body must be a JSON object"}
+
+
+def test_a_drain_refuses_new_stories_and_lets_running_ones_finish(tmp_path):
+    service = _service(tmp_path, latency=0.2)
+    with TestClient(create_app(service)) as client:
+        assert client.get("/readyz").status_code == 200
+        job_id = _submit(client).json()["job_id"]
+        _wait_for(lambda: service.queue.running == 1)
+
+        service.start_drain()
+        refused = _submit(client, "The Brave Owl")
+        assert refused.status_code == 503 and refused.headers["retry-after"] == "7"
+        assert client.post(f"/stories/{job_id}/edits", json={"kind": "climax"}).status_code == 503
+        ready = client.get("/readyz")
+        assert (ready.status_code, ready.json()["status"]) == (503, "draining")
+        # Liveness stays up while draining
+        assert client.get("/healthz").status_code == 200
+    # Leaving the client shuts the app down, which waits for the running story
+    assert service.queue.store.load(job_id).status == "done"
+
+
+def test_stories_still_running_when_the_drain_ends_are_cancelled(tmp_path):
+    service = _service(tmp_path, latency=1.0, drain_seconds=0.2)
+    with TestClient(create_app(service)) as client:
+        job_id = _submit(client).json()["job_id"]
+        _wait_for(lambda: service.queue.running == 1)
+        started = time.monotonic()
+    assert time.monotonic() - started < 5
+    job = service.queue.store.load(job_id)
+    assert job.status == "cancelled"
+    assert job.error == "The server stopped before the story was finished"
+
+
+def test_a_stop_signal_starts_the_drain_before_connections_close(tmp_path):
+    service = _service(tmp_path, latency=0.0)
+    server = DrainingServer(uvicorn.Config(create_app(service)), service)
+    server.handle_exit(signal.SIGTERM, None)
+    assert service.draining and server.should_exit
+    assert not service.ready
+    service.queue.shutdown()
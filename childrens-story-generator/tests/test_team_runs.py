@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from autogen_agentchat.teams._group_chat import _base_group_chat_manager
+
+import config
+from components.rate_limits import RateLimitScheduler
+from components.story_generator import StoryGenerator
+from tests.scripted_client import ScriptedChatCompletionClient
+
+
+def _run(mode: str, complete_after: int):
+    generator = StoryGenerator(model_client=ScriptedChatCompletionClient(complete_after=complete_after), mode=mode,
+                               rounds=2, rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+    result = asyncio.run(generator.run_story("The Lost Star", "Fantasy"))
+    assert result.ok, result.error
+    return result
+
+
+@pytest.fixture
+def reworded_turn_limit(monkeypatch):
+    # The team's own stop message is autogen's wording, which the step detection must not rely on
+    stop_message = _base_group_chat_manager.StopMessage
+    monkeypatch.setattr(_base_group_chat_manager, "StopMessage",
+                        lambda content, source: stop_message(content="Turn limit hit", source=source))
+
+
+@pytest.mark.usefixtures("reworded_turn_limit")
+def test_a_pipeline_runs_every_turn_until_the_turn_limit(monkeypatch):
+    monkeypatch.setitem(config.TERMINATION_CONFIG, "enabled", False)
+    result = _run("pipeline", complete_after=99)
+    assert result.stats["agent_turns"] == 5
+    assert result.stats["stop_reason"] == "Maximum number of agent turns 5 reached"
+
+
+@pytest.mark.usefixtures("reworded_turn_limit")
+@pytest.mark.parametrize("mode", ["pipeline", "selector"])
+def test_story_complete_ends_the_run_after_that_turn(monkeypatch, mode):
+    monkeypatch.setitem(config.TERMINATION_CONFIG, "enabled", False)
+    result = _run(mode, complete_after=1)
+    assert result.stats["agent_turns"] == 3
+    assert "STORY_COMPLETE" in result.stats["stop_reason"]
+    assert result.stats["early_stop"] is None
@@ -0,0 +1,36 @@
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.story_extraction import Story
+from components.template_drafts import TemplateDrafts, template_draft
+from config import STORY_CONFIG
+
+
+def test_a_draft_has_every_chapter_at_the_target_length_and_repeats():
+    draft = template_draft("The Lost Star", "Fantasy")
+    story = Story.from_text(draft, "The Lost Star", "Fantasy")
+    assert [chapter.number for chapter in story.chapters] == list(range(1, STORY_CONFIG["chapters"] + 1))
+    assert story.word_count >= STORY_CONFIG["min_total_words"]
+    assert template_draft("The Lost Star", "Fantasy") == draft
+    assert template_draft("The Lost Star", " fantasy ") == draft
+    assert template_draft("The Lost Star", "Fantasy", seed=1) != draft
+
+
+def test_a_missing_or_unknown_genre_uses_the_default_table():
+    drafts = TemplateDrafts()
+    assert drafts.draft("The Lost Star", None) == drafts.draft("The Lost Star", "")
+    assert drafts.characters(None) == drafts.characters("")
+    assert drafts.twist(None)
+    assert Story.from_text(drafts.draft("The Lost Star", "Space Opera"), "The Lost Star").word_count > 0
+
+
+def test_the_writer_keeps_its_legacy_one_line_story():
+    opening = "Once upon a time, in a land where dragons sing, there lived a brave little hero."
+    assert WriterAgent.generate_story("dragons sing") == opening
+    assert WriterAgent.generate_story(plot="dragons sing") == opening
+
+
+def test_the_agents_template_helpers_need_no_agent():
+    assert WriterAgent.template_draft("The Lost Star", "Fantasy", 2) == template_draft("The Lost Star", "Fantasy", 2)
+    assert len(CharacterAgent.create_characters("Mystery")) == 3
+    assert ClimaxAgent.generate_climax("", "Mystery").startswith("And just when everything seemed lost, ")
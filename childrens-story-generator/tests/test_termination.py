@@ -0,0 +1,104 @@
+import asyncio
+
+from autogen_agentchat.messages import TextMessage
+
+import config
+from agents.character_agent import CharacterAgent
+from agents.climax_agent import ClimaxAgent
+from agents.writer_agent import WriterAgent
+from components.checkpoints import CheckpointStore
+from components.rate_limits import RateLimitScheduler
+from components.story_extraction import extract_story
+from components.story_generator import StoryGenerator
+from components.template_drafts import template_draft
+from components.termination import (STOP_COMPLETE, STOP_DUPLICATE, STOP_REVISION_CAP, CollaborationMonitor,
+                                     similarity, sketch)
+from tests.scripted_client import ScriptedChatCompletionClient
+
+_AGENTS = [CharacterAgent.NAME, WriterAgent.NAME, ClimaxAgent.NAME]
+_DRAFT = template_draft("The Lost Star", "Fantasy")
+
+
+def _monitor(**kwargs) -> CollaborationMonitor:
+    return CollaborationMonitor(_AGENTS, extract_story, **kwargs)
+
+
+def _turn(source: str, content: str) -> TextMessage:
+    return TextMessage(content=content, source=source)
+
+
+def test_sketches_ignore_case_and_punctuation_and_track_overlap():
+    text = " ".join(f"word{index}" for index in range(400))
+    assert similarity(sketch(text), sketch(text.upper().replace(" ", ", "))) == 1.0
+    # One changed word alters only the shingles that cover it
+    edited = text.replace("word200", "changed")
+    assert 0.9 <= similarity(sketch(text), sketch(edited)) < 1.0
+    assert similarity(sketch(text), sketch(" ".join(f"other{index}" for index in range(400)))) == 0.0
+    assert len(sketch(text, keep=16)) == 16
+    # Texts shorter than a shingle compare exactly
+    assert similarity(sketch("a brave owl"), sketch("A brave owl!")) == 1.0
+    assert similarity(sketch("a brave owl"), sketch("a brave fox")) == 0.0
+    assert similarity(sketch(""), sketch("")) == 1.0
+
+
+def test_a_redraft_that_changes_nothing_stops_the_run():
+    monitor = _monitor(max_turns_per_agent=0)
+    messages = [_turn("user", "Write it"), _turn(WriterAgent.NAME, _DRAFT)]
+    assert monitor.check(messages) is None
+    # A rewrite of the story is not a duplicate
+    messages.append(_turn(WriterAgent.NAME, template_draft("The Lost Star", "Fantasy", seed=1)))
+    assert monitor.check(messages) is None
+    messages.append(_turn(WriterAgent.NAME, template_draft("The Lost Star", "Fantasy", seed=1).upper()))
+    assert monitor.check(messages).startswith("Story_Writer's draft repeats the previous one")
+    assert monitor.kind == STOP_DUPLICATE
+
+
+def test_agents_at_their_turn_cap_are_not_offered_and_all_capped_stops():
+    monitor = _monitor(max_turns_per_agent=2, allow_repeated_speaker=False)
+    messages = [_turn("user", "Write it")]
+    for source in (CharacterAgent.NAME, CharacterAgent.NAME, WriterAgent.NAME):
+        messages.append(_turn(source, "Notes"))
+        assert monitor.check(messages) is None
+    assert monitor.candidates(messages) == [ClimaxAgent.NAME]
+    messages += [_turn(ClimaxAgent.NAME, "Ideas"), _turn(ClimaxAgent.NAME, "More")]
+    assert monitor.check(messages) is None
+    # The writer is the only one left and may speak again
+    assert monitor.candidates(messages) == [WriterAgent.NAME]
+    messages.append(_turn(WriterAgent.NAME, "Notes"))
+    assert monitor.check(messages) == "Every agent reached the limit of 2 turns"
+    assert monitor.kind == STOP_REVISION_CAP
+    # Nothing new since the last check
+    assert monitor.check(messages) is None
+
+
+class FailingClimaxClient(ScriptedChatCompletionClient):
+    """Fails every Climax_Creator call after its first"""
+
+    async def create(self, messages, **kwargs):
+        if self._role_of(messages) == ClimaxAgent.NAME and self.calls >= 3:
+            raise RuntimeError("Connection dropped")
+        return await super().create(messages, **kwargs)
+
+
+def test_a_resumed_run_that_already_met_a_stop_condition_ends_without_another_turn(tmp_path, monkeypatch):
+    checkpoints = CheckpointStore(str(tmp_path))
+    client = FailingClimaxClient(complete_after=10)
+
+    def generator():
+        return StoryGenerator(model_client=client, mode="pipeline", rounds=2, checkpoints=checkpoints,
+                              rate_limiter=RateLimitScheduler(requests_per_minute=0, tokens_per_minute=0))
+
+    monkeypatch.setitem(config.TERMINATION_CONFIG, "enabled", False)
+    failed = asyncio.run(generator().run_story("The Lost Star", "Fantasy"))
+    assert "Connection dropped" in failed.error
+    assert checkpoints.load(failed.run_id)["agent_turns"] == 4
+
+    # The redraft after the climax suggestions already finished the story
+    monkeypatch.setitem(config.TERMINATION_CONFIG, "enabled", True)
+    calls = client.calls
+    resumed = asyncio.run(generator().resume_story(failed.run_id))
+    assert resumed.ok, resumed.error
+    assert client.calls == calls
+    assert resumed.stats["agent_turns"] == 4
+    assert resumed.stats["early_stop"] == STOP_COMPLETE
+    assert resumed.stats["stop_reason"].startswith("Story complete: 5 chapters")